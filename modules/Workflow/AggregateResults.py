@@ -39,161 +39,287 @@
 # Wael Elhaddad
 #
 
-import glob
+import glob, os, re, shutil
 import numpy as np
 import pandas as pd
+import tables
 import argparse
 
 from datetime import datetime
+from multiprocessing import Pool
 from time import strftime
 
+# compression settings of the aggregated HDF files
+COMPLEVEL = 1
+COMPLIB = 'blosc:snappy'
+
+headers = dict(
+    EDP = [0, 1, 2, 3],
+    DM = [0, 1, 2],
+    DV = [0, 1, 2, 3])
+
 def log_msg(msg):
 
     print('{} {}'.format(datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S:%fZ')[:-4], msg))
 
+def get_file_groups(files):
+    """
+    Group the result files by the range of building IDs they cover.
+
+    Every result file of a job covers the IDs in its file name (e.g.,
+    EDP_1-1000.csv). The files are sorted by their ranges and the files with
+    overlapping ranges are collected in the same group. The groups are
+    returned in increasing order of building IDs, so the data can be merged
+    one group at a time and appended to the aggregated file in order.
+
+    Parameters
+    ----------
+    files: list of string
+        Result file paths.
+
+    Returns
+    -------
+    file_groups: list of list of string
+        Groups of file paths.
+    """
+
+    file_ranges = []
+    for file_path in files:
+        id_range = re.search(r'_(\d+)-(\d+)\.[a-z]+$', file_path)
+        if id_range is not None:
+            file_ranges.append(
+                (int(id_range.group(1)), int(id_range.group(2)), file_path))
+        else:
+            log_msg('Unknown building ID range for file {}'.format(file_path))
+
+    file_ranges.sort()
 
-def main(threads = 1):
-    headers = dict(
-        EDP = [0, 1, 2, 3],
-        DM = [0, 1, 2],
-        DV = [0, 1, 2, 3])
+    file_groups = []
+    group_max = None
+    for min_id, max_id, file_path in file_ranges:
+        if (group_max is None) or (min_id > group_max):
+            file_groups.append([])
+            group_max = max_id
+        else:
+            group_max = max(group_max, max_id)
+        file_groups[-1].append(file_path)
 
-    use_dask = threads > 1
+    return file_groups
 
-    if use_dask:
+def aggregate_result_type(res_type):
+    """
+    Merge the EDP, DM, or DV csv files of the jobs into one HDF file.
 
-        log_msg('{} threads requested. Using DASK.'.format(threads))
+    The data is loaded and appended to the aggregated file one group of
+    files at a time (see get_file_groups), so only the results of one job
+    need to fit in memory.
 
-        from dask.distributed import Client, LocalCluster
-        from dask import delayed
-        import math
+    Parameters
+    ----------
+    res_type: {'EDP', 'DM', 'DV'}
+        Type of results.
+    """
 
-        @delayed
-        def read_csv_files(file_list, header):
-            return [pd.read_csv(fn, header=header, index_col=0) for fn in file_list]
+    log_msg('Loading {} files...'.format(res_type))
 
-        def read_csv_np(file, header):
-            res = np.loadtxt(file, delimiter=',', dtype=str)
+    files = glob.glob('./results/{}/*/{}_*.csv'.format(res_type, res_type))
 
-            first_row = header[-1]+1
-            data = res[first_row:].T[1:].T
-            data[data == ''] = np.nan
+    if len(files) == 0:
+        print('No {} files found'.format(res_type))
+        return
 
-            tuples = [tuple(h) for h in res[:first_row].T[1:]]
-            MI = pd.MultiIndex.from_tuples(tuples, names=res[:first_row].T[0])
+    # the columns of the aggregated data are collected from the file headers
+    columns = None
+    for file_path in files:
+        file_columns = pd.read_csv(file_path, header=headers[res_type],
+                                   index_col=0, nrows=0).columns
+        if columns is None:
+            columns = file_columns
+        else:
+            columns = columns.append(file_columns.difference(columns, sort=False))
+
+    file_groups = get_file_groups(files)
 
-            df = pd.DataFrame(data, columns=MI, index=res[first_row:].T[0], dtype=float)
+    with pd.HDFStore('{}.hdf'.format(res_type), mode='w',
+                     complevel=COMPLEVEL, complib=COMPLIB) as store:
 
-            return df
+        for file_group in file_groups:
 
-        @delayed
-        def read_csv_files_np(file_list, header):
-            return [read_csv_np(fn, header=header) for fn in file_list]
+            df_list = [pd.read_csv(file_path, header=headers[res_type], index_col=0)
+                       for file_path in file_group]
+            df_group = pd.concat(df_list, axis=0, sort=False)
 
+            df_group = df_group.reindex(columns=columns).astype(float)
+            df_group.index = df_group.index.astype(np.int32)
+            df_group.sort_index(axis=0, inplace=True)
 
-        cluster = LocalCluster()
-        client = Client(cluster)
+            store.append('data', df_group, index=False)
 
-        log_msg('Cluster initialized.')
-        log_msg(client)
+    log_msg('{} results saved.'.format(res_type))
 
-    for res_type in ['EDP', 'DM', 'DV']:
-    #for res_type in ['EDP', 'DV']:
+def aggregate_realizations(key, target_file):
+    """
+    Merge one key of the realizations files of the jobs into one HDF file.
 
-        log_msg('Loading {} files...'.format(res_type))
+    Similarly to aggregate_result_type, the data is loaded one group of files
+    at a time. Every group is saved in fixed format as a separate part under
+    the key (e.g., /EDP-1-PID-1-1/part_00000), because a table with one
+    column per realization cannot be written for large numbers of
+    realizations. The groups do not need to have the same realizations; use
+    read_realizations to load all parts of a key.
 
-        files = glob.glob('./results/{}/*/{}_*.csv'.format(res_type, res_type))
-        #files = files[:1000]
+    Parameters
+    ----------
+    key: string
+        Key of the realizations in the HDF files.
+    target_file: string
+        Path to the HDF file that stores the aggregated realizations.
+    """
 
-        if len(files) > 0:
+    log_msg('Processing realizations for key {key}'.format(key=key))
 
-            if use_dask:
+    files = glob.glob('./results/{}/*/{}_*.hdf'.format('realizations','realizations'))
 
-                file_count = len(files)
-                chunk = math.ceil(file_count/threads)
-                df_list = []
+    file_groups = get_file_groups(files)
 
-                print('Creating threads for {} files...'.format(file_count))
+    with pd.HDFStore(target_file, mode='w',
+                     complevel=COMPLEVEL, complib=COMPLIB) as store:
 
-                for t_i in range(threads):
+        part_count = 0
+        for file_group in file_groups:
 
-                    #print(t_i)
+            df_list = []
+            for file_path in file_group:
+                with pd.HDFStore(file_path, mode='r') as res_store:
+                    if key in res_store:
+                        df_list.append(res_store[key])
 
-                    if t_i*chunk < file_count-1:
+            if len(df_list) == 0:
+                continue
 
-                        df_list_i = delayed(read_csv_files)(files[t_i*chunk:(t_i+1)*chunk], headers[res_type])
-                        df_i = delayed(pd.concat)(df_list_i, axis=0, sort=False)
+            df_group = pd.concat(df_list, axis=0, sort=False)
 
-                        df_list.append(df_i)
+            df_group.index = df_group.index.astype(np.int32)
+            df_group.sort_index(axis=0, inplace=True)
 
-                    elif t_i*chunk == file_count-1:
+            try:
+                df_group = df_group.astype(np.float16)
+            except:
+                pass
 
-                        df_i = delayed(read_csv_files)(files[t_i*chunk:(t_i+1)*chunk], headers[res_type])
-                        df_i = df_i[0]
+            store.put('{}/part_{:05d}'.format(key, part_count), df_group,
+                      format='fixed')
+            part_count += 1
 
-                        df_list.append(df_i)
+    log_msg('\t\tResults saved for {key}.'.format(key=key))
 
-                df_all = delayed(pd.concat)(df_list, axis=0, sort=False)
+def read_realizations(file_path, key):
+    """
+    Load one key of an aggregated realizations file.
 
-                df_all = client.compute(df_all)
+    The parts saved by aggregate_realizations are concatenated in order of
+    building IDs. The columns are the union of the realizations of all
+    parts; realizations missing from a part are filled with NaN.
 
-                df_all = client.gather(df_all)
+    Parameters
+    ----------
+    file_path: string
+        Path to the aggregated realizations file.
+    key: string
+        Key of the realizations (e.g., 'EDP-1-PID-1-1').
 
-            else:
-                log_msg('Loading all files')
-                df_list = [pd.read_csv(resFileName, header=headers[res_type], index_col=0) for resFileName in files]
+    Returns
+    -------
+    df_real: DataFrame
+        Realizations with the building IDs in the index.
+    """
 
-                log_msg('Concatenating all files')
-                df_all = pd.concat(df_list, axis=0, sort=False)
+    key = '/' + key.strip('/')
 
-            df_all.sort_index(axis=0, inplace=True)
+    with pd.HDFStore(file_path, mode='r') as store:
+        part_keys = sorted(part_key for part_key in store.keys()
+                           if part_key.startswith(key + '/part_'))
+        df_list = [store[part_key] for part_key in part_keys]
 
-            # save the results
-            log_msg('Saving results')
-            df_all.index = df_all.index.astype(np.int32)
-            df_all.to_hdf('{}.hdf'.format(res_type), 'data', mode='w', format='fixed', complevel=1, complib='blosc:snappy')
-            #df_all.to_csv('{}.csv'.format(res_type))
+    if len(df_list) == 0:
+        raise KeyError('No realizations found for key {}'.format(key))
 
-        else:
+    return pd.concat(df_list, axis=0, sort=False)
 
-            print('No {} files found'.format(res_type))
+def run_task(task):
 
-    if use_dask:
+    task_type, task_args = task
 
-        log_msg('Closing cluster...')
-        cluster.close()
-        client.close()
+    if task_type == 'results':
+        aggregate_result_type(*task_args)
 
-    # aggregate the realizations files
-    log_msg('Aggregating individual realizations...')
+    elif task_type == 'realizations':
+        aggregate_realizations(*task_args)
 
+def main(threads = 1):
+    """
+    Aggregate the results of rWHALE jobs.
+
+    The EDP, DM, and DV results and every key of the realizations are
+    aggregated by separate tasks that run in a pool of processes. Every task
+    writes its own HDF file; the realization keys are collected in
+    realizations.hdf once all tasks are completed.
+
+    Parameters
+    ----------
+    threads: int
+        Number of processes used to aggregate the files.
+    """
+
+    tasks = [('results', (res_type, )) for res_type in ['EDP', 'DM', 'DV']]
+
+    # collect the keys of the realizations files
     files = glob.glob('./results/{}/*/{}_*.hdf'.format('realizations','realizations'))
 
-    log_msg('Number of files: {}'.format(len(files)))
+    log_msg('Number of realizations files: {}'.format(len(files)))
 
-    # get the keys from the first file
-    if len(files) > 0:
-        first_file = pd.HDFStore(files[0])
-        keys = first_file.keys()
-        first_file.close()
+    keys = []
+    for file_path in files:
+        with pd.HDFStore(file_path, mode='r') as res_store:
+            keys += [key for key in res_store.keys() if key not in keys]
 
-        for key in keys:
-            log_msg('Processing realizations for key {key}'.format(key=key))
-            df_list = [pd.read_hdf(resFileName, key) for resFileName in files]
+    # every key is aggregated in a separate file first, because the processes
+    # cannot write to the same HDF file
+    temp_dir = './realizations_tmp'
+    if len(keys) > 0:
+        os.makedirs(temp_dir, exist_ok=True)
 
-            log_msg('\t\tConcatenating files')
-            df_all = pd.concat(df_list, axis=0, sort=False)
+    temp_files = ['{}/realizations_{}.hdf'.format(temp_dir, key_i)
+                  for key_i in range(len(keys))]
 
-            df_all.index = df_all.index.astype(np.int32)
+    tasks += [('realizations', (key, temp_file))
+              for key, temp_file in zip(keys, temp_files)]
 
-            df_all.sort_index(axis=0, inplace=True)
+    if threads > 1:
 
-            try:
-                df_all.astype(np.float16).to_hdf('realizations.hdf', key, mode='a', format='fixed', complevel=1, complib='blosc:snappy')
-            except:
-                df_all.to_hdf('realizations.hdf', key, mode='a', format='fixed', complevel=1, complib='blosc:snappy')
+        log_msg('{} threads requested. Using a pool of processes.'.format(threads))
+
+        with Pool(processes=threads) as pool:
+            pool.map(run_task, tasks, chunksize=1)
+
+    else:
+        for task in tasks:
+            run_task(task)
+
+    # collect the aggregated realizations in one file; the tables are copied
+    # by PyTables without loading the data into memory
+    if len(keys) > 0:
+
+        log_msg('Collecting realizations in one file...')
+
+        with tables.open_file('realizations.hdf', mode='w') as target:
+            for key, temp_file in zip(keys, temp_files):
+                with tables.open_file(temp_file, mode='r') as source:
+                    if key in source:
+                        source.copy_node(key, newparent=target.root,
+                                         recursive=True)
 
-            log_msg('\t\tResults saved for {key}.'.format(key=key))
+        shutil.rmtree(temp_dir)
 
     log_msg('End of script')
 
@@ -207,10 +333,10 @@ if __name__ == "__main__":
 
     workflowArgParser.add_argument("-threads", "-t",
         type=int, default=48,
-        help="Number of threads to use to aggregate the files.")
+        help="Number of processes to use to aggregate the files.")
 
     #Parsing the command line arguments
     line_args = workflowArgParser.parse_args()
 
 
-    main(line_args.threads)
\ No newline at end of file
+    main(line_args.threads)
@@ -44,6 +44,8 @@
 import sys, os, json
 import argparse
 import json
+import posixpath
+from multiprocessing import Pool
 from pathlib import Path
 
 sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
@@ -51,9 +53,76 @@ sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
 import whale.main as whale
 from whale.main import log_msg, log_div
 
+def run_building(WF, bldg, force_cleanup):
+    """
+    Run the simulation and the damage and loss assessment for one building.
+
+    """
+
+    log_msg(bldg)
+
+    # initialize the simulation directory
+    WF.init_simdir(bldg['id'], bldg['file'])
+
+    # prepare the input files for the simulation
+    WF.create_RV_files(
+        app_sequence = ['Event', 'Modeling', 'EDP', 'Simulation'],
+        BIM_file = bldg['file'], bldg_id=bldg['id'])
+
+    # create the workflow driver file
+    WF.create_driver_file(
+        app_sequence = ['Building', 'Event', 'Modeling', 'EDP', 'Simulation'],
+        bldg_id=bldg['id'])
+
+    # run uq engine to simulate response
+    WF.simulate_response(BIM_file = bldg['file'], bldg_id=bldg['id'])
+
+    # run dl engine to estimate losses
+    WF.estimate_losses(BIM_file = bldg['file'], bldg_id = bldg['id'])
+
+    # add the results to the results store
+    WF.store_results(bldg['id'])
+
+    if force_cleanup:
+        #clean up intermediate files from the simulation
+        WF.cleanup_simdir(bldg['id'])
+
+# the workflow object in the worker processes - see init_worker
+worker_WF = None
+worker_force_cleanup = False
+
+def init_worker(WF, force_cleanup):
+
+    global worker_WF, worker_force_cleanup
+
+    worker_WF = WF
+    worker_force_cleanup = force_cleanup
+
+def run_building_in_worker(bldg):
+    """
+    Run a building in a worker process and log to a separate file.
+
+    Returns the path to the log file of the building. These logs are merged
+    into the main log once every building is completed.
+
+    """
+
+    bldg_log_file = posixpath.join(worker_WF.run_dir,
+                                   'log_{}.txt'.format(bldg['id']))
+    whale.log_file = bldg_log_file
+    with open(whale.log_file, 'w') as f:
+        f.write('Building {}\n'.format(bldg['id']))
+
+    try:
+        run_building(worker_WF, bldg, worker_force_cleanup)
+    except Exception as e:
+        whale.log_error('Building {} failed: {}'.format(bldg['id'], e))
+
+    return bldg_log_file
+
 def main(run_type, input_file, app_registry,
          force_cleanup, bldg_id_filter, reference_dir,
-         working_dir, app_dir, log_file):
+         working_dir, app_dir, log_file, in_process=False, workers=1):
 
     # initialize the log file
     with open(input_file, 'r') as f:
@@ -88,7 +157,8 @@ def main(run_type, input_file, app_registry,
         working_dir = working_dir,
         app_dir = app_dir,
         units = inputs.get('units', None),
-        outputs=inputs.get('outputs', None))
+        outputs=inputs.get('outputs', None),
+        in_process = in_process)
 
     if bldg_id_filter is not None:
         print(bldg_id_filter)
@@ -110,31 +180,26 @@ def main(run_type, input_file, app_registry,
     with open(WF.building_file_path, 'r') as f:
         bldg_data = json.load(f)
 
-    for bldg in bldg_data: #[:1]:
-        log_msg(bldg)
-
-        # initialize the simulation directory
-        WF.init_simdir(bldg['id'], bldg['file'])
+    if workers > 1:
+        log_msg(f'Running {len(bldg_data)} buildings with {workers} workers')
 
-        # prepare the input files for the simulation
-        WF.create_RV_files(
-            app_sequence = ['Event', 'Modeling', 'EDP', 'Simulation'],
-            BIM_file = bldg['file'], bldg_id=bldg['id'])
+        with Pool(processes=workers, initializer=init_worker,
+                  initargs=(WF, force_cleanup)) as pool:
+            bldg_log_files = pool.map(run_building_in_worker, bldg_data,
+                                      chunksize=1)
 
-        # create the workflow driver file
-        WF.create_driver_file(
-            app_sequence = ['Building', 'Event', 'Modeling', 'EDP', 'Simulation'],
-            bldg_id=bldg['id'])
+        # merge the building logs into the main log
+        with open(whale.log_file, 'a') as f:
+            for bldg_log_file in bldg_log_files:
+                with open(bldg_log_file, 'r') as f_bldg:
+                    f.write('\n' + f_bldg.read())
+                os.remove(bldg_log_file)
 
-        # run uq engine to simulate response
-        WF.simulate_response(BIM_file = bldg['file'], bldg_id=bldg['id'])
+        log_msg(log_div)
 
-        # run dl engine to estimate losses
-        WF.estimate_losses(BIM_file = bldg['file'], bldg_id = bldg['id'])
-
-        if force_cleanup:
-            #clean up intermediate files from the simulation
-            WF.cleanup_simdir(bldg['id'])
+    else:
+        for bldg in bldg_data: #[:1]:
+            run_building(WF, bldg, force_cleanup)
 
     # aggregate results
     WF.aggregate_results(bldg_data = bldg_data)
@@ -178,6 +243,13 @@ if __name__ == '__main__':
     workflowArgParser.add_argument("-l", "--logFile",
         default='log.txt',
         help="Path where the log file will be saved.")
+    workflowArgParser.add_argument("-p", "--inProcess",
+        action="store_true",
+        help="Run python applications in the workflow process instead of "
+             "launching a new python interpreter for each of them.")
+    workflowArgParser.add_argument("-n", "--workers",
+        type=int, default=1,
+        help="Number of worker processes that run buildings in parallel.")
 
     #Parsing the command line arguments
     wfArgs = workflowArgParser.parse_args()
@@ -201,4 +273,6 @@ if __name__ == '__main__':
          reference_dir = wfArgs.referenceDir,
          working_dir = wfArgs.workDir,
          app_dir = wfArgs.appDir,
-         log_file = wfArgs.logFile)
\ No newline at end of file
+         log_file = wfArgs.logFile,
+         in_process = wfArgs.inProcess,
+         workers = wfArgs.workers)
\ No newline at end of file
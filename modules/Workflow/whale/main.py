@@ -55,11 +55,17 @@ This module has classes and methods that handle everything at the moment.
 from time import gmtime, strftime
 from io import StringIO
 import sys, os, json
+import glob
 import pprint
 import posixpath
 import ntpath
 import shutil
+import ast
 import importlib
+import importlib.util
+import inspect
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
 from copy import deepcopy
 import subprocess
 import warnings
@@ -73,6 +79,9 @@ log_file = None
 
 log_div = '-' * (80-21)  # 21 to have a total length of 80 with the time added
 
+# python applications imported for in-process execution - see run_python_app
+app_module_cache = {}
+
 # get the absolute path of the whale directory
 whale_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -176,62 +185,234 @@ def create_command(command_list, enforced_python=None):
 
     return command
 
-def run_command(command):
+def run_command(command, cwd=None):
     """
-    Short description
-
-    Long description
+    Run a command in a subprocess and collect its output.
 
     Parameters
     ----------
-    command_list: array of unicode strings
-        Explain...
+    command: unicode string
+        The command to run, typically prepared by create_command.
+    cwd: string, optional
+        The working directory of the subprocess. Defaults to the current
+        working directory.
+
+    Returns
+    -------
+    result: string
+        The output (stdout and stderr) of the command.
+    returncode: int
+        The return code of the command.
 
     """
 
-    # If it is a python script, we do not run it, but rather import the main
-    # function. This ensures that the script is run using the same python
-    # interpreter that this script uses and it is also faster because we do not
-    # need to run multiple python interpreters simultaneously.
-    Frank_trusts_this_approach = False
-    if command[:6] == 'python' and Frank_trusts_this_approach:
-        command_list = command.split()[1:]
-        #py_args = command_list[1:]
+    try:
+        result = subprocess.check_output(command, stderr=subprocess.STDOUT,
+                                         shell=True, cwd=cwd)
+        returncode = 0
+    except subprocess.CalledProcessError as e:
+        result = e.output
+        returncode = e.returncode
 
-        # get the dir and file name
-        py_script_dir, py_script_file = os.path.split(command_list[0][1:-1])
+    if returncode != 0:
+        log_error('return code: {}'.format(returncode))
 
-        # add the dir to the path
-        sys.path.insert(0, py_script_dir)
+    if platform.system() == 'Windows':
+        return result.decode(sys.stdout.encoding), returncode
+    else:
+        #print(result, returncode)
+        return str(result), returncode
 
-        # import the file
-        py_script = importlib.__import__(
-            py_script_file[:-3], globals(), locals(), ['main',], 0)
+def is_python_app_importable(script_path):
+    """
+    Check if a python application can be imported without running it.
 
-        # remove the quotes from the arguments
-        arg_list = [c[1:-1] for c in command_list[1:]]
+    The source is parsed, not executed. Only applications that define a
+    top-level main(args) function and run it under an
+    if __name__ == '__main__' guard are accepted. Scripts that do their work
+    at module level would run once on import (with the argv and working
+    directory of whale) and need to be run in a subprocess instead.
 
-        py_script.main(arg_list)
+    Parameters
+    ----------
+    script_path: string
+        Path to the python script of the application.
 
-        return "", ""
+    Returns
+    -------
+    importable: bool
+        True if the application can be imported and run in-process.
+
+    """
 
+    try:
+        with open(script_path, 'rb') as f:
+            tree = ast.parse(f.read(), filename=script_path)
+    except (OSError, SyntaxError, ValueError):
+        return False
+
+    has_main = False
+    has_guard = False
+
+    # strings are parsed as ast.Str (value in .s) before Python 3.8
+    if sys.version_info >= (3, 8):
+        str_node, str_field = ast.Constant, 'value'
     else:
+        str_node, str_field = ast.Str, 's'
+
+    for node in tree.body:
+
+        if isinstance(node, ast.FunctionDef) and node.name == 'main':
+            args = node.args
+            # posonlyargs only exists in Python 3.8+
+            has_main = ((len(getattr(args, 'posonlyargs', [])) +
+                         len(args.args) == 1) and (args.vararg is None))
+
+        elif isinstance(node, ast.If):
+            test = node.test
+            if (isinstance(test, ast.Compare) and len(test.ops) == 1 and
+                isinstance(test.ops[0], ast.Eq)):
+                sides = [test.left, test.comparators[0]]
+                names = [side.id for side in sides
+                         if isinstance(side, ast.Name)]
+                values = [getattr(side, str_field) for side in sides
+                          if isinstance(side, str_node)]
+                if names == ['__name__'] and values == ['__main__']:
+                    has_guard = True
+
+    return has_main and has_guard
+
+def load_python_app(script_path):
+    """
+    Import a python application and return its main function.
+
+    Imported modules are cached, hence every application is imported only
+    once per process. Applications that do not pass
+    is_python_app_importable are never imported and cannot be run
+    in-process; None is returned for those.
+
+    Parameters
+    ----------
+    script_path: string
+        Path to the python script of the application.
+
+    Returns
+    -------
+    main: callable or None
+        The main function of the application.
+
+    """
+
+    script_path = os.path.abspath(script_path)
+
+    if script_path not in app_module_cache.keys():
+
+        main = None
+
+        if not is_python_app_importable(script_path):
+            app_module_cache.update({script_path: None})
+            return None
 
         try:
-            result = subprocess.check_output(command, stderr=subprocess.STDOUT, shell=True)
-            returncode = 0
-        except subprocess.CalledProcessError as e:
-            result = e.output
-            returncode = e.returncode
+            # the script directory is needed on the path for the imports of
+            # the application
+            script_dir = os.path.dirname(script_path)
+            if script_dir not in sys.path:
+                sys.path.insert(0, script_dir)
+
+            # every module gets a unique name to avoid clashes between
+            # applications that use the same file name
+            module_name = 'whale_app_{}'.format(len(app_module_cache))
+            spec = importlib.util.spec_from_file_location(module_name,
+                                                          script_path)
+            app_module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(app_module)
+
+            main = getattr(app_module, 'main', None)
+
+            if main is not None:
+                # main needs to take the list of command line arguments
+                if len(inspect.signature(main).parameters) != 1:
+                    main = None
 
-        if returncode != 0:
-            log_error('return code: {}'.format(returncode))
+        except Exception:
+            log_msg('Failed to import {} for in-process execution:\n{}'.format(
+                script_path, traceback.format_exc()))
+            main = None
 
-        if platform.system() == 'Windows':
-            return result.decode(sys.stdout.encoding), returncode
+        app_module_cache.update({script_path: main})
+
+    return app_module_cache[script_path]
+
+def run_python_app(script_path, arg_list, cwd=None):
+    """
+    Run a python application in the current process.
+
+    The main(args) function of the application is called with the list of
+    command line arguments. The working directory and sys.argv are set for
+    the duration of the call and restored afterwards, and everything the
+    application prints is collected as its output.
+
+    Parameters
+    ----------
+    script_path: string
+        Path to the python script of the application.
+    arg_list: list of strings
+        Command line arguments for the application (without the script).
+    cwd: string, optional
+        The working directory for the application. Defaults to the current
+        working directory.
+
+    Returns
+    -------
+    result: string or None
+        The output of the application. None is returned if the application
+        cannot be run in-process.
+    returncode: int or None
+        0 if the application finished successfully.
+
+    """
+
+    main = load_python_app(script_path)
+
+    if main is None:
+        return None, None
+
+    orig_cwd = os.getcwd()
+    orig_argv = sys.argv
+
+    output = StringIO()
+
+    try:
+        if cwd is not None:
+            os.chdir(cwd)
+        sys.argv = [script_path, ] + list(arg_list)
+
+        with redirect_stdout(output), redirect_stderr(output):
+            main(list(arg_list))
+        returncode = 0
+
+    except SystemExit as e:
+        if e.code in [None, 0]:
+            returncode = 0
+        elif isinstance(e.code, int):
+            returncode = e.code
         else:
-            #print(result, returncode)
-            return str(result), returncode
+            output.write(str(e.code))
+            returncode = 1
+
+    except Exception:
+        output.write(traceback.format_exc())
+        returncode = 1
+
+    finally:
+        sys.argv = orig_argv
+        os.chdir(orig_cwd)
+
+    if returncode != 0:
+        log_error('return code: {}'.format(returncode))
+
+    return output.getvalue(), returncode
 
 def show_warning(warning_msg):
     warnings.warn(UserWarning(warning_msg))
@@ -349,12 +530,17 @@ class Workflow(object):
         Explain...
     app_registry: string
         Explain...
+    in_process: bool, optional
+        If True, python applications that expose a main(args) function are
+        run in the process of the workflow instead of a new python
+        interpreter. Other applications are run in a subprocess.
+        Default: False
 
     """
 
     def __init__(self, run_type, input_file, app_registry, app_type_list,
         reference_dir=None, working_dir=None, app_dir=None,
-        units=None, outputs=None):
+        units=None, outputs=None, in_process=False):
 
         log_msg('Inputs provided:')
         log_msg('\tworkflow input file: {}'.format(input_file))
@@ -373,6 +559,7 @@ class Workflow(object):
         self.app_type_list = app_type_list
         self.units = units
         self.outputs = outputs
+        self.in_process = in_process
 
         # initialize app registry
         self._init_app_registry()
@@ -384,6 +571,55 @@ class Workflow(object):
         self.workflow_apps = {}
         self._parse_inputs()
 
+    def _run_app(self, command_list, cwd=None):
+        """
+        Run a workflow application.
+
+        Python applications are run in-process if requested and supported by
+        the application; everything else is run in a subprocess.
+
+        Parameters
+        ----------
+        command_list: array of unicode strings
+            The command prepared by WorkflowApplication.get_command_list
+        cwd: string, optional
+            The working directory of the application. Defaults to the current
+            working directory.
+
+        """
+
+        if self.in_process and command_list[0] == 'python':
+
+            result, returncode = run_python_app(command_list[1],
+                                                command_list[2:], cwd=cwd)
+
+            if result is not None:
+                return result, returncode
+
+            log_msg('\t{} cannot run in-process, using a subprocess '
+                    'instead.'.format(command_list[1]))
+
+        return run_command(create_command(command_list), cwd=cwd)
+
+    def _get_sim_dir(self, bldg_id=None):
+        """
+        Return the path to the simulation directory of a building.
+
+        The simulation directory is the building directory in regional
+        analyses and the run directory when a single asset is analyzed.
+
+        Parameters
+        ----------
+        bldg_id: string, optional
+            ID of the building.
+
+        """
+
+        if bldg_id is not None:
+            return posixpath.join(self.run_dir, str(bldg_id))
+        else:
+            return self.run_dir
+
     def _init_app_registry(self):
         """
         Initialize the dictionary where we keep the data on available apps.
@@ -620,7 +856,7 @@ class Workflow(object):
         log_msg('Creating initial building files...')
         log_msg('\n{}\n'.format(command), prepend_timestamp=False)
 
-        result, returncode = run_command(command)
+        result, returncode = self._run_app(bldg_command_list)
 
         log_msg('\tOutput: ')
         log_msg('\n{}\n'.format(result), prepend_timestamp=False)
@@ -657,7 +893,7 @@ class Workflow(object):
 
         log_msg('\n{}\n'.format(command), prepend_timestamp=False)
 
-        result, returncode = run_command(command)
+        result, returncode = self._run_app(reg_event_command_list)
 
         log_msg('\tOutput: ')
         log_msg('\n{}\n'.format(result), prepend_timestamp=False)
@@ -677,51 +913,49 @@ class Workflow(object):
         """
         log_msg('Initializing the simulation directory')
 
-        os.chdir(self.run_dir)
+        sim_dir = self._get_sim_dir(bldg_id)
+        template_dir = posixpath.join(sim_dir, 'templatedir')
 
         if bldg_id is not None:
 
             # if the directory already exists, remove its contents
-            if bldg_id in os.listdir(self.run_dir):
-                shutil.rmtree(bldg_id, ignore_errors=True)
+            if os.path.exists(sim_dir):
+                shutil.rmtree(sim_dir, ignore_errors=True)
 
             # create the building_id dir and the template dir
-            os.mkdir(bldg_id)
-            os.chdir(bldg_id)
-            os.mkdir('templatedir')
-            os.chdir('templatedir')
+            os.makedirs(template_dir)
 
             # Make a copy of the BIM file
+            BIM_path = posixpath.join(template_dir, BIM_file)
             shutil.copy(
                 src = posixpath.join(self.run_dir, BIM_file),
-                dst = posixpath.join(
-                    self.run_dir,
-                    '{}/templatedir/{}'.format(bldg_id, BIM_file)))
+                dst = BIM_path)
 
             # Open the BIM file and add the unit information to it
             if self.units is not None:
-                with open(BIM_file, 'r') as f:
+                with open(BIM_path, 'r') as f:
                     BIM_data = json.load(f)
 
                 BIM_data.update({'units': self.units})
 
-                with open(BIM_file, 'w') as f:
+                with open(BIM_path, 'w') as f:
                     json.dump(BIM_data, f, indent=2)
 
         else:
 
-            for dir_or_file in os.listdir(os.getcwd()):
+            for dir_or_file in os.listdir(sim_dir):
                 if dir_or_file not in ['log.txt', 'templatedir']:
+                    dir_or_file = posixpath.join(sim_dir, dir_or_file)
                     if os.path.isdir(dir_or_file):
                         shutil.rmtree(dir_or_file)
                     else:
                         os.remove(dir_or_file)
 
-            os.chdir('templatedir') #TODO: we might want to add a generic id dir to be consistent with the regional workflow here
+            #TODO: we might want to add a generic id dir to be consistent with the regional workflow here
 
             # Make a copy of the input file and rename it to BIM.json
             # This is a temporary fix, will be removed eventually.
-            dst = posixpath.join(os.getcwd(),BIM_file)
+            dst = posixpath.join(template_dir, BIM_file)
             if BIM_file != self.input_file:
                 shutil.copy(src = self.input_file, dst = dst)
 
@@ -740,15 +974,13 @@ class Workflow(object):
         """
         log_msg('Cleaning up the simulation directory.')
 
-        os.chdir(self.run_dir)
-
-        if bldg_id is not None:
-            os.chdir(bldg_id)
+        sim_dir = self._get_sim_dir(bldg_id)
 
-        workdirs = os.listdir(os.getcwd())
+        workdirs = os.listdir(sim_dir)
         for workdir in workdirs:
             if 'workdir' in workdir:
-                shutil.rmtree(workdir, ignore_errors=True)
+                shutil.rmtree(posixpath.join(sim_dir, workdir),
+                              ignore_errors=True)
 
         log_msg('Simulation directory successfully cleaned up.')
         log_msg(log_div)
@@ -818,12 +1050,7 @@ class Workflow(object):
 
         log_msg('Creating files with random variables')
 
-        os.chdir(self.run_dir)
-
-        if bldg_id is not None:
-            os.chdir(bldg_id)
-
-        os.chdir('templatedir')
+        template_dir = posixpath.join(self._get_sim_dir(bldg_id), 'templatedir')
 
         for app_type in self.optional_apps:
             if ((app_type in app_sequence) and
@@ -850,7 +1077,7 @@ class Workflow(object):
             log_msg('\tRunning {} app for RV...'.format(app_type))
             log_msg('\n{}\n'.format(command), prepend_timestamp=False)
 
-            result, returncode = run_command(command)
+            result, returncode = self._run_app(command_list, cwd=template_dir)
 
             log_msg('\tOutput: ')
             log_msg('\n{}\n'.format(result), prepend_timestamp=False)
@@ -872,12 +1099,8 @@ class Workflow(object):
         if 'UQ' in self.workflow_apps.keys():
             log_msg('Creating the workflow driver file')
 
-            os.chdir(self.run_dir)
-
-            if bldg_id is not None:
-                os.chdir(bldg_id)
-
-            os.chdir('templatedir')
+            template_dir = posixpath.join(self._get_sim_dir(bldg_id),
+                                          'templatedir')
 
             driver_script = u''
 
@@ -902,7 +1125,7 @@ class Workflow(object):
             log_msg('Workflow driver script:')
             log_msg('\n{}\n'.format(driver_script), prepend_timestamp=False)
 
-            with open('driver','w') as f:
+            with open(posixpath.join(template_dir, 'driver'),'w') as f:
                 f.write(driver_script)
 
             log_msg('Workflow driver file successfully created.')
@@ -925,12 +1148,7 @@ class Workflow(object):
         if 'UQ' in self.workflow_apps.keys():
             log_msg('Running response simulation')
 
-            os.chdir(self.run_dir)
-
-            if bldg_id is not None:
-                os.chdir(bldg_id)
-
-            os.chdir('templatedir')
+            sim_dir = self._get_sim_dir(bldg_id)
 
             workflow_app = self.workflow_apps['UQ']
 
@@ -952,16 +1170,15 @@ class Workflow(object):
             log_msg('\tSimulation command:')
             log_msg('\n{}\n'.format(command), prepend_timestamp=False)
 
-            result, returncode = run_command(command)
+            result, returncode = self._run_app(
+                command_list, cwd=posixpath.join(sim_dir, 'templatedir'))
 
             log_msg('\tOutput: ')
             log_msg('\n{}\n'.format(result), prepend_timestamp=False)
 
             # create the response.csv file from the dakotaTab.out file
-            os.chdir(self.run_dir)
-            if bldg_id is not None:
-                os.chdir(bldg_id)
-            dakota_out = pd.read_csv('dakotaTab.out', sep=r'\s+', header=0, index_col=0)
+            dakota_out = pd.read_csv(posixpath.join(sim_dir, 'dakotaTab.out'),
+                                     sep=r'\s+', header=0, index_col=0)
 
             # if the DL is coupled with response estimation, we need to sort the results
             DL_app = self.workflow_apps.get('DL', None)
@@ -975,7 +1192,7 @@ class Workflow(object):
                         dakota_out = dakota_out.iloc[sorter, :]
                         dakota_out.index = np.arange(dakota_out.shape[0])
 
-            dakota_out.to_csv('response.csv')
+            dakota_out.to_csv(posixpath.join(sim_dir, 'response.csv'))
 
             if self.run_type == 'run':
                 log_msg('Response simulation finished successfully.')
@@ -989,10 +1206,10 @@ class Workflow(object):
             log_msg('')
 
             # copy the response.csv from the templatedir to the run dir
-            os.chdir(self.run_dir)
-            if bldg_id is not None:
-                os.chdir(bldg_id)
-            shutil.copy(src = 'templatedir/response.csv', dst = 'response.csv')
+            sim_dir = self._get_sim_dir(bldg_id)
+            shutil.copy(
+                src = posixpath.join(sim_dir, 'templatedir/response.csv'),
+                dst = posixpath.join(sim_dir, 'response.csv'))
 
 
     def estimate_losses(self, BIM_file = 'BIM.json', bldg_id = None, input_file = None):
@@ -1008,7 +1225,7 @@ class Workflow(object):
         if 'DL' in self.workflow_apps.keys():
             log_msg('Running damage and loss assessment')
 
-            os.chdir(self.run_dir)
+            sim_dir = self.run_dir
 
             if 'Building' not in self.app_type_list:
                 # Copy the dakota.json file from the templatedir to the run_dir so that
@@ -1023,7 +1240,7 @@ class Workflow(object):
                     src = posixpath.join(self.run_dir, BIM_file),
                     dst = posixpath.join(self.run_dir,
                                          '{}/{}'.format(bldg_id, BIM_file)))
-                os.chdir(str(bldg_id))
+                sim_dir = self._get_sim_dir(bldg_id)
 
             workflow_app = self.workflow_apps['DL']
 
@@ -1041,7 +1258,7 @@ class Workflow(object):
             log_msg('\tDamage and loss assessment command:')
             log_msg('\n{}\n'.format(command), prepend_timestamp=False)
 
-            result, returncode = run_command(command)
+            result, returncode = self._run_app(command_list, cwd=sim_dir)
 
             log_msg(result, prepend_timestamp=False)
 
@@ -1063,7 +1280,10 @@ class Workflow(object):
             log_msg('No DL requested, loss assessment step is skipped.')
             log_msg('')
 
-            EDP_df = pd.read_csv('response.csv', header=0, index_col=0)
+            sim_dir = self._get_sim_dir(bldg_id)
+
+            EDP_df = pd.read_csv(posixpath.join(sim_dir, 'response.csv'),
+                                 header=0, index_col=0)
 
             col_info = []
             for col in EDP_df.columns:
@@ -1100,24 +1320,32 @@ class Workflow(object):
             df_res = df_res.astype(float)
 
             # save the output
-            df_res.to_csv('EDP.csv')
+            df_res.to_csv(posixpath.join(sim_dir, 'EDP.csv'))
 
-    def aggregate_results(self, bldg_data):
+    def store_results(self, bldg_id):
         """
-        Short description
+        Add the results of a building to the results store.
 
-        Longer description
+        The store is a collection of HDF5 files in the results_store folder of
+        the run directory. Every process writes to its own file, so buildings
+        that run in parallel never write the same file. Each output type is
+        saved in a table that is appended by every building and identified by
+        the building ID. This allows aggregate_results to merge the data of
+        all buildings without parsing their csv files again.
 
         Parameters
         ----------
+        bldg_id: string
+            Building ID.
         """
 
-        log_msg('Collecting damage and loss results')
+        log_msg('Storing the results of building {}'.format(bldg_id))
 
-        os.chdir(self.run_dir)
+        sim_dir = self._get_sim_dir(bldg_id)
 
-        min_id = int(bldg_data[0]['id'])
-        max_id = int(bldg_data[0]['id'])
+        store_dir = posixpath.join(self.run_dir, 'results_store')
+        os.makedirs(store_dir, exist_ok=True)
+        store_path = posixpath.join(store_dir, f'part_{os.getpid()}.hdf')
 
         out_types = ['EDP', 'DM', 'DV', 'every_realization']
 
@@ -1126,89 +1354,204 @@ class Workflow(object):
             DM = [0, 1, 2],
             DV = [0, 1, 2, 3])
 
-        for out_type in out_types:
-            if (self.outputs is None) or (self.outputs.get(out_type, False)):
+        with pd.HDFStore(store_path, mode='a') as store:
 
-                if out_type == 'every_realization':
+            for out_type in out_types:
+                if (self.outputs is None) or (self.outputs.get(out_type, False)):
 
-                        realizations_EDP = None
-                        realizations_DL = None
+                    if out_type == 'every_realization':
 
-                        for bldg in bldg_data:
-                            bldg_id = bldg['id']
-                            min_id = min(int(bldg_id), min_id)
-                            max_id = max(int(bldg_id), max_id)
+                        # EDP realizations are always saved; if damage and
+                        # loss assessment is part of the workflow then save
+                        # the DL realizations too
+                        real_files = [('EDP', 'response.csv'), ]
+                        if 'DL' in self.workflow_apps.keys():
+                            real_files.append(('DL', 'DL_summary.csv'))
+
+                        for res_type, res_file in real_files:
+
+                            try:
+                                df_i = pd.read_csv(
+                                    posixpath.join(sim_dir, res_file),
+                                    header=0, index_col=0)
+                            except FileNotFoundError:
+                                log_msg(f'No {res_type} realization data '
+                                        f'found for building {bldg_id}')
+                                continue
+
+                            # the realizations are saved in long format
+                            # because a table with one column per
+                            # realization cannot be written by PyTables
+                            # for large numbers of samples
+                            df_i = df_i.astype(float)
+                            n_real, n_type = df_i.shape
+                            if pd.api.types.is_integer_dtype(df_i.index):
+                                real_ids = df_i.index.values
+                            else:
+                                real_ids = np.arange(n_real)
+                            df_long = pd.DataFrame({
+                                'id': int(bldg_id),
+                                'type': np.tile(
+                                    [str(col) for col in df_i.columns],
+                                    n_real),
+                                'realization': np.repeat(real_ids, n_type),
+                                'value': df_i.values.ravel()})
+
+                            key = f'realizations_{res_type}'
+                            try:
+                                store.append(key, df_long, index=False,
+                                             data_columns=['id', 'type'],
+                                             min_itemsize={'type': 256})
+                            except Exception:
+                                log_msg(f'Error storing {res_type} '
+                                        f'realization data for building '
+                                        f'{bldg_id}:\n'
+                                        f'{traceback.format_exc()}')
+                                raise
 
-                            # save all EDP realizations
+                    else:
 
-                            df_i = pd.read_csv(bldg_id+'/response.csv', header=0, index_col=0)
+                        try:
+                            df_i = pd.read_csv(
+                                posixpath.join(sim_dir, f'{out_type}.csv'),
+                                header=headers[out_type], index_col=0)
+
+                            # the columns are saved in long format because
+                            # the set of columns can vary among buildings
+                            df_long = pd.DataFrame({
+                                'id': int(bldg_id),
+                                'column': ['\t'.join(col)
+                                           for col in df_i.columns],
+                                'value': df_i.iloc[0].values.astype(float)})
+
+                            store.append(out_type, df_long, index=False,
+                                         data_columns=['id', ],
+                                         min_itemsize={'column': 256})
+                            store.get_storer(out_type).attrs.column_info = list(
+                                df_i.columns.names)
+
+                        except FileNotFoundError:
+                            log_msg(f'No {out_type} data found for '
+                                    f'building {bldg_id}')
+
+                        except Exception:
+                            log_msg(f'Error storing {out_type} data for '
+                                    f'building {bldg_id}:\n'
+                                    f'{traceback.format_exc()}')
+                            raise
+
+    def _read_results_store(self, key):
+
+        store_files = sorted(glob.glob(
+            posixpath.join(self.run_dir, 'results_store', 'part_*.hdf')))
+
+        df_list = []
+        column_info = None
+        for store_file in store_files:
+            with pd.HDFStore(store_file, mode='r') as store:
+                if key in store:
+                    df_list.append(store.select(key))
+                    column_info = getattr(store.get_storer(key).attrs,
+                                          'column_info', None)
+
+        if len(df_list) == 0:
+            return None, None
+
+        return pd.concat(df_list, axis=0, ignore_index=True), column_info
 
-                            if realizations_EDP == None:
-                                realizations_EDP = dict([(col, []) for col in df_i.columns])
+    def aggregate_results(self, bldg_data):
+        """
+        Collect the results of the buildings from the results store.
 
-                            for col in df_i.columns:
-                                vals = df_i.loc[:,col].to_frame().T
-                                vals.index = [bldg_id,]
-                                realizations_EDP[col].append(vals)
+        The results of every building need to be added to the store by
+        store_results before this method is called. The EDP, DM, and DV
+        results are saved in csv files, while the realizations are saved in an
+        HDF5 file with one key for each result type.
 
-                            # If damage and loss assessment is part of the workflow
-                            # then save the DL outputs too
-                            if 'DL' in self.workflow_apps.keys():
+        Parameters
+        ----------
+        bldg_data: list of dict
+            Buildings with their IDs. The results are saved in this order.
+        """
 
-                                try:
-                                #if True:
-                                    df_i = pd.read_csv(bldg_id+f'/DL_summary.csv',
-                                                       header=0, index_col=0)
+        log_msg('Collecting damage and loss results')
 
-                                    if realizations_DL == None:
-                                        realizations_DL = dict([(col, []) for col in df_i.columns])
+        bldg_ids = [int(bldg['id']) for bldg in bldg_data]
+        min_id = min(bldg_ids)
+        max_id = max(bldg_ids)
 
-                                    for col in df_i.columns:
-                                        vals = df_i.loc[:,col].to_frame().T
-                                        vals.index = [bldg_id,]
-                                        realizations_DL[col].append(vals)
+        out_types = ['EDP', 'DM', 'DV', 'every_realization']
 
-                                except:
-                                    log_msg(f'Error reading DL realization data for building {bldg_id}')
+        for out_type in out_types:
+            if (self.outputs is None) or (self.outputs.get(out_type, False)):
 
-                        for d_type in realizations_EDP.keys():
-                            d_agg = pd.concat(realizations_EDP[d_type], axis=0, sort=False)
+                if out_type == 'every_realization':
 
-                            d_agg.to_hdf(f'realizations_{min_id}-{max_id}.hdf', f'EDP-{d_type}', mode='a', format='fixed')
+                    res_types = ['EDP', ]
+                    if 'DL' in self.workflow_apps.keys():
+                        res_types.append('DL')
 
-                        if 'DL' in self.workflow_apps.keys():
-                            for d_type in realizations_DL.keys():
-                                d_agg = pd.concat(realizations_DL[d_type], axis=0, sort=False)
-                                #d_agg.sort_index(axis=0, inplace=True)
+                    for res_type in res_types:
 
-                                d_agg.to_hdf(f'realizations_{min_id}-{max_id}.hdf', f'DL-{d_type}', mode='a', format='fixed')
+                        df_real, __ = self._read_results_store(
+                            f'realizations_{res_type}')
 
+                        if df_real is None:
+                            log_msg(f'No {res_type} realization data found')
+                            continue
 
+                        df_real = df_real.drop_duplicates(
+                            ['id', 'type', 'realization'], keep='last')
+
+                        for d_type, d_long in df_real.groupby('type', sort=False):
+
+                            # buildings in the rows, the realizations of
+                            # all buildings in the columns
+                            d_agg = d_long.pivot(index='id',
+                                                 columns='realization',
+                                                 values='value')
+                            d_agg = d_agg.reindex(
+                                index=[b_id for b_id in bldg_ids
+                                       if b_id in d_agg.index],
+                                columns=np.sort(d_agg.columns.values))
+                            d_agg.columns.name = None
+
+                            d_agg.index = [str(b_id) for b_id in d_agg.index]
+
+                            d_agg.to_hdf(
+                                posixpath.join(self.run_dir,
+                                    f'realizations_{min_id}-{max_id}.hdf'),
+                                key=f'{res_type}-{d_type}', mode='a',
+                                format='fixed')
 
                 else:
-                    out_list = []
 
-                    for bldg in bldg_data:
-                        bldg_id = bldg['id']
-                        min_id = min(int(bldg_id), min_id)
-                        max_id = max(int(bldg_id), max_id)
+                    df_long, col_names = self._read_results_store(out_type)
 
-                        try:
-                        #if True:
-                            # EDP data
-                            df_i = pd.read_csv(bldg_id+f'/{out_type}.csv',
-                                               header=headers[out_type], index_col=0)
-                            df_i.index = [bldg_id,]
-                            out_list.append(df_i)
+                    if df_long is None:
+                        log_msg(f'No {out_type} data found')
+                        continue
+
+                    df_long = df_long.drop_duplicates(['id', 'column'],
+                                                      keep='last')
+
+                    # keep the columns in the order they were first seen
+                    columns = pd.unique(df_long['column'])
 
-                        except:
-                            log_msg(f'Error reading {out_type} data for building {bldg_id}')
+                    out_agg = df_long.pivot(
+                        index='id', columns='column', values='value')
+                    out_agg = out_agg.reindex(
+                        index=[b_id for b_id in bldg_ids if b_id in out_agg.index],
+                        columns=columns)
 
-                    out_agg = pd.concat(out_list, axis=0, sort=False)
-                    #out_agg.sort_index(axis=0, inplace=True)
+                    out_agg.columns = pd.MultiIndex.from_tuples(
+                        [tuple(col.split('\t')) for col in columns],
+                        names=col_names)
+                    out_agg.index = [str(b_id) for b_id in out_agg.index]
 
                     # save the collected DataFrames as csv files
-                    out_agg.to_csv(f'{out_type}_{min_id}-{max_id}.csv')
+                    out_agg.to_csv(posixpath.join(
+                        self.run_dir, f'{out_type}_{min_id}-{max_id}.csv'))
 
         log_msg('Damage and loss results collected successfully.')
         log_msg(log_div)
@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of the SimCenter Backend Applications
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# this file. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Kuanshi Zhong
+#
+
+from collections.abc import MutableMapping
+import json
+import numpy as np
+import pandas as pd
+
+# Optional site columns and the labels accepted in the station csv files
+SITE_LABELS = {
+    'Vs30': ['Vs30', 'vs30', 'Vs_30', 'vs_30'],
+    'z1.0': ['Z1p0', 'z1p0', 'Z10', 'z10', 'Z1.0', 'z1.0'],
+    'z2.5': ['Z2p5', 'z2p5', 'Z25', 'z25', 'Z2.5', 'z2.5']
+}
+
+
+def get_label(options, labels, label_name):
+
+    for option in options:
+        if option in labels:
+            labels = labels[labels != option]
+            return option, labels
+
+    print(f'WARNING: Could not identify the label for the {label_name}')
+
+
+def get_z1(vs30):
+    """
+    Estimating the depth to Vs = 1.0 km/s (km) from Vs30 (m/s)
+    Reference:
+        Chiou and Youngs (2014), California
+    """
+    return np.exp(-7.15 / 4.0 * np.log((vs30 ** 4 + 571.0 ** 4) /
+                                       (1360.0 ** 4 + 571.0 ** 4))) / 1000.0
+
+
+def get_z2p5(vs30):
+    """
+    Estimating the depth to Vs = 2.5 km/s (km) from Vs30 (m/s)
+    Reference:
+        Campbell and Bozorgnia (2014), California
+    """
+    return np.exp(7.089 - 1.144 * np.log(vs30))
+
+
+class StationRow(MutableMapping):
+    """
+    Dictionary view of one station of a StationTable
+
+    Values are read from and written to the columns of the table; missing
+    values (NaN) are treated as missing keys, as in the station dictionaries.
+    """
+
+    def __init__(self, table, index):
+
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+
+        if key not in self.table.columns.keys():
+            raise KeyError(key)
+        value = self.table.columns[key][self.index]
+        if (value is None) or (isinstance(value, float) and np.isnan(value)):
+            raise KeyError(key)
+        return value.item() if isinstance(value, np.generic) else value
+
+    def __setitem__(self, key, value):
+
+        self.table.set_value(key, self.index, value)
+
+    def __delitem__(self, key):
+
+        self.table.set_value(key, self.index, np.nan)
+
+    def __iter__(self):
+
+        return iter([k for k in self.table.columns.keys() if k in self])
+
+    def __len__(self):
+
+        return len(list(iter(self)))
+
+    def __contains__(self, key):
+
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __repr__(self):
+
+        return repr(dict(self))
+
+
+class StationTable:
+    """
+    Table of stations stored in NumPy columns
+
+    The table behaves as a list of station dictionaries (e.g.,
+    stations[j]['Vs30']) for the existing scripts, while vectorized code can
+    use the columns directly (e.g., stations['Latitude']).
+    Columns:
+        ID (int, or as read if the IDs are not integers), Longitude,
+        Latitude, and optional site data (Vs30, z1.0, z2.5; NaN if unknown)
+    """
+
+    def __init__(self, columns = None):
+
+        self.columns = dict()
+        if columns is not None:
+            for k, v in columns.items():
+                self.columns[k] = np.asarray(v)
+
+    @classmethod
+    def from_csv(cls, input_file, min_id = None, max_id = None):
+        """
+        Reading stations from a csv file (the first column is the ID)
+        Input:
+            input_file: the filename of the station csv file
+            min_id: the min ID to start
+            max_id: the max ID to end
+        Output:
+            table: StationTable
+        """
+        stn_df = pd.read_csv(input_file, header = 0, index_col = 0)
+        labels = stn_df.columns.values
+        try:
+            lon_label, labels = get_label(['Longitude', 'longitude', 'lon', 'Lon'], labels, 'longitude')
+            lat_label, labels = get_label(['Latitude', 'latitude', 'lat', 'Lat'], labels, 'latitude')
+        except TypeError:
+            raise ValueError('StationTable: {} does not have the longitude and latitude columns.'.format(input_file))
+        columns = {'ID': stn_df.index.values,
+                   'Longitude': stn_df[lon_label].values.astype(float),
+                   'Latitude': stn_df[lat_label].values.astype(float)}
+        for name, options in SITE_LABELS.items():
+            if any([i in options for i in labels]):
+                cur_label, labels = get_label(options, labels, name)
+                values = pd.to_numeric(stn_df[cur_label], errors = 'coerce').values.astype(float)
+                # zero values were treated as missing in the station dictionaries
+                columns[name] = np.where(values == 0.0, np.nan, values)
+        table = cls(columns)
+        # return
+        return table.filter_ids(min_id, max_id)
+
+    @classmethod
+    def from_list(cls, stations):
+        """
+        Creating a table from a list of station dictionaries
+        """
+        keys = []
+        for s in stations:
+            keys.extend([k for k in s.keys() if k not in keys])
+        columns = dict()
+        for k in keys:
+            values = [s.get(k, np.nan) for s in stations]
+            try:
+                columns[k] = np.array(values, dtype = int if k == 'ID' else float)
+            except (TypeError, ValueError):
+                columns[k] = np.array(values, dtype = object)
+        # return
+        return cls(columns)
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Loading a table saved by save
+        """
+        with np.load(file_path, allow_pickle = False) as data:
+            columns = {k: data[k] for k in data.files}
+        # return
+        return cls(columns)
+
+    def save(self, file_path):
+        """
+        Saving the table to a compressed npz file (one array per column)
+        """
+        np.savez_compressed(file_path, **{k: v if v.dtype != object else v.astype(str)
+                                          for k, v in self.columns.items()})
+
+    def __len__(self):
+
+        return len(self.columns['ID']) if 'ID' in self.columns.keys() else 0
+
+    def __getitem__(self, key):
+
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key = key + len(self)
+            if not 0 <= key < len(self):
+                raise IndexError('station index out of range')
+            return StationRow(self, key)
+        # subset of the stations (slice, indices, or mask)
+        return StationTable({k: v[key] for k, v in self.columns.items()})
+
+    def __iter__(self):
+
+        for i in range(len(self)):
+            yield StationRow(self, i)
+
+    def get_column(self, name, default = np.nan):
+        """
+        Getting a column (filled with the default value if it does not exist)
+        """
+        if name in self.columns.keys():
+            return self.columns[name]
+        return np.full(len(self), default)
+
+    def set_value(self, name, index, value):
+        """
+        Setting the value of a station (the column is created if needed)
+        """
+        if name not in self.columns.keys():
+            if isinstance(value, (int, float, np.number)):
+                self.columns[name] = np.full(len(self), np.nan)
+            else:
+                self.columns[name] = np.full(len(self), None, dtype = object)
+        column = self.columns[name]
+        if (column.dtype.kind in 'iu') and not float(value).is_integer():
+            column = column.astype(float)
+            self.columns[name] = column
+        column[index] = value
+
+    def filter_ids(self, min_id = None, max_id = None):
+        """
+        Selecting the stations with min_id <= ID <= max_id
+        """
+        ids = self.columns['ID']
+        if (min_id is None) and (max_id is None):
+            return self
+        if ids.dtype.kind not in 'iuf':
+            raise ValueError('StationTable: min_id and max_id need numeric station IDs '
+                             '(found IDs like {}); remove them to use all stations.'.format(repr(ids[0])))
+        tag = np.ones(len(ids), dtype = bool)
+        if min_id is not None:
+            tag = tag & (ids >= min_id)
+        if max_id is not None:
+            tag = tag & (ids <= max_id)
+        # return
+        return self[tag]
+
+    def derive_site_params(self, vs30_default = None, derive_depths = True):
+        """
+        Filling the missing site data
+        Input:
+            vs30_default: Vs30 (m/s) of the stations without Vs30 (optional)
+            derive_depths: estimating the missing z1.0 and z2.5 from Vs30 (see
+                           get_z1 and get_z2p5)
+        """
+        vs30 = self.get_column('Vs30').astype(float)
+        if vs30_default is not None:
+            vs30 = np.where(np.isnan(vs30), vs30_default, vs30)
+            self.columns['Vs30'] = vs30
+        if not derive_depths:
+            return
+        with np.errstate(invalid = 'ignore'):
+            for name, get_depth in [('z1.0', get_z1), ('z2.5', get_z2p5)]:
+                depth = self.get_column(name).astype(float)
+                self.columns[name] = np.where(np.isnan(depth), get_depth(vs30), depth)
+
+    def to_list(self):
+        """
+        Converting the table to a list of station dictionaries
+        """
+        return [dict(s) for s in self]
+
+    def to_json(self, file_path):
+        """
+        Saving the stations to a json file ({'Stations': [...]})
+        """
+        with open(file_path, 'w') as f:
+            json.dump({'Stations': self.to_list()}, f, indent = 2)
@@ -59,7 +59,7 @@ idx = pd.IndexSlice
 
 sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
 
-from pelicunPBE.base import str2bool
+from pelicunPBE.base import str2bool, set_log_file
 from pelicunPBE.control import FEMA_P58_Assessment, HAZUS_Assessment
 from pelicunPBE.auto import auto_populate
 
@@ -126,7 +126,7 @@ def run_pelicun(DL_input_path, EDP_input_path,
 	DL_method, realization_count, EDP_file, DM_file, DV_file,
 	output_path=None, detailed_results=True, coupled_EDP=False,
 	log_file=True, event_time=None, ground_failure=False,
-	auto_script_path=None):
+	auto_script_path=None, DL_data_cache=None):
 
 	DL_input_path = os.path.abspath(DL_input_path) # BIM file
 	EDP_input_path = os.path.abspath(EDP_input_path) # dakotaTab
@@ -246,11 +246,14 @@ def run_pelicun(DL_input_path, EDP_input_path,
 		stripe_str = '' if len(stripes) == 1 else str(stripe)+'_'
 
 		if DL_method == 'FEMA P58':
-			A = FEMA_P58_Assessment(log_file=log_file)
+			A = FEMA_P58_Assessment(log_file=log_file,
+									DL_data_cache=DL_data_cache)
 		elif DL_method in ['HAZUS MH EQ', 'HAZUS MH', 'HAZUS MH EQ IM']:
-			A = HAZUS_Assessment(hazard = 'EQ', log_file=log_file)
+			A = HAZUS_Assessment(hazard = 'EQ', log_file=log_file,
+								 DL_data_cache=DL_data_cache)
 		elif DL_method == 'HAZUS MH HU':
-			A = HAZUS_Assessment(hazard = 'HU', log_file=log_file)
+			A = HAZUS_Assessment(hazard = 'HU', log_file=log_file,
+								 DL_data_cache=DL_data_cache)
 
 		A.read_inputs(DL_input_path, EDP_files[s_i], verbose=False) # make DL inputs into array of all BIM files
 
@@ -269,6 +272,123 @@ def run_pelicun(DL_input_path, EDP_input_path,
 
 	return 0
 
+def run_pelicun_batch(BIM_list, EDP_dir,
+	DL_method, realization_count, EDP_file, DM_file, DV_file,
+	output_path=None, EDP_input_file='response.csv', detailed_results=False,
+	coupled_EDP=False, log_file=True, event_time=None, ground_failure=False,
+	auto_script_path=None):
+	"""
+	Run the damage and loss assessment of several assets in one process.
+
+	The component damage and loss data is read and parsed only once and it is
+	shared by the assessments of all assets. This saves most of the
+	initialization time in regional analyses where assets use a small number
+	of archetypes.
+
+	Parameters
+	----------
+	BIM_list: list of dict or string
+		List of assets in the format of the rWHALE building file, i.e., dicts
+		with the 'id' of the asset and the path to its BIM 'file', or the path
+		to a json file with such a list.
+	EDP_dir: string
+		Directory with one subdirectory per asset ID that contains the EDP
+		input file of the asset.
+	output_path: string, optional
+		Results are saved in one subdirectory per asset ID under this
+		directory and the aggregated EDP, DM and DV results are saved in the
+		directory itself. Defaults to EDP_dir.
+	EDP_input_file: string, optional
+		Name of the EDP input file in the asset directories.
+	log_file: bool, optional
+		If True, one pelicun_log.txt is saved in the output_path for the
+		whole batch.
+
+	The remaining arguments are identical to those of run_pelicun.
+	"""
+
+	if isinstance(BIM_list, str):
+		with open(BIM_list, 'r') as f:
+			BIM_list = json.load(f)
+
+	EDP_dir = os.path.abspath(EDP_dir)
+
+	if output_path is None:
+		output_path = EDP_dir
+	output_path = os.path.abspath(output_path)
+
+	if log_file:
+		set_log_file(posixpath.join(output_path, 'pelicun_log.txt'))
+
+	DL_data_cache = {}
+
+	asset_IDs = []
+	for asset in BIM_list:
+		asset_ID = str(asset['id'])
+
+		log_msg('Running damage and loss assessment for asset {}'.format(
+			asset_ID))
+
+		asset_output_path = posixpath.join(output_path, asset_ID)
+		if not os.path.exists(asset_output_path):
+			os.mkdir(asset_output_path)
+
+		try:
+			run_pelicun(
+				asset['file'],
+				posixpath.join(EDP_dir, asset_ID, EDP_input_file),
+				DL_method, realization_count, EDP_file, DM_file, DV_file,
+				output_path = asset_output_path,
+				detailed_results = detailed_results,
+				coupled_EDP = coupled_EDP,
+				log_file = False,
+				event_time = event_time,
+				ground_failure = ground_failure,
+				auto_script_path = auto_script_path,
+				DL_data_cache = DL_data_cache)
+
+			asset_IDs.append(asset_ID)
+
+		except Exception as e:
+			log_msg('Damage and loss assessment failed for asset {}: {}'.format(
+				asset_ID, e))
+
+	log_msg('Parsed DL data for {} components.'.format(len(DL_data_cache)))
+
+	if len(asset_IDs) == 0:
+		return 0
+
+	# aggregate the SimCenter EDP, DM and DV files of the assets
+	asset_IDs_int = [int(asset_ID) for asset_ID in asset_IDs
+					 if asset_ID.isdigit()]
+	if len(asset_IDs_int) > 0:
+		ID_range = '{}-{}'.format(min(asset_IDs_int), max(asset_IDs_int))
+	else:
+		ID_range = 'batch'
+
+	headers = dict(
+		EDP = [0, 1, 2, 3],
+		DM = [0, 1, 2],
+		DV = [0, 1, 2, 3])
+
+	for out_type, out_file in zip(['EDP', 'DM', 'DV'],
+								  [EDP_file, DM_file, DV_file]):
+		out_list = []
+		for asset_ID in asset_IDs:
+			asset_file = posixpath.join(output_path, asset_ID, out_file)
+			if os.path.exists(asset_file):
+				df_i = pd.read_csv(asset_file, header=headers[out_type],
+								   index_col=0)
+				df_i.index = [asset_ID, ]
+				out_list.append(df_i)
+
+		if len(out_list) > 0:
+			out_agg = pd.concat(out_list, axis=0, sort=False)
+			out_agg.to_csv(posixpath.join(
+				output_path, '{}_{}.csv'.format(out_type, ID_range)))
+
+	return 0
+
 def main(args):
 
 	parser = argparse.ArgumentParser()
@@ -290,10 +410,32 @@ def main(args):
 	parser.add_argument('--ground_failure', default = False,
 		type = str2bool, nargs='?', const=False)
 	parser.add_argument('--auto_script', default=None)
+	parser.add_argument('--filenameBIMList', default=None)
+	parser.add_argument('--dirnameEDP', default=None)
+	parser.add_argument('--filenameEDPInput', default='response.csv')
 	args = parser.parse_args(args)
 
 	log_msg('Initializing pelicun calculation...')
 
+	# a list of BIM files triggers the batch assessment of several assets
+	if args.filenameBIMList is not None:
+		run_pelicun_batch(
+			args.filenameBIMList, args.dirnameEDP,
+			args.DL_Method, args.Realizations,
+			args.outputEDP, args.outputDM, args.outputDV,
+			output_path = args.dirnameOutput,
+			EDP_input_file = args.filenameEDPInput,
+			detailed_results = args.detailed_results,
+			coupled_EDP = args.coupled_EDP,
+			log_file = args.log_file,
+			event_time = args.event_time,
+			ground_failure = args.ground_failure,
+			auto_script_path = args.auto_script)
+
+		log_msg('pelicun calculation completed.')
+
+		return
+
 	#print(args)
 	run_pelicun(
 		args.filenameDL, args.filenameEDP,
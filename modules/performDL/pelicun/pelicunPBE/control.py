@@ -62,9 +62,18 @@ class Assessment(object):
     A high-level class that collects features common to all supported loss
     assessment methods. This class will only rarely be called directly when
     using pelicun.
+
+    Parameters
+    ----------
+    log_file: bool, optional
+        If True, the log is saved in pelicun_log.txt. Default: True.
+    DL_data_cache: dict, optional
+        Cache of parsed component damage and loss data. Assessments that share
+        a cache read and parse the data of each component only once. See
+        read_component_DL_data for details. Default: None - no caching.
     """
 
-    def __init__(self, log_file=True):
+    def __init__(self, log_file=True, DL_data_cache=None):
 
         # initialize the basic data containers
         # inputs
@@ -72,6 +81,7 @@ class Assessment(object):
         self._EDP_in = None
         self._POP_in = None
         self._FG_in = None
+        self._DL_data_cache = DL_data_cache
 
         # random variables and loss model
         self._RV_reg = RandomVariableRegistry() # object to manage RVs
@@ -703,8 +713,8 @@ class FEMA_P58_Assessment(Assessment):
     """
     An Assessment class that implements the loss assessment method in FEMA P58.
     """
-    def __init__(self, inj_lvls = 2, log_file=True):
-        super(FEMA_P58_Assessment, self).__init__(log_file)
+    def __init__(self, inj_lvls = 2, log_file=True, DL_data_cache=None):
+        super(FEMA_P58_Assessment, self).__init__(log_file, DL_data_cache)
 
         # constants for the FEMA-P58 methodology
         self._inj_lvls = inj_lvls
@@ -749,7 +759,8 @@ class FEMA_P58_Assessment(Assessment):
         self._FG_in = read_component_DL_data(
             self._AIM_in['data_sources']['path_CMP_data'],
             BIM['components'],
-            assessment_type=self._assessment_type, verbose=verbose)
+            assessment_type=self._assessment_type, verbose=verbose,
+            cache=self._DL_data_cache)
 
         data = self._FG_in
 
@@ -2271,10 +2282,23 @@ class FEMA_P58_Assessment(Assessment):
         return COL, collapsed_IDs
 
     def _calc_damage(self):
+        """
+        Estimate the quantity of damaged components in non-collapse cases.
+
+        The damage of a Fragility Group is evaluated in one pass: demands and
+        sampled EDP limits of every Component Subgroup (CSG) in the group are
+        stacked into (realizations x CSG x DSG) arrays, Damage State Groups
+        are assigned with a single broadcasted comparison, and the weighted
+        quantities are accumulated with a scatter-add over the flattened
+        (realization, PG, DS) cells. Random numbers for simultaneous damage
+        states are drawn in the same order as in the per-PG evaluation, hence
+        results are reproducible for a fixed seed.
 
+        """
         ncID = self._ID_dict['non-collapse']
         NC_samples = len(ncID)
-        DMG = pd.DataFrame()
+
+        FG_dmg_list = []
 
         s_fg_keys = sorted(self._FG_dict.keys())
         for fg_id in s_fg_keys:
@@ -2282,30 +2306,37 @@ class FEMA_P58_Assessment(Assessment):
             FG = self._FG_dict[fg_id]
 
             PG_set = FG._performance_groups
+            DSG_set = PG_set[0]._DSG_set
+            pg_count = len(PG_set)
+            dsg_count = len(DSG_set)
 
             DS_list = []
-            for DSG in PG_set[0]._DSG_set:
+            # position of the first DS of each DSG in the DS_list (the
+            # leading -1 corresponds to DSG 0, i.e., no damage)
+            DS_pos = [-1, ]
+            for DSG in DSG_set:
+                DS_pos.append(len(DS_list))
                 for DS in DSG._DS_set:
                     DS_list.append(str(DSG._ID) + '_' + str(DS._ID))
             d_count = len(DS_list)
+            DS_pos = np.array(DS_pos)
 
             MI = pd.MultiIndex.from_product([[FG._ID, ],
                                              [pg._ID for pg in PG_set],
                                              DS_list],
                                             names=['FG', 'PG', 'DSG_DS'])
 
-            FG_damages = pd.DataFrame(np.zeros((NC_samples, len(MI))),
-                                      columns=MI,
-                                      index=ncID)
-
+            # stack the quantities and demands of the performance groups and
+            # the EDP limits of every component subgroup in the FG
+            PG_qnt = np.empty((NC_samples, pg_count))
+            PG_EDP = np.empty((NC_samples, pg_count))
+            CSG_PG, CSG_w, CSG_lim, CSG_ME = [], [], [], []
             for pg_i, PG in enumerate(PG_set):
 
-                PG_ID = PG._ID
                 if isinstance(PG._quantity, RandomVariable):
-                    PG_qnt = PG._quantity.samples_DF.loc[ncID]
+                    PG_qnt[:, pg_i] = PG._quantity.samples_DF.values[ncID]
                 else:
-                    PG_qnt = pd.Series(np.ones(NC_samples) * PG._quantity,
-                                          index=ncID)
+                    PG_qnt[:, pg_i] = np.ones(NC_samples) * PG._quantity
 
                 # get the corresponding demands
                 if not FG._directional:
@@ -2317,25 +2348,22 @@ class FEMA_P58_Assessment(Assessment):
                             if int(demand_data[3]) == PG._location + FG._demand_location_offset:
                                 demand_ID_list.append(demand_ID)
 
-                    EDP_samples = self._EDP_dict[demand_ID_list[0]].samples_DF.loc[ncID]
-                    if len(demand_ID_list)>1:
-                        for demand_ID in demand_ID_list[1:]:
-                            new_samples = self._EDP_dict[demand_ID].samples_DF.loc[ncID]
-                            EDP_samples.update(
-                                pd.Series(np.maximum(new_samples.values,EDP_samples.values),
-                                          index=EDP_samples.index))
+                    EDP_samples = self._EDP_dict[
+                        demand_ID_list[0]].samples_DF.values[ncID]
+                    for demand_ID in demand_ID_list[1:]:
+                        new_samples = self._EDP_dict[
+                            demand_ID].samples_DF.values[ncID]
+                        EDP_samples = np.maximum(new_samples, EDP_samples)
 
                     # scale the max of inputs by 1.2 as per FEMA P58 vol 2 3.2.3
-                    EDP_samples *= 1.2
+                    EDP_samples = EDP_samples * 1.2
 
                 else:
                     demand_ID = ('EDP-' + FG._demand_type +
                              '-LOC-' + str(PG._location + FG._demand_location_offset) +
                              '-DIR-' + str(PG._direction))
 
-                    if demand_ID in self._EDP_dict.keys():
-                        EDP_samples = self._EDP_dict[demand_ID].samples_DF.loc[ncID]
-                    else:
+                    if demand_ID not in self._EDP_dict.keys():
                         # If the required demand is not available, then we are most
                         # likely analyzing a 3D structure using results from a 2D
                         # simulation. The best thing we can do in that particular
@@ -2343,73 +2371,116 @@ class FEMA_P58_Assessment(Assessment):
                         # directions.
                         demand_ID = ('EDP-' + FG._demand_type +
                                      '-LOC-' + str(PG._location + FG._demand_location_offset) + '-DIR-1')
-                        EDP_samples = self._EDP_dict[demand_ID].samples_DF.loc[ncID]
 
-                csg_w_list = PG._csg_weights
+                    EDP_samples = self._EDP_dict[demand_ID].samples_DF.values[ncID]
 
-                for csg_i, csg_w in enumerate(csg_w_list):
-                    DSG_df = PG._FF_set[csg_i].DSG_given_EDP(EDP_samples)
+                PG_EDP[:, pg_i] = EDP_samples
 
-                    for DSG in PG._DSG_set:
-                        in_this_DSG = DSG_df[DSG_df.values == DSG._ID].index
-                        if DSG._DS_set_kind == 'single':
-                            DS = DSG._DS_set[0]
-                            DS_tag = str(DSG._ID) + '_' + str(DS._ID)
-                            FG_damages.loc[in_this_DSG,
-                                           (FG._ID, PG_ID, DS_tag)] += csg_w
-                        elif DSG._DS_set_kind == 'mutually exclusive':
+                for csg_i, csg_w in enumerate(PG._csg_weights):
+                    CSG_PG.append(pg_i)
+                    CSG_w.append(csg_w)
+
+                    # EDP limits are evaluated in ascending order of their
+                    # names, consistently with FragilityFunction.DSG_given_EDP
+                    FF = PG._FF_set[csg_i]
+                    lim_order = np.argsort(FF._EDP_tags)
+                    CSG_lim.append(np.column_stack(
+                        [np.asarray(FF._EDP_limit[l_i].samples)[ncID]
+                         for l_i in lim_order]))
+
+                    # the sampled DS in mutually exclusive DSGs is stored as
+                    # an offset from the first DS of the DSG
+                    ME_offset = np.zeros((NC_samples, dsg_count), dtype=int)
+                    for dsg_i, DSG in enumerate(DSG_set):
+                        if DSG._DS_set_kind == 'mutually exclusive':
                             mut_ex_id = f'DSG-{fg_id}-DSG-{DSG._ID}-' \
                                         f'LOC-{PG._location}-' \
                                         f'DIR-{PG._direction}-CSG-{csg_i}'
-                            DS_df = self._DSG_dict[mut_ex_id].samples_DF.loc[in_this_DSG]
+                            ME_offset[:, dsg_i] = np.asarray(
+                                self._DSG_dict[mut_ex_id].samples)[ncID]
+                    CSG_ME.append(ME_offset)
+
+            CSG_PG = np.array(CSG_PG)
+            CSG_w = np.array(CSG_w, dtype=np.float64)
+            csg_count = len(CSG_PG)
+
+            # (realizations x CSG x DSG) arrays
+            CSG_lim = np.stack(CSG_lim, axis=1)
+            CSG_ME = np.stack(CSG_ME, axis=1)
+
+            # assign the DSG in every CSG: the damage corresponds to the
+            # highest DSG with an EDP limit below the demand
+            EXC = (CSG_lim - PG_EDP[:, CSG_PG][:, :, np.newaxis]) < 0.
+            CSG_DSG = np.where(np.any(EXC, axis=2),
+                               dsg_count - np.argmax(EXC[:, :, ::-1], axis=2),
+                               0)
+
+            # get the position of the damaged DS within the PG
+            DSG_kind = np.array(
+                ['none', ] + [DSG._DS_set_kind for DSG in DSG_set])
+            for kind in set(DSG_kind[1:]):
+                if kind not in ['single', 'mutually exclusive',
+                                'simultaneous']:
+                    raise ValueError(
+                        "Unknown damage state type: {}".format(kind))
+            CSG_DS = DS_pos[CSG_DSG]
+            ME_DSG = DSG_kind[CSG_DSG] == 'mutually exclusive'
+            CSG_DS[ME_DSG] += np.take_along_axis(
+                CSG_ME, np.maximum(CSG_DSG - 1, 0)[:, :, np.newaxis],
+                axis=2)[:, :, 0][ME_DSG]
+            CSG_DS[DSG_kind[CSG_DSG] == 'simultaneous'] = -1
+
+            # flattened (realization, PG, DS) cells and their weights
+            dmg_rows, dmg_csg = np.nonzero(CSG_DS >= 0)
+            cell_list = [dmg_rows * pg_count * d_count +
+                         CSG_PG[dmg_csg] * d_count +
+                         CSG_DS[dmg_rows, dmg_csg], ]
+            weight_list = [CSG_w[dmg_csg], ]
+
+            # simultaneous damage states require additional random sampling
+            for csg_i in range(csg_count):
+                for dsg_i, DSG in enumerate(DSG_set):
+                    if DSG._DS_set_kind != 'simultaneous':
+                        continue
 
-                            # DS_weights = [DS._weight for DS in DSG._DS_set]
-                            # DS_RV = RandomVariable(
-                            #     ID=-1, dimension_tags=['me_DS', ],
-                            #     distribution_kind='multinomial',
-                            #     p_set=DS_weights)
-                            # DS_df = DS_RV.sample_distribution(
-                            #     len(in_this_DSG)) + 1
+                    in_this_DSG = np.where(CSG_DSG[:, csg_i] == DSG._ID)[0]
 
-                            for DS in DSG._DS_set:
-                                DS_tag = str(DSG._ID) + '_' + str(DS._ID)
-                                in_this_DS = DS_df[DS_df.values == DS._ID-1].index
-                                FG_damages.loc[in_this_DS,
-                                               (FG._ID, PG_ID, DS_tag)] += csg_w
-                        elif DSG._DS_set_kind == 'simultaneous':
-                            DS_weights = [DS._weight for DS in DSG._DS_set]
-                            DS_df = np.random.uniform(
-                                size=(len(in_this_DSG), len(DS_weights)))
-                            which_DS = DS_df < DS_weights
-                            any_DS = np.any(which_DS, axis=1)
-                            no_DS_ids = np.where(any_DS == False)[0]
+                    DS_weights = [DS._weight for DS in DSG._DS_set]
+                    DS_df = np.random.uniform(
+                        size=(len(in_this_DSG), len(DS_weights)))
+                    which_DS = DS_df < DS_weights
+                    any_DS = np.any(which_DS, axis=1)
+                    no_DS_ids = np.where(any_DS == False)[0]
 
-                            while len(no_DS_ids) > 0:
-                                DS_df_add = np.random.uniform(
-                                    size=(len(no_DS_ids), len(DS_weights)))
-                                which_DS_add = DS_df_add < DS_weights
-                                which_DS[no_DS_ids] = which_DS_add
+                    while len(no_DS_ids) > 0:
+                        DS_df_add = np.random.uniform(
+                            size=(len(no_DS_ids), len(DS_weights)))
+                        which_DS_add = DS_df_add < DS_weights
+                        which_DS[no_DS_ids] = which_DS_add
 
-                                any_DS = np.any(which_DS_add, axis=1)
-                                no_DS_ids = no_DS_ids[
-                                    np.where(any_DS == False)[0]]
+                        any_DS = np.any(which_DS_add, axis=1)
+                        no_DS_ids = no_DS_ids[
+                            np.where(any_DS == False)[0]]
 
-                            for ds_i, DS in enumerate(DSG._DS_set):
-                                DS_tag = str(DSG._ID) + '_' + str(DS._ID)
-                                in_this_DS = which_DS[:, ds_i]
-                                FG_damages.loc[in_this_DSG[in_this_DS], (
-                                FG._ID, PG_ID, DS_tag)] += csg_w
+                    ds_rows, ds_i = np.nonzero(which_DS)
+                    cell_list.append(in_this_DSG[ds_rows] * pg_count * d_count +
+                                     CSG_PG[csg_i] * d_count +
+                                     DS_pos[dsg_i + 1] + ds_i)
+                    weight_list.append(np.full(len(ds_rows), CSG_w[csg_i]))
 
-                        else:
-                            raise ValueError(
-                                "Unknown damage state type: {}".format(
-                                    DSG._DS_set_kind)
-                            )
+            FG_damages = np.bincount(
+                np.concatenate(cell_list), weights=np.concatenate(weight_list),
+                minlength=NC_samples * pg_count * d_count)
 
-                FG_damages.iloc[:,pg_i * d_count:(pg_i + 1) * d_count] = \
-                    FG_damages.mul(PG_qnt, axis=0)
+            # multiply the damaged fraction by the component quantities
+            FG_damages = (FG_damages.reshape(NC_samples, pg_count, d_count) *
+                          PG_qnt[:, :, np.newaxis])
 
-            DMG = pd.concat((DMG, FG_damages), axis=1)
+            FG_dmg_list.append(pd.DataFrame(
+                FG_damages.reshape(NC_samples, pg_count * d_count),
+                columns=MI, index=ncID))
+
+        DMG = pd.concat(FG_dmg_list, axis=1)
 
         DMG.index = ncID
 
@@ -2737,9 +2808,15 @@ class HAZUS_Assessment(Assessment):
         Defines the discretization used to describe the severity of injuries.
         The HAZUS earthquake methodology uses 4 levels.
         default: 4
+    log_file: bool, optional
+        If True, the log is saved in pelicun_log.txt. Default: True.
+    DL_data_cache: dict, optional
+        Cache of parsed component damage and loss data shared between
+        assessments. Default: None - no caching.
     """
-    def __init__(self, hazard='EQ', inj_lvls = 4, log_file=True):
-        super(HAZUS_Assessment, self).__init__(log_file)
+    def __init__(self, hazard='EQ', inj_lvls = 4, log_file=True,
+                 DL_data_cache=None):
+        super(HAZUS_Assessment, self).__init__(log_file, DL_data_cache)
 
         self._inj_lvls = inj_lvls
         self._hazard = hazard
@@ -2782,7 +2859,8 @@ class HAZUS_Assessment(Assessment):
         log_msg('\tDamage and Loss data files...')
         self._FG_in = read_component_DL_data(
             self._AIM_in['data_sources']['path_CMP_data'], BIM['components'],
-            assessment_type=self._assessment_type, verbose=verbose)
+            assessment_type=self._assessment_type, verbose=verbose,
+            cache=self._DL_data_cache)
 
         data = self._FG_in
         log_msg('\t\tAvailable Fragility Groups:')
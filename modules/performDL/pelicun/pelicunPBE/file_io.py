@@ -1025,8 +1025,247 @@ def read_population_distribution(path_POP, occupancy, assessment_type='P58',
     return data
 
 
+def _parse_component_DL_data(c_id, DL_data):
+    """
+    Convert the damage and loss data of a component to internal format.
+
+    Only the data that is independent of the asset is parsed here; the
+    locations, directions and quantities of components are added by
+    read_component_DL_data.
+
+    Parameters
+    ----------
+    c_id: string
+        ID of the component.
+    DL_data: dict
+        Damage and loss data of the component in the SimCenter DL format.
+
+    Returns
+    -------
+    c_data: dict or None
+        Damage and loss data in internal format. None is returned if the
+        component cannot be used for loss assessment.
+
+    """
+
+    c_data = {'incomplete': None}
+
+    DL_GI = DL_data['GeneralInformation']
+    DL_EDP = DL_data['EDP']
+    DL_DSG = DL_data['DSGroups']
+
+    # First, check if the DL data is complete. Incomplete data can lead to
+    # all kinds of problems, so in such a case we display a warning and do
+    # not use the component. This can be relaxed later if someone creates a
+    # method to replace unknown values with reasonable estimates.
+    if 'Incomplete' in DL_GI.keys():
+        c_data['incomplete'] = int(DL_GI['Incomplete'])
+        if c_data['incomplete']:
+            # show warning
+            warnings.warn(UserWarning(
+                'Fragility information for {} is incomplete. The component '
+                'cannot be used for loss assessment.'.format(c_id)))
+            return None
+
+    c_data['ID'] = c_id
+    c_data['name'] = DL_data['Name']
+    c_data['description'] = DL_GI['Description']
+    c_data['offset'] =int(DL_EDP.get('Offset', 0))
+    c_data['correlation'] = int(DL_data.get('Correlated', False))
+    c_data['directional'] = int(DL_data.get('Directional', False))
+
+    EDP_type = DL_EDP['Type']
+    if DL_EDP['Unit'][1] == 'in':
+        DL_EDP['Unit'][1] = 'inch'
+    demand_factor = globals()[DL_EDP['Unit'][1]] * DL_EDP['Unit'][0]
+    if EDP_type == 'Story Drift Ratio':
+        demand_type = 'PID'
+    elif EDP_type == 'Roof Drift Ratio':
+        demand_type = 'PRD'
+    elif EDP_type == 'Damageable Wall Drift':
+        demand_type = 'DWD'
+    elif EDP_type == 'Racking Drift Ratio':
+        demand_type = 'RDR'
+    elif EDP_type == 'Peak Floor Acceleration':
+        demand_type = 'PFA'
+        #demand_factor = g
+        # PFA corresponds to the top of the given story. The ground floor
+        # has an idex of 0. When damage of acceleration-sensitive components
+        # is controlled by the acceleration of the bottom of the story, the
+        # corresponding PFA location needs to be reduced by 1. Our framework
+        # assumes that PFA corresponds to the bottom of the given story
+        # by default, we need to subtract 1 from the location values. Rather
+        # than changing the locations themselves, we assign an offset of -1
+        # so that the results still get collected at the appropriate story.
+        c_data['offset'] = c_data['offset'] - 1
+    elif EDP_type == 'Peak Floor Velocity':
+        demand_type = 'PFV'
+        #demand_factor = mps
+        c_data['offset'] = c_data['offset'] - 1
+    elif EDP_type == 'Peak Gust Wind Speed':
+        demand_type = 'PWS'
+        #demand_factor = mph
+    elif EDP_type == 'Peak Ground Acceleration':
+        demand_type = 'PGA'
+        #demand_factor = g
+    elif EDP_type == 'Peak Ground Velocity':
+        demand_type = 'PGV'
+        #demand_factor = cmps
+    elif EDP_type == 'Spectral Acceleration':
+        demand_type = 'SA'
+        #demand_factor = g
+    elif EDP_type == 'Spectral Velocity':
+        demand_type = 'SV'
+        #demand_factor = mps
+    elif EDP_type == 'Spectral Displacement':
+        demand_type = 'SD'
+        #demand_factor = m
+    elif EDP_type == 'Permanent Ground Deformation':
+        demand_type = 'PGD'
+    elif EDP_type == 'Mega Drift Ratio':
+        demand_type = 'PMD'
+    elif EDP_type == 'Residual Drift Ratio':
+        demand_type = 'RID'
+    elif EDP_type in [
+        'Link Rotation Angle',
+        'Link Beam Chord Rotation']:
+        demand_type = None
+        warnings.warn(UserWarning(
+            'Component {} requires {} as EDP, which is not yet '
+            'implemented.'.format(c_data['ID'], EDP_type)))
+    else: # pragma: no cover
+        demand_type = None
+        warnings.warn(UserWarning(
+            f'Unexpected EDP type in component {c_id}: {EDP_type}'))
+    if demand_type is None:
+        return None
+    c_data['demand_type'] = demand_type
+
+    # dictionary to convert DL data to internal representation
+    curve_type = {'LogNormal': 'lognormal',
+                  'Normal'   : 'normal',
+                  'N/A'      : None}
+    DS_set_kind = {'MutuallyExclusive' : 'mutually exclusive',
+                   'mutually exclusive': 'mutually exclusive',
+                   'simultaneous'      : 'simultaneous',
+                   'Simultaneous'      : 'simultaneous',
+                   'single'            : 'single',
+                   'Single'            : 'single'}
+
+    # load the damage state group information
+    c_data['DSG_set'] = dict()
+    QNT_unit = DL_data.get('QuantityUnit', [1, 'ea'])
+    data_unit = QNT_unit[0] * globals()[QNT_unit[1]]
+    for DSG_id, DSG_i in enumerate(DL_DSG):
+        DSG_data = dict(
+            theta=float(DSG_i['MedianEDP']) * demand_factor,
+            sig=float(DSG_i['Beta']),
+            DS_set_kind=DS_set_kind[DSG_i['DSGroupType']],
+            distribution_kind = curve_type[DSG_i['CurveType']],
+            DS_set={}
+        )
+        # sig needs to be scaled for normal distributions
+        if DSG_data['distribution_kind'] == 'normal':
+            DSG_data['sig'] = DSG_data['sig'] * demand_factor
+
+        for DS_id, DS_i in enumerate(DSG_i['DamageStates']):
+            DS_data = {'description': DS_i['Description'],
+                       'weight'     : DS_i['Weight']}
+
+            DS_C = DS_i.get('Consequences', None)
+            if DS_C is not None:
+                if 'ReconstructionCost' in DS_C.keys():
+                    DS_CC = DS_C['ReconstructionCost']
+                    if isinstance(DS_CC['Amount'], list):
+                        DS_data.update({'repair_cost': {
+                            'medians'          : np.array([float(a) for a in DS_CC['Amount']]),
+                            'quantities'       : np.array(DS_CC['Quantity']),
+                            'distribution_kind': curve_type[DS_CC.get('CurveType','N/A')],
+                            'cov'              : DS_CC.get('Beta',None),
+                        }})
+
+                        # convert the quantity units to standard ones
+                        DS_data['repair_cost']['quantities'] *= data_unit
+                        DS_data['repair_cost']['quantities'] = DS_data['repair_cost']['quantities'].tolist()
+                    else:
+                        DS_data.update({'repair_cost': {
+                            'medians': np.array([float(DS_CC['Amount']),]),
+                            'distribution_kind': curve_type[DS_CC.get('CurveType','N/A')],
+                            'cov'              : DS_CC.get('Beta',None),
+                        }})
+
+                    # convert the median units to standard ones
+                    DS_data['repair_cost']['medians'] /= data_unit
+                    DS_data['repair_cost']['medians'] = DS_data['repair_cost']['medians'].tolist()
+
+                if 'ReconstructionTime' in DS_C.keys():
+                    DS_CT = DS_C['ReconstructionTime']
+                    if isinstance(DS_CT['Amount'], list):
+                        DS_data.update({'repair_time': {
+                            'medians'          : np.array([float(a) for a in DS_CT['Amount']]),
+                            'quantities'       : np.array(DS_CT['Quantity']),
+                            'distribution_kind': curve_type[DS_CT.get('CurveType','N/A')],
+                            'cov'              : DS_CT.get('Beta',None),
+                        }})
+
+                        # convert the quantity units to standard ones
+                        DS_data['repair_time']['quantities'] *= data_unit
+                        DS_data['repair_time']['quantities'] = DS_data['repair_time']['quantities'].tolist()
+                    else:
+                        DS_data.update({'repair_time': {
+                            'medians': np.array([float(DS_CT['Amount']),]),
+                            'distribution_kind': curve_type[DS_CT.get('CurveType','N/A')],
+                            'cov'              : DS_CT.get('Beta',None),
+                        }})
+
+                    # convert the median units to standard ones
+                    DS_data['repair_time']['medians'] /= data_unit
+                    DS_data['repair_time']['medians'] = DS_data['repair_time']['medians'].tolist()
+
+                if 'RedTag' in DS_C.keys():
+                    DS_CR = DS_C['RedTag']
+                    DS_data.update({'red_tag': {
+                        'theta': DS_CR['Amount'],
+                        # 'distribution_kind': curve_type[DS_CR['CurveType']],
+                        'cov'  : DS_CR['Beta'],
+                    }})
+
+                if 'Injuries' in DS_C.keys():
+                    DS_CI = DS_C['Injuries']
+                    if DS_CI[0].get('Beta') is not None:
+                        DS_data.update({'injuries': {
+                            'theta': [float(I_i['Amount']) for I_i in DS_CI],
+                            # 'distribution_kind': curve_type[DS_CR['CurveType']],
+                            'cov'  : [I_i['Beta'] for I_i in DS_CI],
+                        }})
+                    else:
+                        DS_data.update({
+                            'injuries': [I_i['Amount'] for I_i in DS_CI]})
+
+                    # if there is a chance of injuries, load the affected floor area
+                    affected_area, unit = DS_i.get('AffectedArea',
+                                                   [0.0, 'SF'])
+                    if unit == 'SF':
+                        affected_area = affected_area * SF
+                    else: # pragma: no cover
+                        warnings.warn(UserWarning(
+                            'Unknown unit for affected floor area: {}'.format(
+                                unit)))
+                        affected_area = 0.
+                    DS_data.update({'affected_area': affected_area})
+
+                    # convert the units to standard ones
+                    DS_data['affected_area'] /= data_unit
+
+            DSG_data['DS_set'].update({'DS-' + str(DS_id + 1): DS_data})
+
+        c_data['DSG_set'].update({'DSG-' + str(DSG_id + 1): DSG_data})
+
+    return c_data
+
+
 def read_component_DL_data(path_CMP, comp_info, assessment_type='P58',
-    verbose=False):
+    verbose=False, cache=None):
     """
     Read the damage and loss data for the components of the asset.
 
@@ -1053,6 +1292,13 @@ def read_component_DL_data(path_CMP, comp_info, assessment_type='P58',
         If True, the function echoes the information read from the files. This
         can be useful to ensure that the information in the files is properly
         read by the method.
+    cache: dict, optional
+        A dictionary that stores the parsed damage and loss data of components
+        under (path_CMP, component ID) keys. Components found in the cache are
+        not read and parsed again; newly parsed components are added to it.
+        Sharing a cache between assessments avoids repeated parsing when the
+        same components are used by several assets (e.g., in a regional
+        analysis). Default: None - no caching.
 
     Returns
     -------
@@ -1085,72 +1331,71 @@ def read_component_DL_data(path_CMP, comp_info, assessment_type='P58',
     ]])) for c_id in comp_info.keys()])
 
     s_cmp_keys = sorted(data.keys())
+
+    if cache is None:
+        cache = {}
+
+    # only the components that are not in the cache need to be loaded
+    new_keys = [c_id for c_id in s_cmp_keys if (path_CMP, c_id) not in cache]
     DL_data_dict = {}
 
-    # If the path_CMP is a folder we assume it contains a set of json files
-    if os.path.isdir(path_CMP):
+    if len(new_keys) > 0:
 
-        CMP_dir = Path(path_CMP).resolve()
+        # If the path_CMP is a folder we assume it contains a set of json files
+        if os.path.isdir(path_CMP):
 
-        for c_id in s_cmp_keys:
-            with open(CMP_dir / f'{c_id}.json', 'r') as f:
-                DL_data_dict.update({c_id: json.load(f)})
+            CMP_dir = Path(path_CMP).resolve()
 
-    # else if an HDF5 file is provided we assume it contains the DL data
-    elif path_CMP.endswith('hdf'):
+            for c_id in new_keys:
+                with open(CMP_dir / f'{c_id}.json', 'r') as f:
+                    DL_data_dict.update({c_id: json.load(f)})
 
-        # this for loop is needed to avoid issues from race conditions on HPC
-        for i in range(1000):
-            try:
-                store = pd.HDFStore(path_CMP)
-                store.open()
+        # else if an HDF5 file is provided we assume it contains the DL data
+        elif path_CMP.endswith('hdf'):
 
-            except HDF5ExtError:
-                CMP_table = None
-                sleep(0.1)
-                continue
+            # this for loop is needed to avoid issues from race conditions on HPC
+            for i in range(1000):
+                try:
+                    store = pd.HDFStore(path_CMP)
+                    store.open()
+
+                except HDF5ExtError:
+                    CMP_table = None
+                    sleep(0.1)
+                    continue
 
+                else:
+                    CMP_table = store.select('data', where=f'index in {new_keys}')
+                    store.close()
+                    break
+
+            if CMP_table is not None:
+                for c_id in new_keys:
+                    DL_data_dict.update(
+                        {c_id: convert_Series_to_dict(CMP_table.loc[c_id, :])})
             else:
-                CMP_table = store.select('data', where=f'index in {s_cmp_keys}')
-                store.close()
-                break
+                raise IOError("Couldn't read the HDF file for DL data after 20 "
+                              "tries because it was blocked by other processes.")
 
-        if CMP_table is not None:
-            for c_id in s_cmp_keys:
-                DL_data_dict.update(
-                    {c_id: convert_Series_to_dict(CMP_table.loc[c_id, :])})
         else:
-            raise IOError("Couldn't read the HDF file for DL data after 20 "
-                          "tries because it was blocked by other processes.")
+            raise ValueError(
+                "Component data source not recognized. Please provide "
+                "either a folder with DL json files or an HDF5 table.")
 
-    else:
-        raise ValueError(
-            "Component data source not recognized. Please provide "
-            "either a folder with DL json files or an HDF5 table.")
+    for c_id in new_keys:
+        cache.update({(path_CMP, c_id): _parse_component_DL_data(
+            c_id, DL_data_dict[c_id])})
 
     # for each component
     for c_id in s_cmp_keys:
-        c_data = data[c_id]
 
-        DL_data = DL_data_dict[c_id]
-
-        DL_GI = DL_data['GeneralInformation']
-        DL_EDP = DL_data['EDP']
-        DL_DSG = DL_data['DSGroups']
-
-        # First, check if the DL data is complete. Incomplete data can lead to
-        # all kinds of problems, so in such a case we display a warning and do
-        # not use the component. This can be relaxed later if someone creates a
-        # method to replace unknown values with reasonable estimates.
-        if 'Incomplete' in DL_GI.keys():
-            c_data['incomplete'] = int(DL_GI['Incomplete'])
-            if c_data['incomplete']:
-                # show warning
-                del data[c_id]
-                warnings.warn(UserWarning(
-                    'Fragility information for {} is incomplete. The component '
-                    'cannot be used for loss assessment.'.format(c_id)))
-                continue
+        # incomplete and unsupported components are not used
+        if cache[(path_CMP, c_id)] is None:
+            del data[c_id]
+            continue
+
+        c_data = data[c_id]
+        c_data.update(deepcopy(cache[(path_CMP, c_id)]))
 
         # Get the parameters from the BIM component info
         ci_data = comp_info[c_id]
@@ -1186,201 +1431,6 @@ def read_component_DL_data(path_CMP, comp_info, assessment_type='P58',
         #c_data['dir_weights'] = [sum(weights[np.where(dirs == d_i)])
         #                         for d_i in u_dirs]
 
-        c_data['ID'] = c_id
-        c_data['name'] = DL_data['Name']
-        c_data['description'] = DL_GI['Description']
-        c_data['offset'] =int(DL_EDP.get('Offset', 0))
-        c_data['correlation'] = int(DL_data.get('Correlated', False))
-        c_data['directional'] = int(DL_data.get('Directional', False))
-
-        EDP_type = DL_EDP['Type']
-        if DL_EDP['Unit'][1] == 'in':
-            DL_EDP['Unit'][1] = 'inch'
-        demand_factor = globals()[DL_EDP['Unit'][1]] * DL_EDP['Unit'][0]
-        if EDP_type == 'Story Drift Ratio':
-            demand_type = 'PID'
-        elif EDP_type == 'Roof Drift Ratio':
-            demand_type = 'PRD'
-        elif EDP_type == 'Damageable Wall Drift':
-            demand_type = 'DWD'
-        elif EDP_type == 'Racking Drift Ratio':
-            demand_type = 'RDR'
-        elif EDP_type == 'Peak Floor Acceleration':
-            demand_type = 'PFA'
-            #demand_factor = g
-            # PFA corresponds to the top of the given story. The ground floor
-            # has an idex of 0. When damage of acceleration-sensitive components
-            # is controlled by the acceleration of the bottom of the story, the
-            # corresponding PFA location needs to be reduced by 1. Our framework
-            # assumes that PFA corresponds to the bottom of the given story
-            # by default, we need to subtract 1 from the location values. Rather
-            # than changing the locations themselves, we assign an offset of -1
-            # so that the results still get collected at the appropriate story.
-            c_data['offset'] = c_data['offset'] - 1
-        elif EDP_type == 'Peak Floor Velocity':
-            demand_type = 'PFV'
-            #demand_factor = mps
-            c_data['offset'] = c_data['offset'] - 1
-        elif EDP_type == 'Peak Gust Wind Speed':
-            demand_type = 'PWS'
-            #demand_factor = mph
-        elif EDP_type == 'Peak Ground Acceleration':
-            demand_type = 'PGA'
-            #demand_factor = g
-        elif EDP_type == 'Peak Ground Velocity':
-            demand_type = 'PGV'
-            #demand_factor = cmps
-        elif EDP_type == 'Spectral Acceleration':
-            demand_type = 'SA'
-            #demand_factor = g
-        elif EDP_type == 'Spectral Velocity':
-            demand_type = 'SV'
-            #demand_factor = mps
-        elif EDP_type == 'Spectral Displacement':
-            demand_type = 'SD'
-            #demand_factor = m
-        elif EDP_type == 'Permanent Ground Deformation':
-            demand_type = 'PGD'
-        elif EDP_type == 'Mega Drift Ratio':
-            demand_type = 'PMD'
-        elif EDP_type == 'Residual Drift Ratio':
-            demand_type = 'RID'
-        elif EDP_type in [
-            'Link Rotation Angle',
-            'Link Beam Chord Rotation']:
-            demand_type = None
-            warnings.warn(UserWarning(
-                'Component {} requires {} as EDP, which is not yet '
-                'implemented.'.format(c_data['ID'], EDP_type)))
-        else: # pragma: no cover
-            demand_type = None
-            warnings.warn(UserWarning(
-                f'Unexpected EDP type in component {c_id}: {EDP_type}'))
-        if demand_type is None:
-            del data[c_id]
-            continue
-        c_data['demand_type'] = demand_type
-
-        # dictionary to convert DL data to internal representation
-        curve_type = {'LogNormal': 'lognormal',
-                      'Normal'   : 'normal',
-                      'N/A'      : None}
-        DS_set_kind = {'MutuallyExclusive' : 'mutually exclusive',
-                       'mutually exclusive': 'mutually exclusive',
-                       'simultaneous'      : 'simultaneous',
-                       'Simultaneous'      : 'simultaneous',
-                       'single'            : 'single',
-                       'Single'            : 'single'}
-
-        # load the damage state group information
-        c_data['DSG_set'] = dict()
-        QNT_unit = DL_data.get('QuantityUnit', [1, 'ea'])
-        data_unit = QNT_unit[0] * globals()[QNT_unit[1]]
-        for DSG_id, DSG_i in enumerate(DL_DSG):
-            DSG_data = dict(
-                theta=float(DSG_i['MedianEDP']) * demand_factor,
-                sig=float(DSG_i['Beta']),
-                DS_set_kind=DS_set_kind[DSG_i['DSGroupType']],
-                distribution_kind = curve_type[DSG_i['CurveType']],
-                DS_set={}
-            )
-            # sig needs to be scaled for normal distributions
-            if DSG_data['distribution_kind'] == 'normal':
-                DSG_data['sig'] = DSG_data['sig'] * demand_factor
-
-            for DS_id, DS_i in enumerate(DSG_i['DamageStates']):
-                DS_data = {'description': DS_i['Description'],
-                           'weight'     : DS_i['Weight']}
-
-                DS_C = DS_i.get('Consequences', None)
-                if DS_C is not None:
-                    if 'ReconstructionCost' in DS_C.keys():
-                        DS_CC = DS_C['ReconstructionCost']
-                        if isinstance(DS_CC['Amount'], list):
-                            DS_data.update({'repair_cost': {
-                                'medians'          : np.array([float(a) for a in DS_CC['Amount']]),
-                                'quantities'       : np.array(DS_CC['Quantity']),
-                                'distribution_kind': curve_type[DS_CC.get('CurveType','N/A')],
-                                'cov'              : DS_CC.get('Beta',None),
-                            }})
-
-                            # convert the quantity units to standard ones
-                            DS_data['repair_cost']['quantities'] *= data_unit
-                            DS_data['repair_cost']['quantities'] = DS_data['repair_cost']['quantities'].tolist()
-                        else:
-                            DS_data.update({'repair_cost': {
-                                'medians': np.array([float(DS_CC['Amount']),]),
-                                'distribution_kind': curve_type[DS_CC.get('CurveType','N/A')],
-                                'cov'              : DS_CC.get('Beta',None),
-                            }})
-
-                        # convert the median units to standard ones
-                        DS_data['repair_cost']['medians'] /= data_unit
-                        DS_data['repair_cost']['medians'] = DS_data['repair_cost']['medians'].tolist()
-
-                    if 'ReconstructionTime' in DS_C.keys():
-                        DS_CT = DS_C['ReconstructionTime']
-                        if isinstance(DS_CT['Amount'], list):
-                            DS_data.update({'repair_time': {
-                                'medians'          : np.array([float(a) for a in DS_CT['Amount']]),
-                                'quantities'       : np.array(DS_CT['Quantity']),
-                                'distribution_kind': curve_type[DS_CT.get('CurveType','N/A')],
-                                'cov'              : DS_CT.get('Beta',None),
-                            }})
-
-                            # convert the quantity units to standard ones
-                            DS_data['repair_time']['quantities'] *= data_unit
-                            DS_data['repair_time']['quantities'] = DS_data['repair_time']['quantities'].tolist()
-                        else:
-                            DS_data.update({'repair_time': {
-                                'medians': np.array([float(DS_CT['Amount']),]),
-                                'distribution_kind': curve_type[DS_CT.get('CurveType','N/A')],
-                                'cov'              : DS_CT.get('Beta',None),
-                            }})
-
-                        # convert the median units to standard ones
-                        DS_data['repair_time']['medians'] /= data_unit
-                        DS_data['repair_time']['medians'] = DS_data['repair_time']['medians'].tolist()
-
-                    if 'RedTag' in DS_C.keys():
-                        DS_CR = DS_C['RedTag']
-                        DS_data.update({'red_tag': {
-                            'theta': DS_CR['Amount'],
-                            # 'distribution_kind': curve_type[DS_CR['CurveType']],
-                            'cov'  : DS_CR['Beta'],
-                        }})
-
-                    if 'Injuries' in DS_C.keys():
-                        DS_CI = DS_C['Injuries']
-                        if DS_CI[0].get('Beta') is not None:
-                            DS_data.update({'injuries': {
-                                'theta': [float(I_i['Amount']) for I_i in DS_CI],
-                                # 'distribution_kind': curve_type[DS_CR['CurveType']],
-                                'cov'  : [I_i['Beta'] for I_i in DS_CI],
-                            }})
-                        else:
-                            DS_data.update({
-                                'injuries': [I_i['Amount'] for I_i in DS_CI]})
-
-                        # if there is a chance of injuries, load the affected floor area
-                        affected_area, unit = DS_i.get('AffectedArea',
-                                                       [0.0, 'SF'])
-                        if unit == 'SF':
-                            affected_area = affected_area * SF
-                        else: # pragma: no cover
-                            warnings.warn(UserWarning(
-                                'Unknown unit for affected floor area: {}'.format(
-                                    unit)))
-                            affected_area = 0.
-                        DS_data.update({'affected_area': affected_area})
-
-                        # convert the units to standard ones
-                        DS_data['affected_area'] /= data_unit
-
-                DSG_data['DS_set'].update({'DS-' + str(DS_id + 1): DS_data})
-
-            c_data['DSG_set'].update({'DSG-' + str(DSG_id + 1): DSG_data})
-
     if verbose: # pragma: no cover
         for c_id, c_data in data.items():
             print(c_id)
@@ -41,23 +41,220 @@
 import os
 import subprocess
 import sys
-import json
+import tempfile
+import multiprocessing as mp
 import numpy as np
 import pandas as pd
 from gmpe import CorrelationModel
-from FetchOpenSHA import *
+from OpenSHAJVM import load_opensha, set_max_heap, get_worker_heap
 from tqdm import tqdm
 import time
 
+# Factors of the intra-event correlation matrices of the current station set
+# (cleared when the stations change) - see compute_intra_event_residual
+intra_event_factors = {}
 
-def compute_spectra(scenarios, stations, gmpe_info, im_info):
+# OpenSHA state of the spectra workers (see init_spectra_worker)
+spectra_worker = {}
 
-	# Calling OpenSHA to compute median PSA
-	psa_raw = []
+
+def setup_spectra(gmpe_info, station_list, erf_name = None, site_data = None):
+
+	# Calling OpenSHA to set up the ERF, the intensity measure relationship
+	# and the sites once for all scenarios (the JVM is started if needed)
+	FetchOpenSHA = load_opensha()
 	# Loading ERF model (if exists)
 	erf = None
-	if scenarios[0].get('RuptureForecast', None):
-		erf = getERF(scenarios[0]['RuptureForecast'], True)
+	if erf_name:
+		erf = FetchOpenSHA.getERF(erf_name, True)
+	# Intensity measure relationship
+	imr_session = FetchOpenSHA.IMRSession(gmpe_info)
+	# Configuring site properties (the site objects are reused by all scenarios;
+	# the site data providers are only queried if site_data is not given)
+	siteSpec, sites, site_prop = FetchOpenSHA.get_site_prop(gmpe_info['Type'], station_list,
+	                                                        imr_session.imr, site_data)
+	# return
+	return {'FetchOpenSHA': FetchOpenSHA,
+			'ERF': erf,
+			'IMRSession': imr_session,
+			'SiteSpec': siteSpec,
+			'Sites': sites,
+			'SiteProp': site_prop}
+
+
+def init_spectra_worker(scenarios, gmpe_info, im_info, station_list, erf_name, site_data, temp_dir,
+                        max_heap):
+
+	# Every worker process boots its own JVM and keeps its OpenSHA objects
+	# for all scenarios it receives (the site data is queried by the parent);
+	# the spawned interpreter does not inherit the heap size of the parent
+	set_max_heap(max_heap)
+	spectra_worker.update(setup_spectra(gmpe_info, station_list, erf_name, site_data))
+	spectra_worker.update({
+		'Scenarios': scenarios,
+		'IMInfo': im_info,
+		'TempDir': temp_dir
+	})
+
+
+def run_spectra(task):
+
+	# Computing the ln mean and standard deviations for a slice of scenarios
+	slice_id, scenario_ids = task
+	get_rupture = spectra_worker['FetchOpenSHA'].get_rupture
+	imr_session = spectra_worker['IMRSession']
+	magnitude = np.zeros(len(scenario_ids))
+	mean_annual_rate = np.full(len(scenario_ids), np.nan)
+	im_data = dict()
+	for i, scen_id in enumerate(scenario_ids):
+		eqRup, cur_mag, cur_maf = get_rupture(spectra_worker['ERF'],
+		                                      spectra_worker['Scenarios'][int(scen_id)])
+		imr_session.set_rupture(eqRup)
+		im_res, cur_T = imr_session.compute(spectra_worker['Sites'], spectra_worker['IMInfo'])
+		magnitude[i] = float(cur_mag)
+		if cur_maf is not None:
+			mean_annual_rate[i] = float(cur_maf)
+		for im_label, cur_res in im_res.items():
+			for k, v in cur_res.items():
+				im_data.setdefault('{}__{}'.format(im_label, k), []).append(v)
+	# Saving the results (scenarios x sites x periods)
+	res_file = os.path.join(spectra_worker['TempDir'], 'spectra_{}.npz'.format(slice_id))
+	np.savez(res_file, Magnitude = magnitude, MeanAnnualRate = mean_annual_rate,
+	         Periods = np.array(cur_T, dtype = float),
+	         **{k: np.stack(v) for k, v in im_data.items()})
+	# The site properties are identical in all workers and only returned once
+	site_info = None
+	if slice_id == 0:
+		site_info = (spectra_worker['SiteSpec'], spectra_worker['SiteProp'])
+	# return
+	return res_file, site_info
+
+
+def load_spectra(res_file, site_prop):
+
+	# Loading the results of a slice of scenarios (see run_spectra) in the
+	# format of FetchOpenSHA.get_IM
+	psa_raw = []
+	with np.load(res_file) as data:
+		magnitude = data['Magnitude']
+		mean_annual_rate = data['MeanAnnualRate']
+		cur_T = data['Periods'].tolist()
+		im_data = dict()
+		for key in data.files:
+			if '__' in key:
+				im_label, k = key.split('__')
+				im_data.setdefault(im_label, dict()).update({k: data[key]})
+	for i in range(len(magnitude)):
+		gm_collector = []
+		for j in range(len(site_prop)):
+			gmResults = dict(site_prop[j])
+			for im_label, cur_data in im_data.items():
+				gmResults.update({im_label: {k: v[i, j] for k, v in cur_data.items()}})
+			gm_collector.append(gmResults)
+		maf = None if np.isnan(mean_annual_rate[i]) else float(mean_annual_rate[i])
+		psa_raw.append({'Magnitude': float(magnitude[i]),
+		                'MeanAnnualRate': maf,
+		                'Periods': cur_T,
+		                'GroundMotions': gm_collector})
+	# return
+	return psa_raw
+
+
+def compute_spectra_parallel(scenarios, station_list, gmpe_info, im_info, num_workers):
+
+	# Contiguous slices of scenario IDs (a few per worker to balance the
+	# load); the results are merged in the order of the scenarios
+	slices = [x for x in np.array_split(np.arange(len(scenarios)),
+	          min(len(scenarios), 4 * num_workers)) if len(x)]
+	psa_raw = []
+	site_info = None
+	# The site data providers (remote queries) are called once for all workers
+	site_data = load_opensha().get_site_data(station_list)
+	with tempfile.TemporaryDirectory() as temp_dir:
+		# A fresh interpreter per worker (the JVM cannot be forked); the heap
+		# size of the JVM is shared among the workers
+		ctx = mp.get_context('spawn')
+		with ctx.Pool(processes = num_workers, initializer = init_spectra_worker,
+		              initargs = (scenarios, gmpe_info, im_info, station_list,
+		                          scenarios[0].get('RuptureForecast', None), site_data,
+		                          temp_dir, get_worker_heap(num_workers))) as pool:
+			res_files = []
+			for res_file, cur_info in tqdm(pool.imap(run_spectra, enumerate(slices)),
+			                               total = len(slices), desc = 'Scenario slices'):
+				res_files.append(res_file)
+				if cur_info is not None:
+					site_info = cur_info
+		siteSpec, site_prop = site_info
+		for res_file in res_files:
+			psa_raw.extend(load_spectra(res_file, site_prop))
+	# return
+	return psa_raw, siteSpec
+
+
+def compute_spectra_native(scenarios, stations, station_list, gmpe_info, im_info):
+
+	# Computing the ln mean and standard deviations with the NumPy GMPEs
+	# (no JVM); the rupture geometry of ERF scenarios is read from the catalog
+	from gmpe import NGAWest2
+	from ERFCatalog import load_catalog, get_rupture_geometry, get_site_distances
+	if gmpe_info['Type'] not in NGAWest2.GMPE_MODELS.keys():
+		raise ValueError('ComputeIntensityMeasure: {} is not available in the native engine '
+		                 '(supported: {}); use "Engine": "OpenSHA" for this GMPE.'.format(
+		                     gmpe_info['Type'], ', '.join(NGAWest2.GMPE_MODELS.keys())))
+	# Sites (Vs30 = 760 m/s if not provided)
+	lat = np.array([s['Latitude'] for s in stations], dtype = float)
+	lon = np.array([s['Longitude'] for s in stations], dtype = float)
+	vs30 = np.array([s.get('Vs30') or np.nan for s in stations], dtype = float)
+	measured = ~np.isnan(vs30)
+	if not np.all(measured):
+		print('ComputeIntensityMeasure: Vs30 = 760 m/s is used for {} stations without Vs30.'.format(np.sum(~measured)))
+	vs30[~measured] = 760.0
+	z2p5 = np.array([s.get('z2.5') or np.nan for s in stations], dtype = float)
+	site_data = {'Vs30': vs30,
+				 'Vs30Measured': measured,
+				 'Z1': np.array([s.get('z1.0') or np.nan for s in stations], dtype = float),
+				 'Z2p5': z2p5}
+	site_prop = []
+	for j in range(len(stations)):
+		vs30_source = 'User Defined' if measured[j] else 'Default'
+		cur_data = [{'Type': 'Vs30', 'Value': float(vs30[j]), 'Source': vs30_source},
+					{'Type': 'Vs30 Type', 'Value': 'Measured' if measured[j] else 'Inferred', 'Source': vs30_source}]
+		if not np.isnan(z2p5[j]):
+			cur_data.append({'Type': 'Depth 2.5 km/sec', 'Value': float(z2p5[j]), 'Source': 'User Defined'})
+		site_prop.append({'Location': {'Latitude': float(lat[j]), 'Longitude': float(lon[j])},
+						  'SiteData': cur_data})
+		station_list[j].update({'Vs30': float(vs30[j])})
+	# Rupture catalog (ERF scenarios)
+	catalog = None
+	rupture_index = dict()
+	if scenarios[0]['Type'] == 'ERF':
+		catalog = load_catalog(scenarios[0]['RuptureForecast'])
+		rupture_index = {(src, rup): k for k, (src, rup) in
+						 enumerate(zip(catalog['SourceID'].tolist(), catalog['RuptureID'].tolist()))}
+	psa_raw = []
+	for i in tqdm(range(len(scenarios)), desc='Scenarios'):
+		source_info = scenarios[i]
+		geometry = get_rupture_geometry(source_info, catalog,
+										rupture_index.get((source_info.get('SourceIndex'), source_info.get('RuptureIndex'))))
+		site_data.update(get_site_distances(geometry, lat, lon))
+		im_res, cur_T = NGAWest2.compute_gmpe(gmpe_info['Type'], im_info, geometry, site_data)
+		# Results in the format of FetchOpenSHA.get_IM
+		gm_collector = []
+		for j in range(len(stations)):
+			gmResults = dict(site_prop[j])
+			for im_label, im_data in im_res.items():
+				gmResults.update({im_label: {k: v[j] for k, v in im_data.items()}})
+			gm_collector.append(gmResults)
+		psa_raw.append({'Magnitude': geometry['Magnitude'],
+						'MeanAnnualRate': geometry['MeanAnnualRate'],
+						'Periods': cur_T,
+						'GroundMotions': gm_collector})
+	# return
+	return psa_raw
+
+
+def compute_spectra(scenarios, stations, gmpe_info, im_info, num_workers = 1):
+
 	# Stations
 	station_list = [{
 		'Location': {
@@ -70,17 +267,35 @@ def compute_spectra(scenarios, stations, gmpe_info, im_info):
 			station_list[j].update({'Vs30': int(stations[j]['Vs30'])})
 	station_info = {'Type': 'SiteList',
 					'SiteList': station_list}
-	# Configuring site properties
-	siteSpec, sites, site_prop = get_site_prop(gmpe_info['Type'], station_list)
-	# Loop over scenarios
-	for i, s in enumerate(tqdm(scenarios, desc='Scenarios')):
-		# Rupture
-		source_info = scenarios[i]
-		# Computing IM
-		res, station_info = get_IM(gmpe_info, erf, sites, siteSpec, site_prop, source_info, station_info, im_info)
-		# Collecting outputs
-		psa_raw.append(res)
+	if gmpe_info.get('Engine', 'OpenSHA') == 'Native':
+		# NumPy implementations of the NGA-West2 models
+		psa_raw = compute_spectra_native(scenarios, stations, station_list, gmpe_info, im_info)
+	elif (num_workers > 1) and (len(scenarios) > 1):
+		# Scenarios computed by a pool of workers (one JVM per worker)
+		psa_raw, siteSpec = compute_spectra_parallel(scenarios, station_list, gmpe_info,
+		                                             im_info, num_workers)
+		station_info.update({'SiteList': siteSpec})
+	else:
+		psa_raw = []
+		# Calling OpenSHA to compute median PSA
+		spectra = setup_spectra(gmpe_info, station_list, scenarios[0].get('RuptureForecast', None))
+		FetchOpenSHA = spectra['FetchOpenSHA']
+		# Loop over scenarios
+		for i, s in enumerate(tqdm(scenarios, desc='Scenarios')):
+			# Rupture
+			source_info = scenarios[i]
+			# Computing IM
+			res, station_info = FetchOpenSHA.get_IM(gmpe_info, spectra['ERF'], spectra['Sites'],
+			                                        spectra['SiteSpec'], spectra['SiteProp'],
+			                                        source_info, station_info, im_info,
+			                                        spectra['IMRSession'])
+			# Collecting outputs
+			psa_raw.append(res)
 
+	# Rates given by the scenarios (e.g., adjusted by the scenario reduction)
+	for i in range(len(psa_raw)):
+		if scenarios[i].get('MeanAnnualRate', None) is not None:
+			psa_raw[i]['MeanAnnualRate'] = scenarios[i]['MeanAnnualRate']
 	# Collecting station_info updates to staitons
 	for j in range(len(stations)):
 		stations[j]['Latitude'] = station_info['SiteList'][j]['Location']['Latitude']
@@ -106,125 +321,65 @@ def compute_inter_event_residual(sa_inter_cm, periods, num_simu):
 	return residuals
 
 
-def compute_intra_event_residual(sa_intra_cm, periods, station_data, num_simu):
+def compute_intra_event_residual(sa_intra_cm, periods, station_data, num_simu, sampler_info = None):
 
 	# Computing correlation coefficients
 	num_stations = len(station_data)
 	num_periods = len(periods)
-	if sa_intra_cm == 'Jayaram & Baker (2009)':
-	    rho = np.zeros((num_stations, num_stations, num_periods))
-	    for i in range(num_stations):
-		    loc_i = np.array([station_data[i]['Latitude'],
-			                  station_data[i]['Longitude']])
-		    for j in range(num_stations):
-			    loc_j = np.array([station_data[j]['Latitude'],
-				                  station_data[j]['Longitude']])
-			    # Computing station-wise distances
-			    stn_dist = np.linalg.norm(loc_i - loc_j) * 111.0
-			    for k in range(num_periods):
-			        rho[i, j, k] = \
-					    CorrelationModel.jayaram_baker_correlation_2009(periods[k],
-						    stn_dist, flag_clustering = False)
-        # Simulating residuals
-	    residuals = np.zeros((num_stations, num_periods, num_simu))
-	    for k in range(num_periods):
-		    residuals[:, k, :] = np.random.multivariate_normal(np.zeros(num_stations),
-			                                                   rho[:, :, k], num_simu).T
+	if (sa_intra_cm == 'Jayaram & Baker (2009)') and (sampler_info is not None) and \
+		(sampler_info.get('Type', 'Dense') != 'Dense'):
+		# Approximate sampling for large numbers of stations
+		residuals = np.zeros((num_stations, num_periods, num_simu))
+		for k in range(num_periods):
+			if periods[k] >= 1.0:
+				practical_range = 22.0 + 3.7 * periods[k]
+			else:
+				practical_range = 40.7 - 15.0 * periods[k]
+			residuals[:, k, :] = CorrelationModel.simulate_correlated_fields(
+				station_data, practical_range, num_simu, sampler_info)
+	elif sa_intra_cm == 'Jayaram & Baker (2009)':
+		# The factors of the correlation matrices are reused by later calls
+		# with the same stations and periods (e.g., for other scenarios);
+		# only the factors of one station set are kept in memory
+		stn_key = np.array([[s['Latitude'], s['Longitude']]
+		                    for s in station_data]).tobytes()
+		if intra_event_factors.get('Stations', None) != stn_key:
+			intra_event_factors.clear()
+			intra_event_factors['Stations'] = stn_key
+		stn_dist = None
+		# Simulating residuals
+		residuals = np.zeros((num_stations, num_periods, num_simu))
+		for k in range(num_periods):
+			factor_key = (sa_intra_cm, periods[k])
+			if factor_key not in intra_event_factors.keys():
+				# Computing station-wise distances (once for all periods)
+				if stn_dist is None:
+					stn_dist = CorrelationModel.get_distance_matrix(station_data)
+				rho = CorrelationModel.jayaram_baker_correlation_2009(periods[k],
+					stn_dist, flag_clustering = False)
+				intra_event_factors[factor_key] = \
+					CorrelationModel.get_correlation_factor(rho)
+			residuals[:, k, :] = np.matmul(intra_event_factors[factor_key],
+				np.random.standard_normal((num_stations, num_simu)))
 	elif sa_intra_cm == 'Loth & Baker (2013)':
-		residuals = CorrelationModel.loth_baker_correlation_2013(station_data, periods, num_simu)
+		residuals = CorrelationModel.loth_baker_correlation_2013(station_data, periods, num_simu, sampler_info)
 
 	elif sa_intra_cm == 'Markhvida et al. (2017)':
 		num_pc = 19
-		residuals = CorrelationModel.markhvida_ceferino_baker_correlation_2017(station_data, periods, num_simu, num_pc)
+		residuals = CorrelationModel.markhvida_ceferino_baker_correlation_2017(station_data, periods, num_simu, num_pc, sampler_info)
 
     # return
 	return residuals
 
 
-def export_im(stations, T, im_data, eq_data, output_dir, filename):
-
-	#try:
-	    # Station number
-		num_stations = len(stations)
-		# Scenario number
-		num_scenarios = len(eq_data)
-		# Saving large files to HDF while small files to JSON
-		if num_scenarios > 10:
-			# Pandas DataFrame
-			h_scenarios = ['Scenario-'+str(x) for x in range(1, num_scenarios + 1)]
-			h_eq = ['Latitude', 'Longitude', 'Vs30', 'Magnitude', 'MeanAnnualRate']
-			for x in range(len(T)):
-				h_eq.append('Period-{0}'.format(x+1))
-			for x in range(1, im_data[0][0, :, :].shape[1]+1):
-				for y in T:
-					h_eq.append('Record-'+str(x)+'-lnSa-{0}s'.format(y))
-			index = pd.MultiIndex.from_product([h_scenarios, h_eq])
-			columns = ['Site-'+str(x) for x in range(1, num_stations + 1)]
-			df = pd.DataFrame(index=index, columns=columns, dtype=float)
-			# Data
-			for i in range(num_stations):
-				tmp = []
-				for j in range(num_scenarios):
-					tmp.append(stations[i]['Latitude'])
-					tmp.append(stations[i]['Longitude'])
-					tmp.append(int(stations[i]['Vs30']))
-					tmp.append(eq_data[j][0])
-					tmp.append(eq_data[j][1])
-					for x in T:
-						tmp.append(x)
-					for x in np.ndarray.tolist(im_data[j][i, :, :].T):
-						for y in x:
-							tmp.append(y)
-				df['Site-'+str(i+1)] = tmp
-			# HDF output
-			try:
-				os.remove(os.path.join(output_dir, filename.replace('.json', '.h5')))
-			except:
-				pass
-			hdf = pd.HDFStore(os.path.join(output_dir, filename.replace('.json', '.h5')))
-			hdf.put('SiteIM', df, format='table', complib='zlib')
-			hdf.close()
-		else:
-			res = []
-			for i in range(num_stations):
-				tmp = {'Location': {
-				           'Latitude': stations[i]['Latitude'],
-					       'Longitude': stations[i]['Longitude']
-						   },
-					   'Vs30': int(stations[i]['Vs30'])
-					  }
-				tmp.update({'Periods': T})
-				tmp_im = []
-				for j in range(num_scenarios):
-					tmp_im.append(np.ndarray.tolist(im_data[j][i, :, :]))
-				if len(tmp_im) == 1:
-					# Simplifying the data structure if only one scenario exists
-					tmp_im = tmp_im[0]
-				tmp.update({'lnSa': tmp_im})
-				res.append(tmp)
-			maf_out = []
-			for cur_eq in eq_data:
-				tmp = {'Magnitdue': cur_eq[0],
-				       'MeanAnnualRate': cur_eq[1]}
-				maf_out.append(tmp)
-			res = {'Station_lnSa': res,
-			       'Earthquake_MAF': maf_out}
-			# save
-			with open(os.path.join(output_dir, filename), "w") as f:
-				json.dump(res, f, indent=2)
-		# return
-		return 0
-	#except:
-		# return
-		#return 1
-
-
-def simulate_ground_motion(stations, psa_raw, num_simu, correlation_info, im_info):
-
-    # Sa inter-event model
+def iter_ground_motion(stations, psa_raw, num_simu, correlation_info, im_info):
+
+	# Sa inter-event model
 	sa_inter_cm = correlation_info['SaInterEvent']
 	# Sa intra-event model
 	sa_intra_cm = correlation_info['SaIntraEvent']
+	# Sampling method of the intra-event residuals (see CorrelationModel.get_field_factor)
+	sa_intra_sampler = correlation_info.get('SaIntraEventSampler', None)
 	# Periods
 	periods = psa_raw[0]['Periods']
 	# Computing inter event residuals
@@ -233,35 +388,26 @@ def simulate_ground_motion(stations, psa_raw, num_simu, correlation_info, im_inf
 	print('ComputeIntensityMeasure: inter-event correlation {0} sec'.format(time.time() - t_start))
 	# Computing intra event residuals
 	t_start = time.time()
-	eta = compute_intra_event_residual(sa_intra_cm, periods, stations, num_simu)
+	eta = compute_intra_event_residual(sa_intra_cm, periods, stations, num_simu, sa_intra_sampler)
 	print('ComputeIntensityMeasure: intra-event correlation {0} sec'.format(time.time() - t_start))
-	ln_psa_mr = []
-	mag_maf = []
+	# IM label in the spectral data
+	if 'SA' in im_info['Type']:
+		im_label = 'lnSA'
+	elif 'PGA' in im_info['Type']:
+		im_label = 'lnPGA'
+	else:
+		print('ComputeInensityMeasure: currently supporing spatial correlated SA and PGA.')
 	for cur_psa_raw in tqdm(psa_raw, desc='Scenarios'):
 		# Spectral data (median and dispersions)
 		sa_data = cur_psa_raw['GroundMotions']
-	    # Combining inter- and intra-event residuals
-		if 'SA' in im_info['Type']:
-			ln_sa = [sa_data[i]['lnSA']['Mean'] for i in range(len(sa_data))]
-			ln_sa = [sa_data[i]['lnSA']['Mean'] for i in range(len(sa_data))]
-			inter_sigma_sa = [sa_data[i]['lnSA']['InterEvStdDev'] for i in range(len(sa_data))]
-			intra_sigma_sa = [sa_data[i]['lnSA']['IntraEvStdDev'] for i in range(len(sa_data))]
-		elif 'PGA' in im_info['Type']:
-			ln_sa = [sa_data[i]['lnPGA']['Mean'] for i in range(len(sa_data))]
-			ln_sa = [sa_data[i]['lnPGA']['Mean'] for i in range(len(sa_data))]
-			inter_sigma_sa = [sa_data[i]['lnPGA']['InterEvStdDev'] for i in range(len(sa_data))]
-			intra_sigma_sa = [sa_data[i]['lnPGA']['IntraEvStdDev'] for i in range(len(sa_data))]
-		else:
-			print('ComputeInensityMeasure: currently supporing spatial correlated SA and PGA.')
-		ln_psa = np.zeros((len(sa_data), len(periods), num_simu))
-		for i in range(num_simu):
-			epsilon_m = np.array([epsilon[:, i] for j in range(len(sa_data))])
-			ln_psa[:, :, i] = ln_sa + inter_sigma_sa * epsilon_m + intra_sigma_sa * eta[:, :, i]
-
-		ln_psa_mr.append(ln_psa)
-		mag_maf.append([cur_psa_raw['Magnitude'], cur_psa_raw['MeanAnnualRate']])
-    # return
-	return ln_psa_mr, mag_maf
+		ln_sa = np.array([sa_data[i][im_label]['Mean'] for i in range(len(sa_data))])
+		inter_sigma_sa = np.array([sa_data[i][im_label]['InterEvStdDev'] for i in range(len(sa_data))])
+		intra_sigma_sa = np.array([sa_data[i][im_label]['IntraEvStdDev'] for i in range(len(sa_data))])
+		# Combining inter- and intra-event residuals (sites x periods x realizations)
+		ln_psa = ln_sa[:, :, np.newaxis] + inter_sigma_sa[:, :, np.newaxis] * epsilon[np.newaxis, :, :] \
+			+ intra_sigma_sa[:, :, np.newaxis] * eta
+		# The caller can release the results before the next scenario
+		yield ln_psa, [cur_psa_raw['Magnitude'], cur_psa_raw['MeanAnnualRate']]
 
 
 def simulate_storm(app_dir, input_dir, output_dir):
@@ -44,7 +44,29 @@ import json
 import random
 import numpy as np
 import pandas as pd
-from FetchOpenSHA import *
+from ERFCatalog import load_catalog, select_ruptures, get_rupture_distance
+from ScenarioReduction import reduce_scenarios, get_im_proxy
+
+
+def reduce_earthquake_scenarios(reduction_info, feat, erf_catalog, stations, max_sites = 50):
+
+    # Candidate ruptures
+    magnitude = np.array([f['properties']['Magnitude'] for f in feat])
+    rate = np.array([f['properties']['MeanAnnualRate'] for f in feat])
+    distance = np.array([f['properties']['Distance'] for f in feat])
+    features = None
+    if reduction_info.get('Method', 'Stratified') == 'KMedoids':
+        # Ground motion proxies at (up to max_sites) stations
+        rup_index = {(src, rup): k for k, (src, rup) in enumerate(zip(
+            erf_catalog['SourceID'].tolist(), erf_catalog['RuptureID'].tolist()))}
+        rup_rows = [rup_index[(f['properties']['Source'], f['properties']['Rupture'])] for f in feat]
+        stn_list = stations['Stations']
+        stn_ids = np.unique(np.linspace(0, len(stn_list) - 1, min(len(stn_list), max_sites)).astype(int))
+        features = np.array([get_im_proxy(magnitude, get_rupture_distance(
+            erf_catalog, [stn_list[j]['Latitude'], stn_list[j]['Longitude']])[rup_rows])
+            for j in stn_ids]).T
+    # return
+    return reduce_scenarios(reduction_info, magnitude, rate, distance, features)
 
 
 def create_earthquake_scenarios(scenario_info, stations):
@@ -79,11 +101,13 @@ def create_earthquake_scenarios(scenario_info, stations):
             min_M = scenario_info['EqRupture'].get('min_Mag', 5.0)
             max_M = scenario_info['EqRupture'].get('max_Mag', 9.0)
             max_R = scenario_info['EqRupture'].get('max_Dist', 1000.0)
-            eq_source = getERF(source_model, True)
-            erf_data = export_to_json(eq_source, ref_station, outfile = None, \
-                                      EqName = source_name, minMag = min_M, \
-                                      maxMag = max_M, maxDistance = max_R, \
-                                      maxSources = np.max([500, source_num]))
+            # Ruptures are selected from the local catalog of the ERF (the
+            # catalog is compiled through OpenSHA at the first run)
+            erf_catalog = load_catalog(source_model)
+            erf_data = select_ruptures(erf_catalog, ref_station, \
+                                       EqName = source_name, minMag = min_M, \
+                                       maxMag = max_M, maxDistance = max_R, \
+                                       maxSources = np.max([500, source_num]))
             # Parsing data
             feat = erf_data['features']
             tag = []
@@ -94,7 +118,15 @@ def create_earthquake_scenarios(scenario_info, stations):
                     continue
                 tag.append(i)
             # Abstracting desired ruptures
-            s_tag = random.sample(tag, min(source_num, len(tag)))
+            reduction_info = scenario_info['EqRupture'].get('Reduction', None)
+            adjusted_rate = None
+            if reduction_info and len(tag):
+                # Reduced set of ruptures with adjusted rates
+                s_tag, adjusted_rate = reduce_earthquake_scenarios(
+                    reduction_info, [feat[i] for i in tag], erf_catalog, stations)
+                s_tag = [tag[i] for i in s_tag]
+            else:
+                s_tag = random.sample(tag, min(source_num, len(tag)))
             erf_data['features'] = list(feat[i] for i in s_tag)
             scenario_data = dict()
             for i, rup in enumerate(erf_data['features']):
@@ -104,6 +136,12 @@ def create_earthquake_scenarios(scenario_info, stations):
                     'SourceIndex': rup['properties']['Source'],
                     'RuptureIndex': rup['properties']['Rupture']
                 }})
+                if adjusted_rate is not None:
+                    scenario_data[i].update({
+                        'Magnitude': rup['properties']['Magnitude'],
+                        'ERFMeanAnnualRate': rup['properties']['MeanAnnualRate'],
+                        'MeanAnnualRate': float(adjusted_rate[i])
+                    })
             # Cleaning tmp outputs
             del erf_data
         elif source_type == 'PointSource':
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of the SimCenter Backend Applications
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# this file. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Kuanshi Zhong
+#
+
+import os
+import re
+import numpy as np
+
+# Version of the ERF models (the OpenSHA release they come from)
+ERF_VERSION = 'OpenSHA-1.5.2'
+# Spacing (km) of the points of the simplified rupture geometry
+POINT_SPACING = 5.0
+# Maximum error (km) of the rupture distances of the simplified geometry
+# (half of the diagonal of a grid cell of the sampled surface)
+DISTANCE_TOLERANCE = POINT_SPACING / np.sqrt(2.0)
+# Mean radius of the Earth (km)
+EARTH_RADIUS = 6371.0
+# Format of the catalog files (catalogs in older formats are compiled again)
+CATALOG_FORMAT = 3
+# Planar approximation of the rupture surfaces (see get_surface_geometry)
+GEOMETRY_FIELDS = ['Rake', 'Dip', 'DipDirection', 'Ztor', 'Width', 'Zhyp',
+                   'Latitude1', 'Longitude1', 'Latitude2', 'Longitude2']
+
+
+def get_catalog_path(erf_name, version = ERF_VERSION):
+    """
+    Getting the path of the rupture catalog of an ERF model
+    Input:
+        erf_name: name of the ERF model (e.g., 'WGCEP (2007) UCERF2 - Single Branch')
+        version: version of the ERF model
+    Output:
+        catalog_path: path to the npz file of the catalog
+    """
+    cwd = os.path.dirname(os.path.realpath(__file__))
+    tag = re.sub('[^0-9a-zA-Z]+', '_', '{}_{}'.format(erf_name, version)).strip('_')
+    catalog_path = os.path.join(cwd, 'database', 'erf', tag + '.npz')
+    # return
+    return catalog_path
+
+
+def get_location(loc):
+    """
+    Converting a Java Location to [latitude, longitude, depth]
+    """
+    return [float(loc.getLatitude()), float(loc.getLongitude()), float(loc.getDepth())]
+
+
+def get_spaced_ids(locs, spacing = POINT_SPACING):
+    """
+    Selecting points of a polyline at most about spacing (km) apart
+    Input:
+        locs: list of [latitude, longitude, depth] along the line
+        spacing: distance (km) between the selected points
+    Output:
+        ids: indices of the selected points (the first and last included)
+    """
+    locs = np.array(locs, dtype = float).reshape(-1, 3)
+    if len(locs) <= 2:
+        return np.arange(len(locs))
+    lat = np.radians(locs[:, 0])
+    lon = np.radians(locs[:, 1])
+    a = np.sin(np.diff(lat) / 2.0) ** 2 + \
+        np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2.0) ** 2
+    seg = np.sqrt((2.0 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))) ** 2 +
+                  np.diff(locs[:, 2]) ** 2)
+    length = np.concatenate([[0.0], np.cumsum(seg)])
+    # last point before every multiple of the spacing
+    ids = np.searchsorted(length, np.arange(0.0, length[-1], spacing), side = 'right') - 1
+    ids = np.unique(np.concatenate([ids, [len(locs) - 1]]))
+    # return
+    return ids
+
+
+def get_grid_ids(num, stride):
+    """
+    Every stride-th index of range(num), the last one included
+    """
+    return np.unique(np.append(np.arange(0, num, max(int(stride), 1)), num - 1))
+
+
+def sample_surface(ruptureSurface, spacing = POINT_SPACING):
+    """
+    Sampling the points of a rupture surface about spacing (km) apart
+    Output:
+        locs: list of [latitude, longitude, depth]
+    Note:
+        Gridded surfaces are sampled every few rows and columns (the edges
+        included); the perimeter and the discretized surface are thinned
+        for the other surfaces.
+    """
+    try:
+        num_rows = int(ruptureSurface.getNumRows())
+        num_cols = int(ruptureSurface.getNumCols())
+        stride = int(np.ceil(spacing / float(ruptureSurface.getAveGridSpacing())))
+        return [get_location(ruptureSurface.get(int(i), int(j)))
+                for i in get_grid_ids(num_rows, stride)
+                for j in get_grid_ids(num_cols, stride)]
+    except:
+        pass
+    perimeter = ruptureSurface.getPerimeter()
+    locs = [get_location(perimeter.get(k)) for k in range(perimeter.size())]
+    locs = [locs[k] for k in get_spaced_ids(locs, spacing)]
+    surface = ruptureSurface.getEvenlyDiscritizedListOfLocsOnSurface()
+    kept = np.array(locs, dtype = float).reshape(-1, 3)
+    for k in range(surface.size()):
+        cur_loc = get_location(surface.get(k))
+        # keeping the points farther than the spacing from the kept ones
+        d = np.sqrt(((kept[:, 0] - cur_loc[0]) * 111.2) ** 2 +
+                    ((kept[:, 1] - cur_loc[1]) * 111.2 * np.cos(np.radians(cur_loc[0]))) ** 2 +
+                    (kept[:, 2] - cur_loc[2]) ** 2)
+        if (len(d) == 0) or (d.min() > spacing):
+            locs.append(cur_loc)
+            kept = np.vstack([kept, cur_loc])
+    # return
+    return locs
+
+
+def get_surface_geometry(rupture, ruptureSurface):
+    """
+    Getting the planar approximation of a rupture surface
+    Output:
+        geometry: values of GEOMETRY_FIELDS (NaN if not available)
+    """
+    geometry = [float(rupture.getAveRake())]
+    for get_value in [ruptureSurface.getAveDip, ruptureSurface.getAveDipDirection,
+                      ruptureSurface.getAveRupTopDepth, ruptureSurface.getAveWidth]:
+        try:
+            geometry.append(float(get_value()))
+        except:
+            geometry.append(np.nan)
+    try:
+        hypo = rupture.getHypocenterLocation()
+        geometry.append(float(hypo.getDepth()) if hypo is not None else np.nan)
+    except:
+        geometry.append(np.nan)
+    try:
+        first = ruptureSurface.getFirstLocOnUpperEdge()
+        last = ruptureSurface.getLastLocOnUpperEdge()
+    except:
+        first = last = ruptureSurface.getLocation()
+    geometry.extend([float(first.getLatitude()), float(first.getLongitude()),
+                     float(last.getLatitude()), float(last.getLongitude())])
+    # return
+    return geometry
+
+
+def compile_catalog(erf_name, version = ERF_VERSION, erf = None):
+    """
+    Compiling the rupture catalog of an ERF model
+    Input:
+        erf_name: name of the ERF model
+        version: version of the ERF model
+        erf: updated ERF instance (default: created with getERF)
+    Output:
+        catalog: see load_catalog
+    Note:
+        This is the only step that reads the ERF through the JVM. Every
+        rupture is saved with its source and rupture IDs, magnitude, mean
+        annual rate, its planar approximation (GEOMETRY_FIELDS) and a
+        simplified geometry: points of its surface about POINT_SPACING apart
+        (see sample_surface).
+    """
+    from OpenSHAJVM import load_opensha
+    from tqdm import tqdm
+    if erf is None:
+        erf = load_opensha().getERF(erf_name, True)
+    duration = erf.getTimeSpan().getDuration()
+    source_name = []
+    source_id = []
+    rupture_id = []
+    magnitude = []
+    rate = []
+    geometry = []
+    pts = []
+    pts_start = [0]
+    for i in tqdm(range(erf.getNumSources()), desc='Sources'):
+        rupSource = erf.getSource(i)
+        source_name.append(str(rupSource.getName()))
+        try:
+            rupList = rupSource.getRuptureList()
+        except:
+            continue
+        for j in range(rupList.size()):
+            rupture = rupList.get(j)
+            source_id.append(i)
+            rupture_id.append(j)
+            magnitude.append(float(rupture.getMag()))
+            rate.append(float(rupture.getMeanAnnualRate(duration)))
+            ruptureSurface = rupture.getRuptureSurface()
+            geometry.append(get_surface_geometry(rupture, ruptureSurface))
+            if ruptureSurface.isPointSurface():
+                cur_pts = [get_location(ruptureSurface.getLocation())]
+            else:
+                cur_pts = sample_surface(ruptureSurface)
+            pts.extend(cur_pts)
+            pts_start.append(len(pts))
+    catalog = {
+        'Format': np.array(CATALOG_FORMAT),
+        'Model': np.array(erf_name),
+        'Version': np.array(version),
+        'Duration': np.array(float(duration)),
+        'SourceName': np.array(source_name, dtype = str),
+        'SourceID': np.array(source_id, dtype = int),
+        'RuptureID': np.array(rupture_id, dtype = int),
+        'Magnitude': np.array(magnitude),
+        'MeanAnnualRate': np.array(rate),
+        'Geometry': np.array(geometry, dtype = float).reshape(-1, len(GEOMETRY_FIELDS)),
+        'Points': np.array(pts, dtype = float).reshape(-1, 3),
+        'PointStart': np.array(pts_start, dtype = int)
+    }
+    # Saving the catalog (replaced at once, so readers never see a partial file)
+    catalog_path = get_catalog_path(erf_name, version)
+    os.makedirs(os.path.dirname(catalog_path), exist_ok = True)
+    tmp_path = '{}.{}.tmp.npz'.format(catalog_path[:-4], os.getpid())
+    np.savez(tmp_path, **catalog)
+    os.replace(tmp_path, catalog_path)
+    # return
+    return catalog
+
+
+def load_catalog(erf_name, version = ERF_VERSION):
+    """
+    Loading the rupture catalog of an ERF model
+    Input:
+        erf_name: name of the ERF model
+        version: version of the ERF model
+    Output:
+        catalog: dictionary of 'SourceName' (sources), 'SourceID',
+                 'RuptureID', 'Magnitude', 'MeanAnnualRate', 'Geometry'
+                 (ruptures), 'Points' (latitude, longitude and depth of the simplified
+                 geometries) and 'PointStart' (first point of each rupture)
+    Note:
+        The catalog is compiled at the first call for a model and version.
+    """
+    catalog_path = get_catalog_path(erf_name, version)
+    if not os.path.exists(catalog_path):
+        print('ERFCatalog: compiling the rupture catalog of {} ({}).'.format(erf_name, version))
+        return compile_catalog(erf_name, version)
+    with np.load(catalog_path) as data:
+        catalog = {k: data[k] for k in data.files}
+    if catalog.get('Format', 1) != CATALOG_FORMAT:
+        print('ERFCatalog: updating the rupture catalog of {} ({}).'.format(erf_name, version))
+        return compile_catalog(erf_name, version)
+    # return
+    return catalog
+
+
+def get_rupture_distance(catalog, site_loc):
+    """
+    Computing the approximate rupture distances from a site
+    Input:
+        catalog: rupture catalog
+        site_loc: [latitude, longitude] of the site
+    Output:
+        dist: closest distance (km) from the site to the simplified geometry
+              of each rupture; it overestimates the rupture distance by up
+              to DISTANCE_TOLERANCE
+    """
+    pts = np.radians(catalog['Points'][:, 0:2])
+    lat, lon = np.radians(site_loc[0]), np.radians(site_loc[1])
+    # Haversine distance at the surface and depth of the points
+    a = np.sin((pts[:, 0] - lat) / 2.0) ** 2 + \
+        np.cos(lat) * np.cos(pts[:, 0]) * np.sin((pts[:, 1] - lon) / 2.0) ** 2
+    dist_h = 2.0 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    dist_pts = np.sqrt(dist_h ** 2 + catalog['Points'][:, 2] ** 2)
+    # Closest point of each rupture
+    dist = np.minimum.reduceat(dist_pts, catalog['PointStart'][:-1])
+    # return
+    return dist
+
+
+def select_ruptures(catalog, site_loc, EqName = None, minMag = 0.0, maxMag = 10.0,
+                    maxDistance = 1000.0, maxSources = 500):
+    """
+    Selecting ruptures from the catalog (see FetchOpenSHA.export_to_json)
+    Input:
+        catalog: rupture catalog
+        site_loc: [latitude, longitude] of the reference site
+        EqName: part of the source name (optional)
+        minMag, maxMag: magnitude bounds
+        maxDistance: maximum source distance (km); the approximate distances
+                     are compared with maxDistance + DISTANCE_TOLERANCE, so no
+                     rupture within maxDistance is missed
+        maxSources: maximum number of sources (the closest ones)
+    Output:
+        erf_data: feature collection of the selected ruptures; the ruptures
+                  are ordered by the distance of their source and then by
+                  their own distance
+    """
+    rup_dist = get_rupture_distance(catalog, site_loc)
+    source_id = catalog['SourceID']
+    num_sources = len(catalog['SourceName'])
+    # Source distance - the closest of its ruptures
+    source_dist = np.full(num_sources, np.inf)
+    np.minimum.at(source_dist, source_id, rup_dist)
+    # Closest sources within the maximum distance
+    source_order = np.argsort(source_dist, kind = 'stable')[:min(maxSources, num_sources)]
+    source_order = source_order[source_dist[source_order] <= maxDistance + DISTANCE_TOLERANCE]
+    source_rank = np.full(num_sources, -1)
+    source_rank[source_order] = np.arange(len(source_order))
+    # Rupture filters
+    mag = catalog['Magnitude']
+    maf = catalog['MeanAnnualRate']
+    tag = (source_rank[source_id] >= 0) & (maf > 0.0) & (mag >= minMag) & (mag <= maxMag)
+    if EqName is not None:
+        name_tag = np.array([EqName in name for name in catalog['SourceName']], dtype = bool)
+        tag = tag & name_tag[source_id]
+    rup_ids = np.where(tag)[0]
+    rup_ids = rup_ids[np.lexsort((rup_dist[rup_ids], source_rank[source_id[rup_ids]]))]
+    # Features
+    feature_collection = []
+    for k in rup_ids:
+        feature_collection.append({
+            'type': 'Feature',
+            'properties': {
+                'Name': str(catalog['SourceName'][source_id[k]]),
+                'Magnitude': float(mag[k]),
+                'Rupture': int(catalog['RuptureID'][k]),
+                'Source': int(source_id[k]),
+                'Distance': float(rup_dist[k]),
+                'MeanAnnualRate': float(maf[k])
+            }
+        })
+    erf_data = {'type': 'FeatureCollection',
+                'features': feature_collection}
+    # return
+    return erf_data
+
+
+def get_rupture_geometry(source_info, catalog = None, rupture_index = None):
+    """
+    Getting the planar approximation of a rupture
+    Input:
+        source_info: scenario ('PointSource' or 'ERF')
+        catalog: rupture catalog (ERF scenarios)
+        rupture_index: row of the rupture in the catalog (ERF scenarios)
+    Output:
+        geometry: dictionary of 'Magnitude', 'MeanAnnualRate' (None for point
+                  sources) and GEOMETRY_FIELDS
+    """
+    if source_info['Type'] == 'PointSource':
+        loc = source_info['Location']
+        geometry = {'Magnitude': float(source_info['Magnitude']),
+                    'MeanAnnualRate': None,
+                    'Rake': float(source_info['AverageRake']),
+                    'Dip': float(source_info['AverageDip']),
+                    'DipDirection': np.nan,
+                    'Ztor': float(loc['Depth']),
+                    'Width': 0.0,
+                    'Zhyp': float(loc['Depth']),
+                    'Latitude1': float(loc['Latitude']),
+                    'Longitude1': float(loc['Longitude']),
+                    'Latitude2': float(loc['Latitude']),
+                    'Longitude2': float(loc['Longitude'])}
+    else:
+        geometry = dict(zip(GEOMETRY_FIELDS, catalog['Geometry'][rupture_index].tolist()))
+        geometry.update({'Magnitude': float(catalog['Magnitude'][rupture_index]),
+                         'MeanAnnualRate': float(catalog['MeanAnnualRate'][rupture_index])})
+    # return
+    return geometry
+
+
+def get_site_distances(geometry, lat, lon):
+    """
+    Computing the distances from sites to a planar rupture
+    Input:
+        geometry: planar approximation of the rupture (see get_rupture_geometry)
+        lat, lon: arrays of the site locations
+    Output:
+        dist: dictionary of 'Rrup', 'Rjb', 'Rx' and 'Ry0' arrays (km)
+    Note:
+        The sites are projected on a plane at the first point of the upper
+        edge. Point ruptures (no length and width) are given Rx = -Rjb, so
+        that no hanging wall effect is applied.
+    """
+    lat0 = np.radians(geometry['Latitude1'])
+    lon0 = np.radians(geometry['Longitude1'])
+    x = EARTH_RADIUS * (np.radians(lon) - lon0) * np.cos(lat0)
+    y = EARTH_RADIUS * (np.radians(lat) - lat0)
+    # Upper edge (strike) and down-dip directions
+    x2 = EARTH_RADIUS * (np.radians(geometry['Longitude2']) - lon0) * np.cos(lat0)
+    y2 = EARTH_RADIUS * (np.radians(geometry['Latitude2']) - lat0)
+    length = np.sqrt(x2 ** 2 + y2 ** 2)
+    width = 0.0 if np.isnan(geometry['Width']) else geometry['Width']
+    dip = np.radians(geometry['Dip'])
+    ztor = geometry['Ztor']
+    if length > 1e-6:
+        s = np.array([x2, y2]) / length
+        d = np.array([s[1], -s[0]])
+        if not np.isnan(geometry['DipDirection']):
+            dip_dir = np.radians(geometry['DipDirection'])
+            if d[0] * np.sin(dip_dir) + d[1] * np.cos(dip_dir) < 0.0:
+                d = -d
+    elif not np.isnan(geometry['DipDirection']):
+        dip_dir = np.radians(geometry['DipDirection'])
+        d = np.array([np.sin(dip_dir), np.cos(dip_dir)])
+        s = np.array([-d[1], d[0]])
+    else:
+        s = np.array([1.0, 0.0])
+        d = np.array([0.0, -1.0])
+    # Coordinates along strike and in the dip direction
+    t = x * s[0] + y * s[1]
+    u = x * d[0] + y * d[1]
+    # Joyner-Boore distance (surface projection)
+    w_h = width * np.cos(dip)
+    a = np.clip(t, 0.0, length)
+    b = np.clip(u, 0.0, w_h)
+    rjb = np.sqrt((t - a) ** 2 + (u - b) ** 2)
+    # Rupture distance (closest point of the rectangle)
+    q = u * np.cos(dip) - ztor * np.sin(dip)
+    b = np.clip(q, 0.0, width)
+    rrup = np.sqrt((t - a) ** 2 + (u - b * np.cos(dip)) ** 2 + (ztor + b * np.sin(dip)) ** 2)
+    # Distances from the upper edge
+    if (length > 1e-6) or (width > 1e-6):
+        rx = u
+        ry0 = np.maximum(np.maximum(-t, t - length), 0.0)
+    else:
+        rx = -rjb
+        ry0 = rjb
+    dist = {'Rrup': rrup, 'Rjb': rjb, 'Rx': rx, 'Ry0': ry0}
+    # return
+    return dist
@@ -85,8 +85,19 @@ from org.opensha.sha.gcim.imr.param.EqkRuptureParams import *
 from org.opensha.sha.gcim.calc import *
 
 
+# ERF instances created in this process (see getERF)
+erf_cache = dict()
+
+
 def getERF(erf_name, update_flag):
 
+    # Reusing the ERF if it has been created (and updated if requested)
+    if erf_name in erf_cache.keys():
+        erf, updated = erf_cache[erf_name]
+        if update_flag and (not updated):
+            erf.updateForecast()
+            erf_cache[erf_name] = (erf, True)
+        return erf
     # Initialization
     erf = None
     # ERF model options
@@ -118,6 +129,8 @@ def getERF(erf_name, update_flag):
 
     if erf_name and update_flag:
         erf.updateForecast()
+    if erf is not None:
+        erf_cache[erf_name] = (erf, bool(erf_name and update_flag))
     # return
     return erf
 
@@ -287,15 +300,12 @@ def get_DataSource(paramName, siteData):
     return 1
 
 
-def get_site_prop(gmpe_name, siteSpec):
+def get_site_data(siteSpec):
 
-    # GMPE
-    try:
-        imr = CreateIMRInstance(gmpe_name)
-    except:
-        print('Please check GMPE name.')
-        return 1
-    # Site data
+    # Querying the site data providers for all sites; the values are
+    # returned as Python lists [data type, measurement type, value, source]
+    # per site and provider, so the (remote) queries can be done once and
+    # the results passed to other processes (see get_site_prop)
     sites = ArrayList()
     for cur_site in siteSpec:
         cur_loc = Location(cur_site['Location']['Latitude'], cur_site['Location']['Longitude'])
@@ -305,7 +315,43 @@ def get_site_prop(gmpe_name, siteSpec):
         availableSiteData = siteDataProviders.getAllAvailableData(sites)
     except:
         print('Error in getAllAvailableData')
-        return 1
+        return None
+    site_data = [[] for i in range(len(siteSpec))]
+    for j in range(availableSiteData.size()):
+        provider_data = availableSiteData.get(j)
+        for i in range(len(siteSpec)):
+            dataValue = provider_data.getValue(i)
+            value = dataValue.getValue()
+            if value is None:
+                pass
+            elif 'Double' in str(type(value)):
+                value = float(value)
+            else:
+                value = str(value)
+            site_data[i].append([str(dataValue.getDataType()), str(dataValue.getDataMeasurementType()),
+                                 value, str(dataValue.getSourceName())])
+    # Return
+    return site_data
+
+
+def get_site_prop(gmpe_name, siteSpec, imr = None, site_data = None):
+
+    # GMPE (an existing instance can be provided - see IMRSession)
+    if imr is None:
+        try:
+            imr = CreateIMRInstance(gmpe_name)
+        except:
+            print('Please check GMPE name.')
+            return 1
+    # Site data (queried here unless given by get_site_data)
+    if site_data is None:
+        site_data = get_site_data(siteSpec)
+        if site_data is None:
+            return 1
+    sites = ArrayList()
+    for cur_site in siteSpec:
+        cur_loc = Location(cur_site['Location']['Latitude'], cur_site['Location']['Longitude'])
+        sites.add(Site(cur_loc))
     siteTrans = SiteTranslator()
     # Looping over all sites
     site_prop = []
@@ -319,8 +365,10 @@ def get_site_prop(gmpe_name, siteSpec):
                       'Longitude': cur_site['Location']['Longitude']}
         cur_loc = Location(cur_site['Location']['Latitude'], cur_site['Location']['Longitude'])
         siteDataValues = ArrayList()
-        for j in range(len(availableSiteData)):
-            siteDataValues.add(availableSiteData.get(j).getValue(i))
+        for dataType, measType, value, sourceName in site_data[i]:
+            if isinstance(value, float):
+                value = Double(value)
+            siteDataValues.add(SiteDataValue(dataType, measType, value, sourceName))
         imrSiteParams = imr.getSiteParams()
         siteDataResults = []
         # Setting site parameters
@@ -369,21 +417,119 @@ def get_site_prop(gmpe_name, siteSpec):
     return siteSpec, sites, site_prop
 
 
-def get_IM(gmpe_info, erf, sites, siteSpec, site_prop, source_info, station_info, im_info):
+class IMRSession:
+    """
+    Intensity measure relationship reused for all scenarios of a run
+
+    The IMR instance, its parameters and the Java constants are set up once,
+    and the mean and standard deviations of all sites are collected in NumPy
+    arrays (sites x periods) with as few JPype calls as possible.
+    """
+
+    def __init__(self, gmpe_info):
+
+        # GMPE name
+        self.gmpe_name = gmpe_info['Type']
+        self.imrParams = gmpe_info.get('Parameters', None)
+        # Creating intensity measure relationship instance
+        self.imr = CreateIMRInstance(self.gmpe_name)
+        # Getting supported intensity measure types
+        ims = self.imr.getSupportedIntensityMeasures()
+        saParam = ims.getParameter(SA_Param.NAME)
+        self.supportedPeriods = saParam.getPeriodParam().getPeriods()
+        Arrays.sort(self.supportedPeriods)
+        # Period parameter of the SA in the imr
+        self.periodParam = saParam.getPeriodParam()
+        # Standard deviation types
+        try:
+            self.stdDevParam = self.imr.getParameter(StdDevTypeParam.NAME)
+            self.hasIEStats = self.stdDevParam.isAllowed(StdDevTypeParam.STD_DEV_TYPE_INTER) and \
+                self.stdDevParam.isAllowed(StdDevTypeParam.STD_DEV_TYPE_INTRA)
+        except:
+            self.stdDevParam = None
+            self.hasIEStats = False
+        self.stdDevTypes = [StdDevTypeParam.STD_DEV_TYPE_TOTAL,
+                            StdDevTypeParam.STD_DEV_TYPE_INTER,
+                            StdDevTypeParam.STD_DEV_TYPE_INTRA]
+
+    def set_rupture(self, eqRup):
+
+        # Setting up imr
+        self.imr.setEqkRupture(eqRup)
+        if bool(self.imrParams):
+            for k in self.imrParams.keys():
+                self.imr.getParameter(k).setValue(self.imrParams[k])
+
+    def compute(self, sites, im_info):
+        """
+        Computing the ln mean and standard deviations of the intensity
+        measures at all sites for the current rupture
+
+        Returns a dictionary of the results (e.g., res['lnSA']['Mean'] is a
+        sites x periods array) and the periods.
+        """
+
+        # Intensity measures (label, OpenSHA name, periods)
+        cur_T = im_info.get('Periods', None)
+        im_list = []
+        if 'SA' in im_info['Type']:
+            im_list.append(('lnSA', 'SA', [Double(float(Tj)) for Tj in cur_T]))
+        if 'PGA' in im_info['Type']:
+            # for PGA current T = 0
+            cur_T = [0.00]
+            im_list.append(('lnPGA', 'PGA', None))
+        if 'PGV' in im_info['Type']:
+            # for PGV current T = 0
+            cur_T = [0.00]
+            im_list.append(('lnPGV', 'PGV', None))
+        # Preallocating results
+        num_sites = sites.size()
+        res = dict()
+        for im_label, im_name, periods in im_list:
+            num_periods = 1 if periods is None else len(periods)
+            res[im_label] = {'Mean': np.zeros((num_sites, num_periods)),
+                             'TotalStdDev': np.zeros((num_sites, num_periods))}
+            if self.hasIEStats:
+                res[im_label].update({
+                    'InterEvStdDev': np.zeros((num_sites, num_periods)),
+                    'IntraEvStdDev': np.zeros((num_sites, num_periods))})
+        # Bound Java methods
+        imr = self.imr
+        setSite = imr.setSite
+        setIntensityMeasure = imr.setIntensityMeasure
+        getMean = imr.getMean
+        getStdDev = imr.getStdDev
+        setPeriod = self.periodParam.setValue
+        setStdDevType = None if self.stdDevParam is None else self.stdDevParam.setValue
+        # Standard deviation types (the mean is collected with the total one)
+        std_list = [('TotalStdDev', self.stdDevTypes[0])]
+        if self.hasIEStats:
+            std_list.extend([('InterEvStdDev', self.stdDevTypes[1]),
+                             ('IntraEvStdDev', self.stdDevTypes[2])])
+        # Looping over sites
+        for i in range(num_sites):
+            # Set up the site in the imr
+            setSite(sites.get(i))
+            for im_label, im_name, periods in im_list:
+                cur_res = res[im_label]
+                setIntensityMeasure(im_name)
+                # The standard deviation type is switched once per site and
+                # the periods are looped within every type
+                for std_label, std_type in std_list:
+                    if setStdDevType is not None:
+                        setStdDevType(std_type)
+                    for j in range(1 if periods is None else len(periods)):
+                        if periods is not None:
+                            setPeriod(periods[j])
+                        if std_label == 'TotalStdDev':
+                            cur_res['Mean'][i, j] = getMean()
+                        cur_res[std_label][i, j] = getStdDev()
+        # return
+        return res, cur_T
+
+
+def get_rupture(erf, source_info):
 
-    # GMPE name
-    gmpe_name = gmpe_info['Type']
-    # Creating intensity measure relationship instance
-    try:
-        imr = CreateIMRInstance(gmpe_name)
-    except:
-        print('Please check GMPE name.')
-        return 1, station_info
-    # Getting supported intensity measure types
-    ims = imr.getSupportedIntensityMeasures()
-    saParam = ims.getParameter(SA_Param.NAME)
-    supportedPeriods = saParam.getPeriodParam().getPeriods()
-    Arrays.sort(supportedPeriods)
     # Rupture
     eqRup = EqkRupture()
     if source_info['Type'] == 'PointSource':
@@ -400,7 +546,7 @@ def get_IM(gmpe_info, erf, sites, siteSpec, site_prop, source_info, station_info
         erfParams = source_info.get('Parameters', None)
         # Additional parameters (if any)
         if erfParams is not None:
-            for k in erfParams.keys:
+            for k in erfParams.keys():
                 erf.setParameter(k, erfParams[k])
         # Time span
         timeSpan = erf.getTimeSpan()
@@ -420,118 +566,34 @@ def get_IM(gmpe_info, erf, sites, siteSpec, site_prop, source_info, station_info
         meanAnnualRate = probEqRup.getMeanAnnualRate(timeSpan.getDuration())
         # Rupture surface
         surface = eqRup.getRuptureSurface()
+    # return
+    return eqRup, magnitude, meanAnnualRate
+
+
+def get_IM(gmpe_info, erf, sites, siteSpec, site_prop, source_info, station_info, im_info, imr_session = None):
+
+    # Intensity measure relationship (an IMRSession can be reused for all scenarios)
+    if imr_session is None:
+        try:
+            imr_session = IMRSession(gmpe_info)
+        except:
+            print('Please check GMPE name.')
+            return 1, station_info
+    # Rupture
+    eqRup, magnitude, meanAnnualRate = get_rupture(erf, source_info)
     # Setting up imr
-    imr.setEqkRupture(eqRup)
-    imrParams = gmpe_info['Parameters']
-    if bool(imrParams):
-        for k in imrParams.keys():
-            imr.getParameter(k).setValue(imrParams[k])
+    imr_session.set_rupture(eqRup)
     # Station
     if station_info['Type'] == 'SiteList':
         siteSpec = station_info['SiteList']
-    # Intensity measure
-    periods = im_info.get('Periods', None)
-    if periods is not None:
-        periods = supportedPeriods
-    tag_SA = False
-    tag_PGA = False
-    tag_PGV = False
-    tag_Ds575 = False
-    tag_Ds595 = False
-    if 'SA' in im_info['Type']:
-        tag_SA = True
-    if 'PGA' in im_info['Type']:
-        tag_PGA = True
-    if 'PGV' in im_info['Type']:
-        tag_PGV = True
-    if 'Ds575' in im_info['Type']:
-        tag_Ds575 = True
-    if 'Ds595' in im_info['Type']:
-        tag_Ds595 = True
-    # Looping over sites
+    # Computing intensity measures at all sites
+    im_res, cur_T = imr_session.compute(sites, im_info)
+    # Collecting the results of each site (rows of the result arrays)
     gm_collector = []
     for i in range(len(siteSpec)):
-        gmResults = site_prop[i]
-        # Current site
-        site = sites.get(i)
-        # Location
-        cur_site = siteSpec[i]
-        # Set up the site in the imr
-        imr.setSite(site)
-        try:
-            stdDevParam = imr.getParameter(StdDevTypeParam.NAME)
-            hasIEStats = stdDevParam.isAllowed(StdDevTypeParam.STD_DEV_TYPE_INTER) and \
-                stdDevParam.isAllowed(StdDevTypeParam.STD_DEV_TYPE_INTRA)
-        except:
-            stdDevParaam = None
-            hasIEStats = False
-        cur_T = im_info.get('Periods', None)
-        if tag_SA:
-            saResult = {'Mean': [],
-                        'TotalStdDev': []}
-            if hasIEStats:
-                saResult.update({'InterEvStdDev': []})
-                saResult.update({'IntraEvStdDev': []})
-            imr.setIntensityMeasure("SA")
-            imtParam = imr.getIntensityMeasure()
-            for Tj in cur_T:
-                imtParam.getIndependentParameter(PeriodParam.NAME).setValue(float(Tj))
-                mean = imr.getMean()
-                saResult['Mean'].append(float(mean))
-                if stdDevParam is not None:
-                    stdDevParam.setValue(StdDevTypeParam.STD_DEV_TYPE_TOTAL)
-                stdDev = imr.getStdDev()
-                saResult['TotalStdDev'].append(float(stdDev))
-                if hasIEStats:
-                    stdDevParam.setValue(StdDevTypeParam.STD_DEV_TYPE_INTER)
-                    interEvStdDev = imr.getStdDev()
-                    stdDevParam.setValue(StdDevTypeParam.STD_DEV_TYPE_INTRA)
-                    intraEvStdDev = imr.getStdDev()
-                    saResult['InterEvStdDev'].append(float(interEvStdDev))
-                    saResult['IntraEvStdDev'].append(float(intraEvStdDev))
-            gmResults.update({'lnSA': saResult})
-        if tag_PGA:
-            # for PGV current T = 0
-            cur_T = [0.00]
-            pgaResult = {'Mean': [],
-                        'TotalStdDev': []}
-            if hasIEStats:
-                pgaResult.update({'InterEvStdDev': []})
-                pgaResult.update({'IntraEvStdDev': []})
-            imr.setIntensityMeasure("PGA")
-            mean = imr.getMean()
-            pgaResult['Mean'].append(float(mean))
-            stdDev = imr.getStdDev()
-            pgaResult['TotalStdDev'].append(float(stdDev))
-            if hasIEStats:
-                stdDevParam.setValue(StdDevTypeParam.STD_DEV_TYPE_INTER)
-                interEvStdDev = imr.getStdDev()
-                stdDevParam.setValue(StdDevTypeParam.STD_DEV_TYPE_INTRA)
-                intraEvStdDev = imr.getStdDev()
-                pgaResult['InterEvStdDev'].append(float(interEvStdDev))
-                pgaResult['IntraEvStdDev'].append(float(intraEvStdDev))
-            gmResults.update({'lnPGA': pgaResult})
-        if tag_PGV:
-            # for PGV current T = 0
-            cur_T = [0.00]
-            pgvResult = {'Mean': [],
-                        'TotalStdDev': []}
-            if hasIEStats:
-                pgaResult.update({'InterEvStdDev': []})
-                pgaResult.update({'IntraEvStdDev': []})
-            imr.setIntensityMeasure("PGV")
-            mean = imr.getMean()
-            pgvResult['Mean'].append(float(mean))
-            stdDev = imr.getStdDev()
-            pgvResult['TotalStdDev'].append(float(stdDev))
-            if hasIEStats:
-                stdDevParam.setValue(StdDevTypeParam.STD_DEV_TYPE_INTER)
-                interEvStdDev = imr.getStdDev()
-                stdDevParam.setValue(StdDevTypeParam.STD_DEV_TYPE_INTRA)
-                intraEvStdDev = imr.getStdDev()
-                pgvResult['InterEvStdDev'].append(float(interEvStdDev))
-                pgvResult['IntraEvStdDev'].append(float(intraEvStdDev))
-            gmResults.update({'lnPGV': pgvResult})
+        gmResults = dict(site_prop[i])
+        for im_label, im_data in im_res.items():
+            gmResults.update({im_label: {k: v[i] for k, v in im_data.items()}})
         gm_collector.append(gmResults)
     # Updating station information
     if station_info['Type'] == 'SiteList':
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of the SimCenter Backend Applications
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# this file. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Kuanshi Zhong
+#
+
+import os
+import argparse
+import hashlib
+import numpy as np
+import pandas as pd
+
+# Columns of the NGAWest2 flatfile
+NGAWest2_columns = {
+    'PGA': 34,
+    'PSA': (37, 147)
+}
+
+
+def get_gmdb_paths(gmdb_file, cache_dir = None):
+    """
+    Getting the paths of the ground motion database and its compiled data
+    Input:
+        gmdb_file: name of the database (e.g., 'NGAWest2')
+        cache_dir: root folder for the compiled data (optional)
+    Output:
+        csv_path: path to the database csv file
+        cache_dirs: candidate folders of the compiled data, in order of
+                    preference
+    Note:
+        Without cache_dir, the compiled data is saved next to the csv file,
+        or in the GMDB_CACHE_DIR folder (environment variable) or in the
+        user folder (~/.simcenter/gmdb) if the install folder is read-only.
+    """
+    cwd = os.path.dirname(os.path.realpath(__file__))
+    csv_path = os.path.join(cwd, 'database', 'gmdb', gmdb_file + '.csv')
+    if cache_dir is not None:
+        cache_roots = [cache_dir]
+    else:
+        cache_roots = [os.path.join(cwd, 'database', 'gmdb')]
+        if os.environ.get('GMDB_CACHE_DIR', None):
+            cache_roots.append(os.environ['GMDB_CACHE_DIR'])
+        cache_roots.append(os.path.join(os.path.expanduser('~'), '.simcenter', 'gmdb'))
+    cache_dirs = [os.path.join(x, gmdb_file + '_compiled') for x in cache_roots]
+    # return
+    return csv_path, cache_dirs
+
+
+def get_source_stamp(csv_path):
+    """
+    Getting the size and modification time of the database csv file (the
+    compiled data is only valid for the csv file it was compiled from)
+    """
+    csv_stat = os.stat(csv_path)
+    # return
+    return np.array([csv_stat.st_size, csv_stat.st_mtime])
+
+
+def save_array(file_path, data):
+    """
+    Saving an array to a npy file; the file is replaced at once, so
+    parallel readers never see a partially written file
+    """
+    tmp_path = '{}.{}.tmp'.format(file_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.save(f, data)
+    os.replace(tmp_path, file_path)
+
+
+def parse_gmdb(gmdb_file, csv_path):
+    """
+    Parsing the ground motion database csv file
+    Input:
+        gmdb_file: name of the database (e.g., 'NGAWest2')
+        csv_path: path to the database csv file
+    Output:
+        data: dictionary of the arrays of the database (see load_gmdb), None
+              if the database is not supported
+    """
+    if gmdb_file != 'NGAWest2':
+        print('GMDatabase: currently only supporting NGAWest2.')
+        return None
+    gmdb = pd.read_csv(csv_path, header = 0, index_col = None)
+    # Spectral data
+    psa_start, psa_end = NGAWest2_columns['PSA']
+    T_db = np.array([float(a.replace('T','').replace('S',''))
+                     for a in gmdb.keys()[psa_start:psa_end]])
+    psa_db = gmdb.iloc[:, psa_start:psa_end].values.astype(float)
+    pga = gmdb.iloc[:, NGAWest2_columns['PGA']].values.astype(float)
+    # Missing values are replaced by a tiny positive value
+    data = {
+        'Periods': T_db,
+        'lnSA': np.log(np.maximum(psa_db, 1e-20)).astype(np.float32),
+        'lnPGA': np.log(np.maximum(pga, 1e-20)).astype(np.float32),
+        'RecId': gmdb['RecId'].values.astype(int)
+    }
+    for h in ['FileNameHorizontal1', 'FileNameHorizontal2']:
+        data[h] = gmdb[h].to_numpy(dtype = str)
+    # return
+    return data
+
+
+def compile_gmdb(gmdb_file, cache_dir = None):
+    """
+    Compiling the ground motion database into binary files
+    Input:
+        gmdb_file: name of the database (e.g., 'NGAWest2')
+        cache_dir: root folder for the compiled data (optional, see get_gmdb_paths)
+    Output:
+        cache_dir: folder of the compiled data
+    Note:
+        The csv file is parsed only once; the log spectra (float32), the PGA,
+        the periods, the record IDs and file names are saved as npy files that
+        load_gmdb maps into memory without parsing. The interpolated spectra
+        of the previous compilation are removed. OSError is raised if the
+        folder is not writable.
+    """
+    csv_path, cache_dirs = get_gmdb_paths(gmdb_file, cache_dir)
+    cache_dir = cache_dirs[0]
+    data = parse_gmdb(gmdb_file, csv_path)
+    if data is None:
+        return None
+    save_gmdb(data, csv_path, cache_dir)
+    # return
+    return cache_dir
+
+
+def save_gmdb(data, csv_path, cache_dir):
+    """
+    Saving the parsed database (see parse_gmdb) to cache_dir
+    """
+    os.makedirs(cache_dir, exist_ok = True)
+    # The source file is removed first, so the data is not used until the
+    # compilation is complete
+    source_file = os.path.join(cache_dir, 'Source.npy')
+    if os.path.exists(source_file):
+        os.remove(source_file)
+    for x in os.listdir(cache_dir):
+        if x.startswith('SA_') and x.endswith('.npy'):
+            os.remove(os.path.join(cache_dir, x))
+    for key, value in data.items():
+        save_array(os.path.join(cache_dir, key + '.npy'), value)
+    # Source of the compiled data (for checking if it is up to date); this
+    # file is saved last, so the data is complete once it exists
+    save_array(source_file, get_source_stamp(csv_path))
+
+
+def load_gmdb(gmdb_file, cache_dir = None):
+    """
+    Loading the compiled ground motion database
+    Input:
+        gmdb_file: name of the database (e.g., 'NGAWest2')
+        cache_dir: root folder for the compiled data (optional, see get_gmdb_paths)
+    Output:
+        gmdb: dictionary of the database with 'Periods', 'lnSA' (records x
+              periods), 'lnPGA', 'RecId', 'FileNameHorizontal1', and
+              'FileNameHorizontal2'
+    Note:
+        The database is compiled to the first writable candidate folder if
+        the compiled data does not exist or if it does not match the csv
+        file. The arrays are memory-mapped, so parallel workers share the data
+        instead of reading it. If no folder is writable, the csv file is
+        parsed and the database is kept in memory ('Folder' is None).
+    """
+    csv_path, cache_dirs = get_gmdb_paths(gmdb_file, cache_dir)
+    source = get_source_stamp(csv_path)
+    data = None
+    folder = None
+    for cur_dir in cache_dirs:
+        source_file = os.path.join(cur_dir, 'Source.npy')
+        try:
+            if os.path.exists(source_file) and np.array_equal(np.load(source_file), source):
+                folder = cur_dir
+                break
+            if data is None:
+                data = parse_gmdb(gmdb_file, csv_path)
+                if data is None:
+                    return None
+            save_gmdb(data, csv_path, cur_dir)
+            folder = cur_dir
+            break
+        except (OSError, ValueError):
+            print('GMDatabase: cannot save the compiled database to {}.'.format(cur_dir))
+    if folder is None:
+        print('GMDatabase: the database is kept in memory.')
+        gmdb = {'Name': gmdb_file, 'Folder': None, 'Source': source}
+        gmdb.update(data)
+        return gmdb
+    gmdb = {'Name': gmdb_file, 'Folder': folder, 'Source': source}
+    for key in ['Periods', 'lnSA', 'lnPGA', 'RecId',
+                'FileNameHorizontal1', 'FileNameHorizontal2']:
+        gmdb.update({key: np.load(os.path.join(folder, key + '.npy'), mmap_mode = 'r')})
+    # return
+    return gmdb
+
+
+def get_gmdb_spectra(gmdb, target_period):
+    """
+    Getting the spectra of the records at the target periods
+    Input:
+        gmdb: database from load_gmdb
+        target_period: list of periods (a single 0.0 stands for PGA)
+    Output:
+        psa: spectral accelerations (records x periods)
+    Note:
+        The spectra are interpolated linearly (as np.interp) and saved for
+        every set of target periods and database source, so later runs with
+        the same periods load them directly.
+    """
+    target_period = np.array(target_period, dtype = float)
+    if (len(target_period) == 1) and (target_period[0] == 0.0):
+        return np.exp(np.array(gmdb['lnPGA'], dtype = float)).reshape(-1, 1)
+    cache_file = None
+    if gmdb.get('Folder', None) is not None:
+        source = np.array(gmdb.get('Source', []), dtype = float)
+        key = hashlib.sha1(source.tobytes() + target_period.tobytes()).hexdigest()[:16]
+        cache_file = os.path.join(gmdb['Folder'], 'SA_{}.npy'.format(key))
+        if os.path.exists(cache_file):
+            return np.load(cache_file)
+    # Interpolation weights (periods of the database x target periods)
+    T_db = np.array(gmdb['Periods'])
+    weights = np.array([np.interp(target_period, T_db, e_k) for e_k in np.eye(len(T_db))])
+    psa = np.matmul(np.exp(np.array(gmdb['lnSA'], dtype = float)), weights)
+    if cache_file is not None:
+        try:
+            save_array(cache_file, psa)
+        except OSError:
+            pass
+    # return
+    return psa
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--gmdb', default = 'NGAWest2')
+    parser.add_argument('--cache_dir', default = None)
+    args = parser.parse_args()
+
+    # Compiling the database
+    cache_dir = compile_gmdb(args.gmdb, args.cache_dir)
+    if cache_dir is not None:
+        print('GMDatabase: {} compiled to {}'.format(args.gmdb, cache_dir))
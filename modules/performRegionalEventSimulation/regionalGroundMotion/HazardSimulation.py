@@ -40,49 +40,31 @@
 
 import os
 import sys
-import subprocess
-R2D = True
-if R2D:
-    packages = ['JPype1', 'tqdm']
-else:
-    packages = ['JPype1', 'selenium', 'tqdm']
-for p in packages:
-    subprocess.check_call([sys.executable, "-m", "pip", "install", p])
 import argparse, posixpath, json
 import numpy as np
 import pandas as pd
 import time
-import jpype
-from jpype import imports
-from jpype.types import *
-jpype.addClassPath('./lib/OpenSHA-1.5.2.jar')
-jpype.startJVM("-Xmx8G", convertStrings=False)
 
+R2D = True
+
+# The JVM with OpenSHA is started at the first ERF or GMPE call (see OpenSHAJVM)
+from OpenSHAJVM import set_max_heap
 from CreateStation import *
 from CreateScenario import *
 from ComputeIntensityMeasure import *
 from SelectGroundMotion import *
+from IMStore import IMWriter, IM_JSON_MAX_SCENARIOS
 
-if __name__ == '__main__':
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--hazard_config')
-    args = parser.parse_args()
-    with open(args.hazard_config) as f:
-        hazard_info = json.load(f)
+def create_hazard_stations(hazard_info):
 
     # Directory
     dir_info = hazard_info['Directory']
-    work_dir = dir_info['Work']
     input_dir = dir_info['Input']
     output_dir = dir_info['Output']
-    try:
-        os.mkdir(f"{output_dir}")
-    except:
-        print('HazardSimulation: output folder already exists.')
-
     # Sites and stations
     print('HazardSimulation: creating stations.')
+    stations = None
     site_info = hazard_info['Site']
     if site_info['Type'] == 'From_CSV':
         input_file = os.path.join(input_dir,site_info['input_file'])
@@ -91,55 +73,119 @@ if __name__ == '__main__':
             output_file = os.path.join(output_dir, output_file)
         min_ID = site_info['min_ID']
         max_ID = site_info['max_ID']
-        # Creating stations from the csv input file
-        stations = create_stations(input_file, output_file, min_ID, max_ID)
+        # Creating stations from the csv input file (optional site data)
+        stations = create_stations(input_file, output_file, min_ID, max_ID,
+                                   site_info.get('Vs30Default', None),
+                                   site_info.get('DeriveDepths', False))
     if stations:
         print('HazardSimulation: stations created.')
     else:
         print('HazardSimulation: please check the "Input" directory in the configuration json file.')
-        exit()
-    #print(stations)
+    # return
+    return stations
+
+
+def create_hazard_scenarios(hazard_info, stations):
 
     # Scenarios
     print('HazardSimulation: creating scenarios.')
+    scenarios = None
+    input_dir = hazard_info['Directory']['Input']
     scenario_info = hazard_info['Scenario']
     if scenario_info['Type'] == 'Earthquake':
         # Creating earthquake scenarios
         scenarios = create_earthquake_scenarios(scenario_info, stations)
+        # Saving the scenarios (with the adjusted rates if they are reduced)
+        with open(os.path.join(hazard_info['Directory']['Output'], 'EarthquakeScenarios.json'), 'w') as f:
+            json.dump(scenarios, f, indent = 2)
     elif scenario_info['Type'] == 'Wind':
         # Creating wind scenarios
         scenarios = create_wind_scenarios(scenario_info, stations, input_dir)
     else:
         # TODO: extending this to other hazards
         print('HazardSimulation: currently only supports EQ and Wind simulations.')
-    #print(scenarios)
     print('HazardSimulation: scenarios created.')
+    # return
+    return scenarios
+
+
+def create_hazard_selector(hazard_info, stations, num_scenarios):
+
+    # Record selector (None if the selection is not requested)
+    event_info = hazard_info['Event']
+    data_source = event_info.get('Database',0)
+    if not data_source:
+        return None
+    target_T = event_info['IntensityMeasure']['Periods']
+    if event_info['IntensityMeasure']['Type'] =='PGA':
+        # PGA only
+        target_T = [0.0]
+    sf_max = event_info['ScalingFactor']['Maximum']
+    sf_min = event_info['ScalingFactor']['Minimum']
+    # optional spectral shape index for large numbers of targets
+    use_index = event_info.get('SelectionIndex', False)
+    gm_selector = GroundMotionSelector(target_T, data_source, sf_max, sf_min,
+                                       hazard_info['Directory']['Output'], 'EventGrid.csv',
+                                       stations['Stations'], num_scenarios,
+                                       use_index)
+    if gm_selector.gmdb is None:
+        gm_selector = None
+    # return
+    return gm_selector
+
+
+def compute_hazard_im(hazard_info, stations, scenarios):
 
     # Computing intensity measures
     print('HazardSimulation: computing intensity measures.')
+    gm_selector = None
+    input_dir = hazard_info['Directory']['Input']
+    output_dir = hazard_info['Directory']['Output']
+    scenario_info = hazard_info['Scenario']
     if scenario_info['Type'] == 'Earthquake':
-        # Computing uncorrelated Sa
+        # Computing uncorrelated Sa (NumberOfWorkers > 1: one JVM per worker)
         event_info = hazard_info['Event']
         psa_raw, stn_new = compute_spectra(scenarios, stations['Stations'],
                                            event_info['GMPE'],
-                                           event_info['IntensityMeasure'])
+                                           event_info['IntensityMeasure'],
+                                           event_info.get('NumberOfWorkers', 1))
         # Updating station information
         stations['Stations'] = stn_new
         print('HazardSimulation: uncorrelated response spectra computed.')
-        #print(psa_raw)
-        # Computing log mean Sa
-        ln_psa_mr, mag_maf = simulate_ground_motion(stations['Stations'], psa_raw,
-                                                    event_info['NumberPerSite'],
-                                                    event_info['CorrelationModel'],
-                                                    event_info['IntensityMeasure'])
-        print('HazardSimulation: correlated response spectra computed.')
+        # Simulated ln(Sa) are processed one scenario at a time: every
+        # scenario is saved and used for record selection and then released
+        gm_iter = iter_ground_motion(stations['Stations'], psa_raw,
+                                     event_info['NumberPerSite'],
+                                     event_info['CorrelationModel'],
+                                     event_info['IntensityMeasure'])
+        im_writer = None
         if event_info['SaveIM']:
             print('HazardSimulation: saving simulated intensity measures.')
-            _ = export_im(stations['Stations'], event_info['IntensityMeasure']['Periods'],
-                          ln_psa_mr, mag_maf, output_dir, 'SiteIM.json')
+            # periods of the simulated spectra ([0.0] for PGA)
+            # (small runs are also saved to SiteIM.json)
+            if len(psa_raw) <= IM_JSON_MAX_SCENARIOS:
+                json_path = os.path.join(output_dir, 'SiteIM.json')
+            else:
+                json_path = None
+            im_writer = IMWriter(stations['Stations'], psa_raw[0]['Periods'],
+                                 len(psa_raw), event_info['NumberPerSite'],
+                                 os.path.join(output_dir, 'SiteIM.h5'),
+                                 json_path=json_path)
+        gm_selector = create_hazard_selector(hazard_info, stations, len(psa_raw))
+        if gm_selector is not None:
+            print('HazardSimulation: selecting ground motion records.')
+        start_time = time.time()
+        for ln_psa, mag_maf in gm_iter:
+            if im_writer is not None:
+                im_writer.write(ln_psa, mag_maf)
+            if gm_selector is not None:
+                gm_selector.select(ln_psa)
+        print('HazardSimulation: correlated response spectra computed.')
+        if im_writer is not None:
+            im_writer.close()
             print('HazardSimulation: simulated intensity measures saved.')
-        #print(np.exp(ln_psa_mr[0][0, :, 1]))
-        #print(np.exp(ln_psa_mr[0][1, :, 1]))
+        if gm_selector is not None:
+            print('HazardSimulation: ground motion records selected  ({0} s).'.format(time.time() - start_time))
     elif scenario_info['Type'] == 'Wind':
         if scenario_info['Generator'] == 'Simulation':
             storm_dir = simulate_storm(scenario_info['AppDir'], input_dir, output_dir)
@@ -149,49 +195,80 @@ if __name__ == '__main__':
         # TODO: extending this to other hazards
         print('HazardSimulation currently only supports earthquake simulations.')
     print('HazardSimulation: intensity measures computed.')
-    # Selecting ground motion records
-    if scenario_info['Type'] == 'Earthquake':
-        # Selecting records
-        target_T = event_info['IntensityMeasure']['Periods']
-        if event_info['IntensityMeasure']['Type'] =='PGA':
-            # PGA only
-            target_T = [0.0]
-        data_source = event_info.get('Database',0)
-        if data_source:
-            print('HazardSimulation: selecting ground motion records.')
-            sf_max = event_info['ScalingFactor']['Maximum']
-            sf_min = event_info['ScalingFactor']['Minimum']
-            start_time = time.time()
-            gm_id, gm_file = select_ground_motion(target_T, ln_psa_mr, data_source,
-                                                  sf_max, sf_min, output_dir, 'EventGrid.csv',
-                                                  stations['Stations'])
-            print('HazardSimulation: ground motion records selected  ({0} s).'.format(time.time() - start_time))
-            #print(gm_id)
-            gm_id = [int(i) for i in np.unique(gm_id)]
-            gm_file = [i for i in np.unique(gm_file)]
-            runtag = output_all_ground_motion_info(gm_id, gm_file, output_dir, 'RecordsList.csv')
-            if runtag:
-                print('HazardSimulation: the ground motion list saved.')
-            else:
-                print('HazardSimulation: warning - issues with saving the ground motion list.')
-            print(gm_id)
-            print(gm_file)
-            # Downloading records
-            user_name = event_info.get('UserName', None)
-            user_password = event_info.get('UserPassword', None)
-            if (user_name is not None) and (user_password is not None) and (not RDT):
-                print('HazardSimulation: downloading ground motion records.')
-                raw_dir = download_ground_motion(gm_id, user_name,
-                                                 user_password, output_dir)
-                if raw_dir:
-                    print('HazardSimulation: ground motion records downloaded.')
-                    # Parsing records
-                    print('HazardSimulation: parsing records.')
-                    record_dir = parse_record(gm_file, raw_dir, output_dir,
-                                              event_info['Database'],
-                                              event_info['OutputFormat'])
-                    print('HazardSimulation: records parsed.')
-                else:
-                    print('HazardSimulation: No records to be parsed.')
+    # return
+    return gm_selector
+
+
+def output_hazard_records(hazard_info, gm_selector):
+
+    # Selected ground motion records
+    if gm_selector is None:
+        print('HazardSimulation: ground motion selection is not requested.')
+        return
+    event_info = hazard_info['Event']
+    output_dir = hazard_info['Directory']['Output']
+    # Unique records of all scenarios
+    gm_id, gm_file = gm_selector.get_records()
+    runtag = output_all_ground_motion_info(gm_id, gm_file, output_dir, 'RecordsList.csv')
+    if runtag:
+        print('HazardSimulation: the ground motion list saved.')
+    else:
+        print('HazardSimulation: warning - issues with saving the ground motion list.')
+    print(gm_id)
+    print(gm_file)
+    # Downloading records
+    user_name = event_info.get('UserName', None)
+    user_password = event_info.get('UserPassword', None)
+    if (user_name is not None) and (user_password is not None) and (not R2D):
+        print('HazardSimulation: downloading ground motion records.')
+        raw_dir = download_ground_motion(gm_id, user_name,
+                                         user_password, output_dir)
+        if raw_dir:
+            print('HazardSimulation: ground motion records downloaded.')
+            # Parsing records
+            print('HazardSimulation: parsing records.')
+            record_dir = parse_record(gm_file, raw_dir, output_dir,
+                                      event_info['Database'],
+                                      event_info['OutputFormat'])
+            print('HazardSimulation: records parsed.')
         else:
-            print('HazardSimulation: ground motion selection is not requested.')
+            print('HazardSimulation: No records to be parsed.')
+
+
+def run_hazard_simulation(hazard_info):
+
+    # Output directory
+    output_dir = hazard_info['Directory']['Output']
+    try:
+        os.mkdir(f"{output_dir}")
+    except:
+        print('HazardSimulation: output folder already exists.')
+    # Maximum heap size of the JVM (only used if OpenSHA is called)
+    if hazard_info.get('JVMHeap', None):
+        set_max_heap(hazard_info['JVMHeap'])
+    # Stages
+    stations = create_hazard_stations(hazard_info)
+    if not stations:
+        return 1
+    scenarios = create_hazard_scenarios(hazard_info, stations)
+    gm_selector = compute_hazard_im(hazard_info, stations, scenarios)
+    if hazard_info['Scenario']['Type'] == 'Earthquake':
+        output_hazard_records(hazard_info, gm_selector)
+    # return
+    return 0
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hazard_config')
+    parser.add_argument('--jvm_heap', default = None,
+                        help = 'maximum heap size of the JVM, shared by the parallel workers (e.g., 4G)')
+    args = parser.parse_args()
+    with open(args.hazard_config) as f:
+        hazard_info = json.load(f)
+    if args.jvm_heap:
+        hazard_info['JVMHeap'] = args.jvm_heap
+
+    if run_hazard_simulation(hazard_info):
+        exit()
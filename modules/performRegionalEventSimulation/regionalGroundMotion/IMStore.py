@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of the SimCenter Backend Applications
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# this file. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Kuanshi Zhong
+#
+
+import os
+import json
+import numpy as np
+import tables
+
+# Compression of the site intensity measure datasets
+IM_COMPLEVEL = 5
+IM_COMPLIB = 'blosc:lz4'
+# Target size of the (uncompressed) lnSa chunks in bytes
+IM_CHUNK_BYTES = 2 ** 21
+# Runs with up to this number of scenarios are also saved to JSON
+IM_JSON_MAX_SCENARIOS = 10
+
+
+class IMWriter:
+    """
+    Streaming writer of the simulated site intensity measures
+    The ln(Sa) values are saved as a (scenario x site x period x realization)
+    dataset in a chunked and compressed HDF5 file with the coordinate arrays
+    (site locations, Vs30, periods, and scenario magnitudes and rates), so
+    that the scenarios can be written one at a time and the sites can be read
+    back in ranges (see read_im).
+    Input:
+        stations: list of stations (with Latitude, Longitude, Vs30 and ID)
+        periods: list of periods
+        num_scenarios: number of scenarios
+        num_simu: number of realizations per scenario
+        file_path: path of the HDF5 file
+        chunk_sites: number of sites in a chunk (default: derived from
+                     IM_CHUNK_BYTES)
+        json_path: path of the JSON file of small runs (optional; the
+                   scenarios are kept in memory and saved by close, see
+                   write_im_json)
+    Note:
+        The chunks are kept around IM_CHUNK_BYTES, so reading a few sites
+        only decompresses a few MB; if a single site exceeds this size, the
+        realizations are split into several chunks too.
+    """
+
+    def __init__(self, stations, periods, num_scenarios, num_simu, file_path,
+                 chunk_sites=None, json_path=None):
+
+        self.file_path = file_path
+        self.num_scenarios = num_scenarios
+        self.shape = (num_scenarios, len(stations), len(periods), num_simu)
+        self.count = 0
+        self.json_path = json_path
+        self.json_data = [None] * num_scenarios if json_path else None
+        # Coordinates
+        coords = {
+            'Periods': np.array(periods, dtype=float),
+            'Latitude': np.array([s['Latitude'] for s in stations], dtype=float),
+            'Longitude': np.array([s['Longitude'] for s in stations], dtype=float),
+            'Vs30': np.array([s['Vs30'] for s in stations], dtype=float),
+            'SiteID': get_site_ids(stations)
+        }
+        self.coords = coords
+        # Starting from a new file
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        self.h5 = tables.open_file(file_path, mode='w')
+        filters = tables.Filters(complevel=IM_COMPLEVEL, complib=IM_COMPLIB,
+                                 shuffle=True)
+        for name, values in coords.items():
+            self.h5.create_array('/', name, values)
+        self.magnitude = self.h5.create_carray(
+            '/', 'Magnitude', tables.Float64Atom(dflt=np.nan),
+            shape=(num_scenarios,))
+        self.rate = self.h5.create_carray(
+            '/', 'MeanAnnualRate', tables.Float64Atom(dflt=np.nan),
+            shape=(num_scenarios,))
+        # ln(Sa) - every chunk covers one scenario and a range of sites
+        chunk_shape = get_chunk_shape(len(stations), len(periods), num_simu,
+                                      chunk_sites)
+        self.ln_sa = self.h5.create_carray(
+            '/', 'lnSa', tables.Float64Atom(dflt=np.nan), shape=self.shape,
+            chunkshape=chunk_shape, filters=filters)
+        self.ln_sa.attrs.dimensions = ['Scenario', 'Site', 'Period',
+                                       'Realization']
+
+    def write(self, ln_psa, mag_maf, scenario_id=None):
+        """
+        Writing the intensity measures of one scenario
+        Input:
+            ln_psa: ln(Sa) of the scenario (site x period x realization)
+            mag_maf: [magnitude, mean annual rate] of the scenario
+            scenario_id: index of the scenario (default: next scenario)
+        """
+        if scenario_id is None:
+            scenario_id = self.count
+        ln_psa = np.asarray(ln_psa)
+        if ln_psa.shape != self.shape[1:]:
+            raise ValueError('IMWriter: ln_psa has the shape {} instead of '
+                             '(site x period x realization) {}.'.format(
+                                 ln_psa.shape, self.shape[1:]))
+        self.ln_sa[scenario_id] = ln_psa
+        self.magnitude[scenario_id] = mag_maf[0]
+        self.rate[scenario_id] = mag_maf[1]
+        self.count += 1
+        if self.json_path:
+            self.json_data[scenario_id] = (ln_psa, mag_maf)
+
+    def close(self):
+
+        self.h5.close()
+        # the JSON file is only saved if all scenarios were written
+        if self.json_path and all(x is not None for x in self.json_data):
+            write_im_json(self.coords, [x[0] for x in self.json_data],
+                          [x[1] for x in self.json_data], self.json_path)
+            self.json_data = None
+            self.json_path = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.close()
+
+
+def write_im_json(coords, im_data, eq_data, file_path):
+    """
+    Saving the site intensity measures of a small run to a JSON file
+    Input:
+        coords: site coordinates and periods (see IMWriter)
+        im_data: list of ln(Sa) (site x period x realization) per scenario
+        eq_data: list of [magnitude, mean annual rate] per scenario
+        file_path: path of the JSON file
+    """
+    periods = coords['Periods'].tolist()
+    res = []
+    for i in range(len(coords['Latitude'])):
+        tmp = {'Location': {
+                   'Latitude': float(coords['Latitude'][i]),
+                   'Longitude': float(coords['Longitude'][i])
+               },
+               'Vs30': int(coords['Vs30'][i]),
+               'Periods': periods}
+        tmp_im = [np.ndarray.tolist(x[i, :, :]) for x in im_data]
+        if len(tmp_im) == 1:
+            # Simplifying the data structure if only one scenario exists
+            tmp_im = tmp_im[0]
+        tmp.update({'lnSa': tmp_im})
+        res.append(tmp)
+    maf_out = []
+    for cur_eq in eq_data:
+        maf_out.append({'Magnitdue': float(cur_eq[0]),
+                        'MeanAnnualRate': None if cur_eq[1] is None else float(cur_eq[1])})
+    with open(file_path, 'w') as f:
+        json.dump({'Station_lnSa': res, 'Earthquake_MAF': maf_out}, f, indent=2)
+
+
+def get_site_ids(stations):
+    """
+    Getting the site IDs to save (integers, or fixed-width UTF-8 strings if
+    the station IDs are not integers)
+    Input:
+        stations: list of stations (the position + 1 if a station has no ID)
+    Output:
+        site_ids: array of the site IDs
+    """
+    ids = np.array([s.get('ID', i + 1) for i, s in enumerate(stations)])
+    if ids.dtype.kind in 'iu':
+        return ids.astype(int)
+    # return
+    return np.char.encode(ids.astype(str), 'utf-8')
+
+
+def get_chunk_shape(num_sites, num_periods, num_simu, chunk_sites=None):
+    """
+    Getting the chunk shape of the lnSa dataset
+    Input:
+        num_sites: number of sites
+        num_periods: number of periods
+        num_simu: number of realizations per scenario
+        chunk_sites: number of sites in a chunk (default: derived from
+                     IM_CHUNK_BYTES)
+    Output:
+        chunk_shape: (scenario, site, period, realization) shape of a chunk
+    """
+    num_periods = max(num_periods, 1)
+    num_simu = max(num_simu, 1)
+    # realizations in a chunk (all of them unless one site is too large)
+    chunk_simu = int(min(num_simu, max(IM_CHUNK_BYTES // (8 * num_periods), 1)))
+    if chunk_sites is None:
+        chunk_sites = IM_CHUNK_BYTES // (8 * num_periods * chunk_simu)
+    chunk_sites = int(max(min(chunk_sites, num_sites), 1))
+    # return
+    return (1, chunk_sites, num_periods, chunk_simu)
+
+
+def read_im(file_path, site_range=None, scenarios=None):
+    """
+    Reading the site intensity measures saved by IMWriter
+    Only the chunks of the requested sites and scenarios are decompressed.
+    Input:
+        file_path: path of the HDF5 file
+        site_range: (first, last + 1) positions of the sites to read
+                    (default: all sites)
+        scenarios: scenario index, slice, or (first, last + 1) positions
+                   (default: all scenarios)
+    Output:
+        im_data: dictionary of the coordinates and the lnSa array
+                 (scenario x site x period x realization)
+    """
+    if site_range is None:
+        site_slice = slice(None)
+    else:
+        site_slice = slice(*site_range)
+    if scenarios is None:
+        scen_slice = slice(None)
+    elif isinstance(scenarios, (tuple, list)):
+        scen_slice = slice(*scenarios)
+    else:
+        scen_slice = scenarios
+    with tables.open_file(file_path, mode='r') as h5:
+        im_data = {
+            'Periods': h5.root.Periods[:],
+            'Latitude': h5.root.Latitude[site_slice],
+            'Longitude': h5.root.Longitude[site_slice],
+            'Vs30': h5.root.Vs30[site_slice],
+            'SiteID': h5.root.SiteID[site_slice],
+            'Magnitude': h5.root.Magnitude[scen_slice],
+            'MeanAnnualRate': h5.root.MeanAnnualRate[scen_slice],
+            'lnSa': h5.root.lnSa[scen_slice, site_slice]
+        }
+    # string IDs are saved as UTF-8 bytes
+    if im_data['SiteID'].dtype.kind == 'S':
+        im_data['SiteID'] = np.char.decode(im_data['SiteID'], 'utf-8')
+    # return
+    return im_data
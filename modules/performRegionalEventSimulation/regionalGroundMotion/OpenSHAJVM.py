@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of the SimCenter Backend Applications
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# this file. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Kuanshi Zhong
+#
+
+import os
+
+# OpenSHA library
+OPENSHA_JAR = 'OpenSHA-1.5.2.jar'
+# Default maximum heap size of the JVM
+DEFAULT_MAX_HEAP = '8G'
+# Smallest heap size (MB) given to the JVM of a worker (see get_worker_heap)
+MIN_WORKER_HEAP_MB = 1024
+# Settings of the JVM (see set_max_heap)
+jvm_config = {'MaxHeap': None}
+
+
+def set_max_heap(max_heap):
+    """
+    Setting the maximum heap size of the JVM (e.g., '4G'); it only has an
+    effect if the JVM has not been started yet
+    """
+    jvm_config['MaxHeap'] = max_heap
+
+
+def get_max_heap():
+    """
+    Getting the maximum heap size of the JVM from set_max_heap, the
+    OPENSHA_JVM_HEAP environment variable, or DEFAULT_MAX_HEAP (in this order)
+    """
+    return jvm_config['MaxHeap'] or os.environ.get('OPENSHA_JVM_HEAP', DEFAULT_MAX_HEAP)
+
+
+def get_worker_heap(num_workers):
+    """
+    Splitting the maximum heap size among the JVMs of the worker processes
+    Input:
+        num_workers: number of worker processes
+    Output:
+        worker_heap: heap size of a worker (e.g., '2048m'; not less than
+                     MIN_WORKER_HEAP_MB)
+    """
+    max_heap = str(get_max_heap()).strip().lower()
+    units = {'k': 1.0 / 1024.0, 'm': 1.0, 'g': 1024.0, 't': 1024.0 ** 2}
+    if max_heap[-1] in units:
+        heap_mb = float(max_heap[:-1]) * units[max_heap[-1]]
+    else:
+        # bytes
+        heap_mb = float(max_heap) / 1024.0 ** 2
+    worker_mb = max(int(heap_mb // max(num_workers, 1)), MIN_WORKER_HEAP_MB)
+    # return
+    return '{}m'.format(worker_mb)
+
+
+def get_jar_path():
+    """
+    Getting the path of the OpenSHA library (installed next to this file or
+    in the lib folder of the working directory)
+    """
+    jar_path = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'lib', OPENSHA_JAR)
+    if not os.path.exists(jar_path):
+        jar_path = os.path.join('.', 'lib', OPENSHA_JAR)
+    # return
+    return jar_path
+
+
+def start_jvm():
+    """
+    Starting the JVM with the OpenSHA library (once per process)
+    Output:
+        started: True if the JVM was started by this call
+    Note:
+        The maximum heap size is taken from get_max_heap.
+    """
+    import jpype
+    import jpype.imports
+    if jpype.isJVMStarted():
+        return False
+    max_heap = get_max_heap()
+    jpype.addClassPath(get_jar_path())
+    jpype.startJVM('-Xmx{}'.format(max_heap), convertStrings = False)
+    print('OpenSHAJVM: JVM started (maximum heap {}).'.format(max_heap))
+    # return
+    return True
+
+
+def load_opensha():
+    """
+    Loading the FetchOpenSHA module; the JVM is started at the first call
+    Output:
+        FetchOpenSHA: the module with the ERF and GMPE functions
+    """
+    start_jvm()
+    import FetchOpenSHA
+    # return
+    return FetchOpenSHA
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of the SimCenter Backend Applications
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# this file. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Kuanshi Zhong
+#
+
+import numpy as np
+
+# Coefficients of the ground motion proxy (see get_im_proxy)
+PROXY_MAG_SCALING = 1.0
+PROXY_DIST_SCALING = 1.3
+PROXY_NEAR_SOURCE = 6.0
+
+
+def get_im_proxy(magnitude, distance):
+    """
+    Computing a simple ln ground motion proxy of ruptures at sites
+    Input:
+        magnitude: magnitudes of the ruptures
+        distance: rupture distances (km)
+    Output:
+        ln_im: ln proxy (same shape as distance)
+    Note:
+        Only the relative values matter: the proxy ranks and groups the
+        ruptures, it is not a ground motion model.
+    """
+    ln_im = PROXY_MAG_SCALING * (np.asarray(magnitude) - 6.0) - \
+        PROXY_DIST_SCALING * np.log(np.sqrt(np.asarray(distance) ** 2 + PROXY_NEAR_SOURCE ** 2))
+    # return
+    return ln_im
+
+
+def get_importance_weights(magnitude, rate, distance, im_power = 1.0):
+    """
+    Computing the importance weights of candidate ruptures
+    Input:
+        magnitude: magnitudes of the ruptures
+        rate: mean annual rates of the ruptures
+        distance: distances (km) from the ruptures to the asset centroid
+        im_power: exponent of the ground motion proxy (0 for rate only)
+    Output:
+        weights: normalized weights (rate x proxy ** im_power)
+    """
+    ln_w = np.log(np.maximum(rate, 1e-300)) + im_power * get_im_proxy(magnitude, distance)
+    weights = np.exp(ln_w - np.max(ln_w))
+    weights = weights / np.sum(weights)
+    # return
+    return weights
+
+
+def allocate_samples(stratum_weights, num_samples):
+    """
+    Allocating samples to strata in proportion to their weights
+    Output:
+        num_alloc: number of samples of every stratum (at least one for each
+                   stratum if num_samples allows it)
+    """
+    num_strata = len(stratum_weights)
+    if num_samples >= num_strata:
+        num_alloc = np.ones(num_strata, dtype = int)
+        num_left = num_samples - num_strata
+    else:
+        num_alloc = np.zeros(num_strata, dtype = int)
+        num_left = num_samples
+    # Largest remainder method
+    share = stratum_weights / np.sum(stratum_weights) * num_left
+    num_alloc = num_alloc + np.floor(share).astype(int)
+    remainder = share - np.floor(share)
+    num_extra = num_samples - np.sum(num_alloc)
+    num_alloc[np.argsort(-remainder, kind = 'stable')[:num_extra]] += 1
+    # return
+    return num_alloc
+
+
+def stratified_sampling(magnitude, rate, distance, num_scenarios, num_mag_bins = 5,
+                        num_dist_bins = 3, im_power = 1.0, seed = None):
+    """
+    Selecting ruptures by stratified importance sampling
+    Input:
+        magnitude: magnitudes of the candidate ruptures
+        rate: mean annual rates of the candidate ruptures
+        distance: distances (km) from the candidates to the asset centroid
+        num_scenarios: number of draws
+        num_mag_bins: number of magnitude strata (equal widths)
+        num_dist_bins: number of distance strata (equal numbers of ruptures)
+        im_power: see get_importance_weights
+        seed: seed of the random draws
+    Output:
+        rup_ids: selected candidates
+        adjusted_rate: rates of the selected candidates
+    Note:
+        The draws of every stratum are taken with replacement in proportion
+        to the importance weights, and every draw is given the rate
+        rate x W / (n x w) (W: weight of the stratum, n: number of draws in
+        the stratum, w: weight of the rupture). The rates of repeated draws
+        are summed. Rate-weighted sums over the selected ruptures (e.g.,
+        exceedance rates of losses) are unbiased estimates of the sums over
+        all candidates.
+    """
+    magnitude = np.asarray(magnitude, dtype = float)
+    rate = np.asarray(rate, dtype = float)
+    distance = np.asarray(distance, dtype = float)
+    weights = get_importance_weights(magnitude, rate, distance, im_power)
+    # Strata
+    mag_edges = np.linspace(magnitude.min(), magnitude.max(), num_mag_bins + 1)[1:-1]
+    dist_edges = np.quantile(distance, np.linspace(0.0, 1.0, num_dist_bins + 1)[1:-1])
+    stratum = np.digitize(magnitude, mag_edges) * num_dist_bins + np.digitize(distance, dist_edges)
+    strata, stratum = np.unique(stratum, return_inverse = True)
+    stratum_weights = np.bincount(stratum, weights = weights, minlength = len(strata))
+    num_alloc = allocate_samples(stratum_weights, num_scenarios)
+    # Draws
+    rng = np.random.default_rng(seed)
+    adjusted_rate = np.zeros(len(rate))
+    for k in np.where(num_alloc > 0)[0]:
+        members = np.where(stratum == k)[0]
+        if stratum_weights[k] <= 0.0:
+            continue
+        p = weights[members] / stratum_weights[k]
+        draws = members[rng.choice(len(members), size = num_alloc[k], p = p / np.sum(p))]
+        np.add.at(adjusted_rate, draws, rate[draws] * stratum_weights[k] /
+                  (num_alloc[k] * weights[draws]))
+    rup_ids = np.where(adjusted_rate > 0.0)[0]
+    # return
+    return rup_ids, adjusted_rate[rup_ids]
+
+
+def kmedoids_reduction(features, rate, num_scenarios, max_iter = 100, seed = None):
+    """
+    Selecting ruptures by k-medoids clustering of site ground motion vectors
+    Input:
+        features: ln ground motion vectors of the candidates (candidates x sites)
+        rate: mean annual rates of the candidates
+        num_scenarios: number of clusters
+        max_iter: maximum number of iterations
+        seed: seed of the initialization
+    Output:
+        rup_ids: selected candidates (medoids)
+        adjusted_rate: total rate of the cluster of every medoid
+    Note:
+        The distances between vectors are weighted by the rates of the
+        candidates, so that frequent ruptures are represented closely.
+    """
+    features = np.asarray(features, dtype = float)
+    rate = np.asarray(rate, dtype = float)
+    num_candidates = len(rate)
+    num_scenarios = min(num_scenarios, num_candidates)
+    rng = np.random.default_rng(seed)
+
+    def get_dist(ids):
+        # Euclidean distances from all candidates to the given candidates
+        return np.sqrt(np.maximum(np.sum(features ** 2, axis = 1)[:, np.newaxis] -
+                                  2.0 * features @ features[ids].T +
+                                  np.sum(features[ids] ** 2, axis = 1)[np.newaxis, :], 0.0))
+
+    # Initialization (k-means++ with the rates as weights)
+    medoids = [rng.choice(num_candidates, p = rate / np.sum(rate))]
+    min_dist = get_dist(medoids)[:, 0]
+    for k in range(1, num_scenarios):
+        p = rate * min_dist ** 2
+        if np.sum(p) <= 0.0:
+            break
+        medoids.append(rng.choice(num_candidates, p = p / np.sum(p)))
+        min_dist = np.minimum(min_dist, get_dist(medoids[-1:])[:, 0])
+    medoids = np.array(medoids)
+    # Alternating assignment and medoid updates
+    for i in range(max_iter):
+        labels = np.argmin(get_dist(medoids), axis = 1)
+        new_medoids = medoids.copy()
+        for k in range(len(medoids)):
+            members = np.where(labels == k)[0]
+            if len(members) == 0:
+                continue
+            cost = rate[members] @ get_dist(members)[members]
+            new_medoids[k] = members[np.argmin(cost)]
+        if np.array_equal(new_medoids, medoids):
+            break
+        medoids = new_medoids
+    labels = np.argmin(get_dist(medoids), axis = 1)
+    adjusted_rate = np.bincount(labels, weights = rate, minlength = len(medoids))
+    # return
+    return medoids, adjusted_rate
+
+
+def reduce_scenarios(reduction_info, magnitude, rate, distance, features = None):
+    """
+    Reducing a set of candidate ruptures
+    Input:
+        reduction_info: 'Method' ('Stratified' or 'KMedoids'), 'Number' (of
+                        scenarios), and optional 'Seed', 'MagnitudeBins',
+                        'DistanceBins', and 'ImportancePower'
+        magnitude: magnitudes of the candidates
+        rate: mean annual rates of the candidates
+        distance: distances (km) from the candidates to the asset centroid
+        features: ln ground motion vectors at the sites (KMedoids)
+    Output:
+        rup_ids: selected candidates
+        adjusted_rate: rates of the selected candidates
+    """
+    method = reduction_info.get('Method', 'Stratified')
+    num_scenarios = int(reduction_info.get('Number', 10))
+    seed = reduction_info.get('Seed', None)
+    if method == 'KMedoids':
+        if features is None:
+            features = get_im_proxy(magnitude, distance)[:, np.newaxis]
+        rup_ids, adjusted_rate = kmedoids_reduction(features, rate, num_scenarios, seed = seed)
+    else:
+        if method != 'Stratified':
+            print('ScenarioReduction: {} is not supported, using stratified sampling.'.format(method))
+        rup_ids, adjusted_rate = stratified_sampling(
+            magnitude, rate, distance, num_scenarios,
+            num_mag_bins = reduction_info.get('MagnitudeBins', 5),
+            num_dist_bins = reduction_info.get('DistanceBins', 3),
+            im_power = reduction_info.get('ImportancePower', 1.0), seed = seed)
+    print('ScenarioReduction: {} scenarios selected from {} ruptures (total rate {:.4g} of {:.4g}).'.format(
+        len(rup_ids), len(rate), np.sum(adjusted_rate), np.sum(rate)))
+    # return
+    return rup_ids, adjusted_rate
@@ -55,103 +55,212 @@ import numpy as np
 import pandas as pd
 import zipfile
 import csv
+from GMDatabase import load_gmdb, get_gmdb_spectra
 
 
-def select_ground_motion(target_period, target_ln_sa, gmdb_file, sf_max, sf_min,
-                         output_dir, output_file, stations):
+def find_best_records(target_sa, psa_db, sf_min, sf_max, index = None,
+                      num_candidates = 100, chunk_size = 500):
+    """
+    Finding the best matching record for each target spectrum
+    Input:
+        target_sa: target spectra (targets x periods)
+        psa_db: spectra of the records in the database (records x periods)
+        sf_min: minimum scaling factor
+        sf_max: maximum scaling factor
+        index: KD-tree of the normalized spectral shapes of the records
+               (optional, see get_spectral_shape); if provided, only the
+               num_candidates records with the most similar shapes are
+               checked for each target
+        num_candidates: number of candidate records checked with the index
+        chunk_size: number of targets processed at once
+    Output:
+        rec_idx: index of the selected record for each target
+        sf: scaling factor of the selected record for each target
+    Note:
+        The error of a record is the Euclidean distance between the target
+        and the scaled record spectra. The scaling factor that minimizes this
+        error is (x.y)/(x.x); because the error is quadratic in the scaling
+        factor, clamping it to [sf_min, sf_max] gives the optimal factor
+        within the bounds.
+    """
+    num_target = target_sa.shape[0]
+    rec_idx = np.zeros(num_target, dtype = int)
+    sf = np.zeros(num_target)
+    xx_db = np.sum(psa_db ** 2, axis = 1)
+    for c_start in range(0, num_target, chunk_size):
+        y = target_sa[c_start:c_start + chunk_size]
+        yy = np.sum(y ** 2, axis = 1)[:, np.newaxis]
+        if index is None:
+            # Checking all records
+            candidates = None
+            xy = np.matmul(y, psa_db.T)
+            xx = xx_db[np.newaxis, :]
+        else:
+            # Checking the records with the most similar spectral shapes
+            _, candidates = index.query(get_spectral_shape(y),
+                                        k = min(num_candidates, len(psa_db)))
+            candidates = candidates.reshape(len(y), -1)
+            xy = np.einsum('mp,mkp->mk', y, psa_db[candidates])
+            xx = xx_db[candidates]
+        # records with zero spectra over the target periods cannot be scaled
+        # to the target and are never selected
+        valid = xx > 0.0
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            cur_sf = np.where(valid, np.clip(xy / xx, sf_min, sf_max), sf_min)
+        err = np.where(valid, yy - 2.0 * cur_sf * xy + cur_sf ** 2 * xx, np.inf)
+        best = np.argmin(err, axis = 1)
+        rows = np.arange(len(y))
+        if candidates is None:
+            rec_idx[c_start:c_start + chunk_size] = best
+        else:
+            rec_idx[c_start:c_start + chunk_size] = candidates[rows, best]
+        sf[c_start:c_start + chunk_size] = cur_sf[rows, best]
+    # return
+    return rec_idx, sf
+
+
+def get_spectral_shape(sa):
+    """
+    Normalizing spectra by their geometric mean
+    Input:
+        sa: spectra (number of spectra x periods)
+    Output:
+        shape: log spectra minus their mean; scaling a spectrum does not
+               change its shape
+    """
+    ln_sa = np.log(np.maximum(sa, 1e-20))
+    shape = ln_sa - np.mean(ln_sa, axis = 1)[:, np.newaxis]
+    # return
+    return shape
+
+
+class GroundMotionSelector:
+    """
+    Selecting and saving ground motion records one scenario at a time
+    The database spectra and the (optional) spectral shape index are prepared
+    once; every scenario passed to select is saved to the site files right
+    away, and only the unique selected records are kept.
+    Input:
+        target_period: periods of the target spectra
+        gmdb_file: name of the ground motion database (e.g., 'NGAWest2')
+        sf_max, sf_min: bounds of the scaling factors
+        output_dir, output_file: directory and name of the event grid file
+        stations: list of stations
+        num_scenarios: number of scenarios (one folder per scenario if > 1)
+        use_index: flag of the spectral shape index (see find_best_records)
+        num_candidates: number of candidate records per target with the index
+    """
+
+    def __init__(self, target_period, gmdb_file, sf_max, sf_min, output_dir,
+                 output_file, stations, num_scenarios, use_index = False,
+                 num_candidates = 100):
 
-    # Loading gmdb
-    if gmdb_file == 'NGAWest2':
-        cwd = os.path.dirname(os.path.realpath(__file__))
-        gmdb = pd.read_csv(cwd+'/database/gmdb/NGAWest2.csv', header = 0, index_col = None)
-        # Parsing spectral data
-        num_gm = len(gmdb['RecId'])
-        tmp = gmdb.keys()[37:147]
-        T_db = [float(a.replace('T','').replace('S','')) for a in tmp]
-        psa_db = gmdb.iloc[:, 37:147]
-        pga = gmdb.iloc[:, 34]
-        pgv = gmdb.iloc[:, 35]
-        pgd = gmdb.iloc[:, 36]
-        # Scaling factors
-        sf_range = np.linspace(sf_min, sf_max, 100)
-        # Selected ground motion ID
-        gm_id = []
-        sf_data = []
-        filename = []
+        self.sf_max = sf_max
+        self.sf_min = sf_min
+        self.num_candidates = num_candidates
+        self.num_scenarios = num_scenarios
+        self.count = 0
+        # Selected records (unique ones of all scenarios)
+        self.gm_id = set()
+        self.filename = set()
+        # Loading gmdb (compiled at the first run - see GMDatabase)
+        self.gmdb = load_gmdb(gmdb_file)
+        if self.gmdb is None:
+            print('SelectGroundMotion: currently only supporting NGAWest2.')
+            return
         # Processing gmdb spectra (or PGA)
-        if (len(target_period) == 1) and (target_period[0] == 0.0):
-            psa_db_m = pga.values.tolist()
+        self.psa_db_m = get_gmdb_spectra(self.gmdb, target_period)
+        # Index of spectral shapes (optional)
+        if use_index and (self.psa_db_m.shape[1] > 1):
+            from scipy.spatial import cKDTree
+            self.index = cKDTree(get_spectral_shape(self.psa_db_m))
         else:
-            psa_db_m = [np.interp(target_period, T_db, psa_db.iloc[k, :]) for k in range(num_gm)]
-        tmp_scen = 0
-        # Looping over all scenarios
-        for cur_target in target_ln_sa:
-            tmp_scen = tmp_scen + 1
-            print('-Scenario #'+str(tmp_scen))
-            num_stations, num_periods, num_simu = cur_target.shape
-            tmp_id = np.zeros((num_stations, num_simu))
-            tmp_sf = np.zeros((num_stations, num_simu))
-            tmp_min_err = np.zeros((num_stations, num_simu))
-            tmp_filename = []
-            for i in range(num_simu):
-                print('--Realization #'+str(i+1))
-                for j in range(num_stations):
-                    #print('---Station #'+str(j+1))
-                    tmp_target = [cur_target[j, :, i] for k in range(num_gm)]
-                    min_err = 1000000.0
-                    for s in sf_range:
-                        if (num_periods == 1) and (target_period[0] == 0.0):
-                            err = np.abs(np.exp([x[0] for x in tmp_target]) - np.exp(np.log(s) + np.log(psa_db_m)))
-                        else:
-                            err = np.linalg.norm(np.exp(tmp_target) - np.exp(np.log(s) + np.log(psa_db_m)), axis = 1)
-                        if np.min(err) < min_err:
-                            min_err = np.min(err)
-                            tmp_tag = err.argmin()
-                            sf = s
-                    tmp_min_err[j, i] = min_err
-                    tmp_id[j, i] = int(gmdb['RecId'][tmp_tag])
-                    tmp_sf[j, i] = sf
-                    tmp_filename.append('RSN'+str(int(tmp_id[j,i]))+'_'+gmdb['FileNameHorizontal1'][tmp_tag].replace("\\","_").replace("/","_"))
-                    tmp_filename.append('RSN'+str(int(tmp_id[j,i]))+'_'+gmdb['FileNameHorizontal2'][tmp_tag].replace("\\","_").replace("/","_"))
-            # Collecting results in one scenario
-            gm_id.append(tmp_id)
-            sf_data.append(tmp_sf)
-            filename.extend(tmp_filename)
-            #print(tmp_min_err)
-    else:
-        print('SelectGroundMotion: currently only supporting NGAWest2.')
-        return 1
+            self.index = None
+        # Record IDs and file names
+        self.rec_id = np.array(self.gmdb['RecId'])
+        self.rec_file = [['RSN'+str(self.rec_id[k])+'_'+h1.replace("\\","_").replace("/","_"),
+                          'RSN'+str(self.rec_id[k])+'_'+h2.replace("\\","_").replace("/","_")]
+                         for k, (h1, h2) in enumerate(zip(self.gmdb['FileNameHorizontal1'],
+                                                           self.gmdb['FileNameHorizontal2']))]
+        # output data
+        self.station_name = ['site'+str(j)+'.csv' for j in range(len(stations))]
+        lat = [stations[j]['Latitude'] for j in range(len(stations))]
+        lon = [stations[j]['Longitude'] for j in range(len(stations))]
+        df = pd.DataFrame({
+            'GP_file': self.station_name,
+            'Longitude': lon,
+            'Latitude': lat
+        })
+        self.output_dir = os.path.join(os.path.dirname(Path(output_dir)),
+                                       os.path.basename(Path(output_dir)))
+        df.to_csv(os.path.join(self.output_dir, output_file), index = False)
 
-    # output data
-    station_name = ['site'+str(j)+'.csv' for j in range(len(stations))]
-    lat = [stations[j]['Latitude'] for j in range(len(stations))]
-    lon = [stations[j]['Longitude'] for j in range(len(stations))]
-    df = pd.DataFrame({
-        'GP_file': station_name,
-        'Longitude': lon,
-        'Latitude': lat
-    })
-    output_dir = os.path.join(os.path.dirname(Path(output_dir)),
-                              os.path.basename(Path(output_dir)))
-    df.to_csv(os.path.join(output_dir, output_file), index = False)
-    for cur_scen in range(len(gm_id)):
-        if len(gm_id) > 1:
-            cur_scen_folder = 'scenario'+str(cur_scen+1)
+    def select(self, cur_target):
+        """
+        Selecting and saving the records of the next scenario
+        Input:
+            cur_target: ln(Sa) of the scenario (stations x periods x realizations)
+        Output:
+            tmp_id: selected record IDs (stations x realizations)
+            tmp_sf: scaling factors (stations x realizations)
+        """
+        self.count = self.count + 1
+        print('-Scenario #'+str(self.count))
+        num_stations, num_periods, num_simu = cur_target.shape
+        # Targets ordered by realizations and then by stations
+        target_sa = np.exp(cur_target.transpose(2, 0, 1).reshape(-1, num_periods))
+        rec_idx, rec_sf = find_best_records(target_sa, self.psa_db_m, self.sf_min,
+                                            self.sf_max, self.index, self.num_candidates)
+        tmp_id = self.rec_id[rec_idx].reshape(num_simu, num_stations).T
+        tmp_sf = rec_sf.reshape(num_simu, num_stations).T
+        # Collecting the unique records
+        for k in np.unique(rec_idx):
+            self.gm_id.add(int(self.rec_id[k]))
+            self.filename.update(self.rec_file[k])
+        # Saving the scenario
+        if self.num_scenarios > 1:
+            cur_scen_folder = 'scenario'+str(self.count)
             try:
-                os.mkdir(os.path.join(output_dir, cur_scen_folder))
+                os.mkdir(os.path.join(self.output_dir, cur_scen_folder))
             except:
                 print('SelectGroundMotion: scenario folder already exists.')
-            cur_output_dir = os.path.join(output_dir, cur_scen_folder)
+            cur_output_dir = os.path.join(self.output_dir, cur_scen_folder)
         else:
-            cur_output_dir = output_dir
-        for i, site_id in enumerate(station_name):
-            gm_file = ['RSN'+str(int(j)) for j in gm_id[cur_scen][i]]
-            factor = [j for j in sf_data[cur_scen][i]]
+            cur_output_dir = self.output_dir
+        for i, site_id in enumerate(self.station_name):
+            gm_file = ['RSN'+str(int(j)) for j in tmp_id[i]]
+            factor = [j for j in tmp_sf[i]]
             df = pd.DataFrame({
                 'TH_file': gm_file,
                 'factor': factor
             })
             df.to_csv(os.path.join(cur_output_dir, site_id), index = False)
+        # return
+        return tmp_id, tmp_sf
+
+    def get_records(self):
+        """
+        Returning the sorted unique IDs and file names of the selected records
+        """
+        return sorted(self.gm_id), sorted(self.filename)
+
+
+def select_ground_motion(target_period, target_ln_sa, gmdb_file, sf_max, sf_min,
+                         output_dir, output_file, stations, use_index = False,
+                         num_candidates = 100):
+
+    selector = GroundMotionSelector(target_period, gmdb_file, sf_max, sf_min,
+                                    output_dir, output_file, stations,
+                                    len(target_ln_sa), use_index, num_candidates)
+    if selector.gmdb is None:
+        return 1
+    # Selected ground motion ID
+    gm_id = []
+    # Looping over all scenarios
+    for cur_target in target_ln_sa:
+        tmp_id, _ = selector.select(cur_target)
+        gm_id.append(tmp_id)
+    _, filename = selector.get_records()
     # return
     return gm_id, filename
 
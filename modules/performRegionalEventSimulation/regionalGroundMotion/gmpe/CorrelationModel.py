@@ -41,7 +41,21 @@
 import os
 import numpy as np
 import pandas as pd
-from scipy.interpolate import interp1d, interp2d
+from scipy.interpolate import interp1d, RegularGridInterpolator
+
+# Factors of spatial correlation matrices of the current station set
+# (cleared when the stations change) - see get_field_factor
+field_factors = {}
+# Maximum size of the saved factors in bytes (larger factors are not saved)
+FIELD_FACTOR_CACHE_BYTES = 2 ** 30
+
+
+def clear_field_factors():
+    """
+    Dropping the saved factors of the spatial correlation matrices
+    """
+    field_factors.clear()
+
 
 def baker_jayaram_correlation_2008(T1, T2, flag_orth = False):
     """
@@ -201,6 +215,178 @@ def jayaram_baker_correlation_2009(T, h, flag_clustering = False):
     return rho
 
 
+def get_distance_matrix(stations, stations_b = None):
+    """
+    Computing great-circle distances between stations
+    Input:
+        stations: stations coordinates (a list of dictionaries with
+                  'Latitude' and 'Longitude' in degrees)
+        stations_b: a second list of stations (optional, the distances
+                    between all pairs of stations are computed if not given)
+    Output:
+        stn_dist: distance matrix in km
+    Note:
+        The distances are computed by the haversine formula using a mean
+        Earth radius of 6371 km.
+    """
+    if stations_b is None:
+        stations_b = stations
+    stn_loc = np.radians(np.array([[s['Latitude'], s['Longitude']] for s in stations]))
+    stn_loc_b = np.radians(np.array([[s['Latitude'], s['Longitude']] for s in stations_b]))
+    lat = stn_loc[:, 0][:, np.newaxis]
+    lon = stn_loc[:, 1][:, np.newaxis]
+    lat_b = stn_loc_b[:, 0][np.newaxis, :]
+    lon_b = stn_loc_b[:, 1][np.newaxis, :]
+    a = np.sin((lat - lat_b) / 2.0) ** 2 + \
+        np.cos(lat) * np.cos(lat_b) * np.sin((lon - lon_b) / 2.0) ** 2
+    stn_dist = 2.0 * 6371.0 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    return stn_dist
+
+
+def get_correlation_factor(rho):
+    """
+    Computing a lower triangular factor L of a correlation matrix (rho = L L^T)
+    Input:
+        rho: correlation (or covariance) matrix
+    Output:
+        L: factor of the correlation matrix; correlated standard normal
+           samples are obtained by multiplying independent ones with L
+    Note:
+        Correlation matrices of closely spaced (or co-located) stations can be
+        singular; the factor is computed by eigendecomposition in that case
+        (and L is not triangular).
+    """
+    try:
+        L = np.linalg.cholesky(rho)
+    except np.linalg.LinAlgError:
+        eig_val, eig_vec = np.linalg.eigh(rho)
+        L = eig_vec * np.sqrt(np.maximum(eig_val, 0.0))
+    return L
+
+
+def get_field_factor(stations, practical_range, sampler_info = None):
+    """
+    Computing the factor of an exponential spatial correlation model
+    rho(h) = exp(-3 h / practical_range)
+    Input:
+        stations: stations coordinates
+        practical_range: practical range of the correlation in km
+        sampler_info: sampling method (optional), a dictionary with
+            'Type': 'Dense' (default) - Cholesky factor of the full
+                    correlation matrix, exact but cubic in the number of
+                    stations
+                    'LowRank' - Nystrom approximation using a subset of the
+                    stations as landmarks; the variance that the landmarks do
+                    not capture is added as independent noise, so the
+                    marginal variances are exact
+            'Rank': number of landmark stations for 'LowRank' (default: 1000)
+            'Diagnostics': print the accuracy of the 'LowRank' approximation
+                           (default: True, see get_field_factor_diagnostics)
+    Output:
+        F: factor of the correlation matrix (stations x rank)
+        d: standard deviation of the independent noise (None for 'Dense')
+    Note:
+        Correlated standard normal fields are obtained as F Z1 + d Z2, where
+        Z1 and Z2 are independent standard normal samples. The factors of
+        the current station set are saved in field_factors (up to
+        FIELD_FACTOR_CACHE_BYTES) and reused by later calls; the saved
+        factors are dropped when the stations change (or by
+        clear_field_factors).
+    """
+    if sampler_info is None:
+        sampler_info = {}
+    sampler_type = sampler_info.get('Type', 'Dense')
+    num_stations = len(stations)
+    rank = min(sampler_info.get('Rank', 1000), num_stations)
+
+    stn_key = np.array([[s['Latitude'], s['Longitude']] for s in stations]).tobytes()
+    if field_factors.get('Stations', None) != stn_key:
+        field_factors.clear()
+        field_factors['Stations'] = stn_key
+    factor_key = (sampler_type, rank, practical_range)
+    if factor_key in field_factors.keys():
+        return field_factors[factor_key]
+
+    if sampler_type == 'Dense':
+        rho = np.exp(-3.0 * get_distance_matrix(stations) / practical_range)
+        F = get_correlation_factor(rho)
+        d = None
+
+    elif sampler_type == 'LowRank':
+        # Landmark stations
+        landmarks = [stations[i] for i in
+                     np.sort(np.random.choice(num_stations, rank, replace = False))]
+        rho_mm = np.exp(-3.0 * get_distance_matrix(landmarks) / practical_range)
+        rho_nm = np.exp(-3.0 * get_distance_matrix(stations, landmarks) / practical_range)
+        # F F^T = rho_nm rho_mm^-1 rho_mn (small eigenvalues are dropped)
+        eig_val, eig_vec = np.linalg.eigh(rho_mm)
+        keep = eig_val > eig_val.max() * 1e-10
+        F = np.matmul(rho_nm, eig_vec[:, keep] / np.sqrt(eig_val[keep]))
+        d = np.sqrt(np.maximum(1.0 - np.sum(F ** 2, axis = 1), 0.0))
+        if sampler_info.get('Diagnostics', True):
+            diagnostics = get_field_factor_diagnostics(stations, practical_range, F, d)
+            print('CorrelationModel: low-rank sampler with range {0} km - max correlation '
+                  'error {1:.4f}, mean correlation error {2:.4f}, captured variance '
+                  '{3:.4f}'.format(practical_range, diagnostics['MaxError'],
+                  diagnostics['MeanError'], diagnostics['CapturedVariance']))
+
+    else:
+        raise ValueError('CorrelationModel: unknown sampler type {}'.format(sampler_type))
+
+    saved_bytes = sum([v[0].nbytes for k, v in field_factors.items() if k != 'Stations'])
+    if saved_bytes + F.nbytes <= FIELD_FACTOR_CACHE_BYTES:
+        field_factors[factor_key] = (F, d)
+    return F, d
+
+
+def get_field_factor_diagnostics(stations, practical_range, F, d, num_check = 200):
+    """
+    Checking the accuracy of an approximate correlation factor
+    Input:
+        stations: stations coordinates
+        practical_range: practical range of the correlation in km
+        F, d: factors from get_field_factor
+        num_check: number of stations used for the check
+    Output:
+        diagnostics: dictionary with the maximum and mean absolute errors in
+                     the correlation coefficients of a random subset of the
+                     stations and the mean fraction of the variance captured
+                     by F
+    """
+    check = np.sort(np.random.RandomState(0).choice(
+        len(stations), min(num_check, len(stations)), replace = False))
+    rho = np.exp(-3.0 * get_distance_matrix([stations[i] for i in check]) / practical_range)
+    rho_approx = np.matmul(F[check], F[check].T)
+    if d is not None:
+        rho_approx = rho_approx + np.diag(d[check] ** 2)
+    error = np.abs(rho_approx - rho)
+    diagnostics = {
+        'MaxError': float(np.max(error)),
+        'MeanError': float(np.mean(error)),
+        'CapturedVariance': float(np.mean(np.sum(F ** 2, axis = 1)))
+    }
+    return diagnostics
+
+
+def simulate_correlated_fields(stations, practical_range, num_fields, sampler_info = None):
+    """
+    Simulating standard normal fields with exponential spatial correlation
+    Input:
+        stations: stations coordinates
+        practical_range: practical range of the correlation in km
+        num_fields: number of independent fields
+        sampler_info: sampling method (see get_field_factor)
+    Output:
+        fields: simulated fields (stations x num_fields)
+    """
+    F, d = get_field_factor(stations, practical_range, sampler_info)
+    fields = np.matmul(F, np.random.standard_normal((F.shape[1], num_fields)))
+    if d is not None:
+        fields = fields + d[:, np.newaxis] * \
+            np.random.standard_normal((len(stations), num_fields))
+    return fields
+
+
 def load_loth_baker_correlation_2013(datapath):
     """
     Loading the three matrices in the Loth-Baker correaltion model (2013)
@@ -220,6 +406,26 @@ def load_loth_baker_correlation_2013(datapath):
     return B1, B2, B3
 
 
+def get_coefficients_loth_baker_correlation_2013(periods, B):
+    """
+    Interpolating a coregionalization matrix of the Loth-Baker correlation
+    model (2013) at the given periods
+    Input:
+        periods: Sa periods
+        B: coregionalization matrix
+    Output:
+        b: coregionalization matrix at the given periods
+    Note:
+        Periods outside of 0.01s ~ 10.0s are given the boundary values
+    """
+    model_periods = B['Period (s)'].values
+    f = RegularGridInterpolator((model_periods, model_periods), B.iloc[:, 1:].values)
+    T = np.clip(periods, model_periods.min(), model_periods.max())
+    T1, T2 = np.meshgrid(T, T, indexing = 'ij')
+    b = f((T2, T1))
+    return b
+
+
 def compute_rho_loth_baker_correlation_2013(T1, T2, h, B1, B2, B3):
     """
     Computing intra-event correlation coeffcieint between Sa(Ti) and Sa(Tj)
@@ -239,14 +445,10 @@ def compute_rho_loth_baker_correlation_2013(T1, T2, h, B1, B2, B3):
     Note:
         The valid range for T1 and T2 is 0.01s ~ 10.0s
     """
-    # Interpolation functions
-    f1 = interp2d(B1['Period (s)'], B1['Period (s)'], B1.iloc[:, 1:])
-    f2 = interp2d(B2['Period (s)'], B2['Period (s)'], B2.iloc[:, 1:])
-    f3 = interp2d(B3['Period (s)'], B3['Period (s)'], B3.iloc[:, 1:])
     # Three coefficients (T1, T2 < 0.01 would be given the boundary value)
-    b1 = f1(T1, T2)
-    b2 = f2(T1, T2)
-    b3 = f3(T1, T2)
+    b1 = get_coefficients_loth_baker_correlation_2013([T1, T2], B1)[0, 1]
+    b2 = get_coefficients_loth_baker_correlation_2013([T1, T2], B2)[0, 1]
+    b3 = get_coefficients_loth_baker_correlation_2013([T1, T2], B3)[0, 1]
     # Covariance functions
     Ch = b1 * np.exp(-3.0 * h / 20.0) + b2 * np.exp(-3.0 * h / 70.0) + b3 * (h == 0)
     # Correlation coefficient
@@ -254,7 +456,7 @@ def compute_rho_loth_baker_correlation_2013(T1, T2, h, B1, B2, B3):
     return rho
 
 
-def loth_baker_correlation_2013(stations, periods, num_simu):
+def loth_baker_correlation_2013(stations, periods, num_simu, sampler_info = None):
     """
     Simulating intra-event residuals
     Reference:
@@ -264,34 +466,33 @@ def loth_baker_correlation_2013(stations, periods, num_simu):
         stations: stations coordinates
         periods: simulated spectral periods
         num_simu: number of realizations
+        sampler_info: sampling method of the spatial fields (optional, see
+                      get_field_factor)
     Output:
         residuals: intra-event residuals
     Note:
         The valid range for T1 and T2 is 0.01s ~ 10.0s
+        The model is a linear model of coregionalization, so the residuals
+        are simulated as the sum of three independent sets of fields (short-
+        range, long-range, and nugget) that are correlated across periods by
+        the factors of the coregionalization matrices.
     """
     # Loading modeling coefficients
     B1, B2, B3 = load_loth_baker_correlation_2013(os.path.dirname(__file__) + '/data/')
-    # Computing distance matrix
     num_stations = len(stations)
-    stn_dist = np.zeros((num_stations, num_stations))
-    for i in range(num_stations):
-        loc_i = np.array([stations[i]['Latitude'],
-                          stations[i]['Longitude']])
-        for j in range(num_stations):
-            loc_j = np.array([stations[j]['Latitude'],
-                              stations[j]['Longitude']])
-            stn_dist[i, j] = np.linalg.norm(loc_i - loc_j) * 111.0
-    # Creating a covariance matrices for each of the principal components
     num_periods = len(periods)
-    covMatrix = np.zeros((num_stations * num_periods, num_stations * num_periods))
-    for i in range(num_periods):
-        for j in range(num_periods):
-            covMatrix[num_stations * i:num_stations * (i + 1), num_stations * j:num_stations * (j + 1)] = \
-                compute_rho_loth_baker_correlation_2013(periods[i], periods[j], stn_dist, B1, B2, B3)
-
-    mu = np.zeros(num_stations * num_periods)
-    residuals_raw = np.random.multivariate_normal(mu, covMatrix, num_simu).T
-    residuals = residuals_raw.reshape(num_simu, num_stations, num_periods).swapaxes(0,1).swapaxes(1,2)
+    # Simulating residuals
+    residuals = np.zeros((num_stations, num_periods, num_simu))
+    for B, practical_range in [(B1, 20.0), (B2, 70.0), (B3, None)]:
+        A = get_correlation_factor(get_coefficients_loth_baker_correlation_2013(periods, B))
+        if practical_range is None:
+            # nugget effect
+            fields = np.random.standard_normal((num_stations, num_periods * num_simu))
+        else:
+            fields = simulate_correlated_fields(stations, practical_range,
+                                                num_periods * num_simu, sampler_info)
+        fields = fields.reshape(num_stations, num_periods, num_simu)
+        residuals = residuals + np.einsum('pq,nqs->nps', A, fields)
     # return
     return residuals
 
@@ -319,7 +520,7 @@ def load_markhvida_ceferino_baker_correlation_2017(datapath):
     return MCB_model, MCB_pca, MCB_var
 
 
-def markhvida_ceferino_baker_correlation_2017(stations, periods, num_simu, num_pc):
+def markhvida_ceferino_baker_correlation_2017(stations, periods, num_simu, num_pc, sampler_info = None):
     """
     Simulating intra-event residuals
     Reference:
@@ -331,6 +532,8 @@ def markhvida_ceferino_baker_correlation_2017(stations, periods, num_simu, num_p
         periods: simulated spectral periods
         num_simu: number of realizations
         num_pc: number of principle components
+        sampler_info: sampling method of the spatial fields (optional, see
+                      get_field_factor)
     Output:
         residuals: intra-event residuals
     Note:
@@ -351,36 +554,23 @@ def markhvida_ceferino_baker_correlation_2017(stations, periods, num_simu, num_p
     a2 = a2[a2.keys()[1:]]
     model_periods = MCB_pca['Period (s)']
     model_coef = MCB_pca.iloc[:, 1:num_pc + 1]
-    # Computing distance matrix
     num_stations = len(stations)
-    stn_dist = np.zeros((num_stations, num_stations))
-    for i in range(num_stations):
-        loc_i = np.array([stations[i]['Latitude'],
-                          stations[i]['Longitude']])
-        for j in range(num_stations):
-            loc_j = np.array([stations[j]['Latitude'],
-                              stations[j]['Longitude']])
-            stn_dist[i, j] = np.linalg.norm(loc_i - loc_j) * 111.0
     # Scaling variance if less than 19 principal components are used
     c0 = c0 / MCB_var.iloc[0, num_pc - 1]
     c1 = c1 / MCB_var.iloc[0, num_pc - 1]
     c2 = c2 / MCB_var.iloc[0, num_pc - 1]
-    # Creating a covariance matrices for each of the principal components
-    covMatrix = np.zeros((num_stations, num_stations, num_pc))
-    for i in range(num_pc):
-        if c1.iloc[0, i] == 0:
-            # nug
-            covMatrix[:, :, i] = np.eye(num_stations) * c0.iloc[0, i]
-        else:
-            # iso nest
-            covMatrix[:, :, i] = c0.iloc[0, i] + \
-                                 c1.iloc[0, i] * np.exp(-3.0 * stn_dist) / a1.iloc[0, i] + \
-                                 c2.iloc[0, i] * np.exp(-3.0 * stn_dist) / a2.iloc[0, i]
-    # Simulating residuals
+    # Simulating residuals of each principal component from its nested
+    # model: nugget (c0), short-range (c1, a1), and long-range (c2, a2)
     residuals_pca = np.zeros((num_stations, num_simu, num_pc))
-    mu = np.zeros(num_stations)
     for i in range(num_pc):
-        residuals_pca[:, :, i] = np.random.multivariate_normal(mu, covMatrix[:, :, i], num_simu).T
+        residuals_pca[:, :, i] = np.sqrt(c0.iloc[0, i]) * \
+            np.random.standard_normal((num_stations, num_simu))
+        if c1.iloc[0, i] != 0:
+            residuals_pca[:, :, i] += np.sqrt(c1.iloc[0, i]) * \
+                simulate_correlated_fields(stations, a1.iloc[0, i], num_simu, sampler_info)
+        if c2.iloc[0, i] != 0:
+            residuals_pca[:, :, i] += np.sqrt(c2.iloc[0, i]) * \
+                simulate_correlated_fields(stations, a2.iloc[0, i], num_simu, sampler_info)
     # Interpolating model_coef by periods
     interp_fun = interp1d(model_periods, model_coef, axis = 0)
     model_Tmax = 5.0
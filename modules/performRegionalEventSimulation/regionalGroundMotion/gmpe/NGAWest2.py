@@ -0,0 +1,580 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of the SimCenter Backend Applications
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# this file. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Kuanshi Zhong
+#
+
+import os
+import numpy as np
+import pandas as pd
+
+# Coefficients used by the native models (the column names of the published
+# tables in data/<model>_coeff.csv)
+COEFF_NAMES = {
+    'ASK14': ['m1', 'vlin', 'b', 'c', 'c4', 'a1', 'a2', 'a3', 'a4', 'a5', 'a6',
+              'a7', 'a8', 'a10', 'a11', 'a12', 'a13', 'a15', 'a17', 'a43',
+              'a44', 'a45', 'a46', 's1e', 's2e', 's3', 's4', 's1m', 's2m'],
+    'BSSA14': ['e1', 'e2', 'e3', 'e4', 'e5', 'e6', 'Mh', 'c1', 'c2', 'c3', 'h',
+               'Dc3', 'c', 'Vc', 'f4', 'f5', 'f6', 'f7', 'R1', 'R2', 'DfR',
+               'DfV', 'phi1', 'phi2', 'tau1', 'tau2'],
+    'CB14': ['c0', 'c1', 'c2', 'c3', 'c4', 'c5', 'c6', 'c7', 'c8', 'c9', 'c10',
+             'c11', 'c14', 'c16', 'c17', 'c18', 'c19', 'c20', 'Dc20', 'a2',
+             'h1', 'h2', 'h3', 'h5', 'h6', 'k1', 'k2', 'k3', 'phi1', 'phi2',
+             'tau1', 'tau2', 'philnAF', 'rholny'],
+    'CY14': ['c1', 'c1a', 'c1b', 'c1c', 'c1d', 'cn', 'cm', 'c2', 'c3', 'c4',
+             'c4a', 'crb', 'c5', 'chm', 'c6', 'c7', 'c7b', 'c9', 'c9a', 'c9b',
+             'c11', 'c11b', 'cg1', 'cg2', 'cg3', 'phi1', 'phi2', 'phi3', 'phi4',
+             'phi5', 'phi6', 'tau1', 'tau2', 'sig1', 'sig2', 'sig3']
+}
+# Loaded coefficient tables - see load_coefficients
+coeff_tables = {}
+
+
+def load_coefficients(model, datapath = None):
+    """
+    Loading the coefficient table of a NGA-West2 model
+    Input:
+        model: 'ASK14', 'BSSA14', 'CB14', or 'CY14'
+        datapath: the path to the files (optional)
+    Output:
+        coeff: data frame of the coefficients (index: period, PGA = 0 and
+               PGV = -1; columns: coefficient names of the published table)
+    """
+    if datapath is None:
+        datapath = os.path.dirname(__file__) + '/data/'
+    if (model, datapath) in coeff_tables.keys():
+        return coeff_tables[(model, datapath)]
+    coeff = pd.read_csv(datapath + '{}_coeff.csv'.format(model), comment = '#',
+                        header = 0, index_col = 0)
+    missing = [x for x in COEFF_NAMES[model] if x not in coeff.columns]
+    if len(missing):
+        raise KeyError('NGAWest2: {}_coeff.csv does not have the coefficients {}.'.format(model, missing))
+    coeff_tables[(model, datapath)] = coeff
+    # return
+    return coeff
+
+
+def get_coefficients(model, periods):
+    """
+    Getting the coefficients of a NGA-West2 model at the given periods
+    Input:
+        model: name of the coefficient table (see load_coefficients)
+        periods: periods (0 for PGA and -1 for PGV)
+    Output:
+        c: dictionary of coefficient arrays (one value per period)
+    Note:
+        Sa periods between the tabulated ones are interpolated linearly in
+        ln(T); periods outside of the table are given the boundary values.
+    """
+    coeff = load_coefficients(model)
+    table_T = coeff.index.values.astype(float)
+    sa_tag = table_T > 0.0
+    sa_T = table_T[sa_tag]
+    sa_order = np.argsort(sa_T)
+    c = dict()
+    for name in COEFF_NAMES[model]:
+        values = coeff[name].values.astype(float)
+        cur_c = np.zeros(len(periods))
+        for i, T in enumerate(periods):
+            if T <= 0.0:
+                cur_c[i] = values[np.argmin(np.abs(table_T - T))]
+            else:
+                cur_c[i] = np.interp(np.log(T), np.log(sa_T[sa_order]), values[sa_tag][sa_order])
+        c[name] = cur_c
+    # return
+    return c
+
+
+def get_fault_type(rake, normal_range = (-150.0, -30.0), reverse_range = (30.0, 150.0)):
+    """
+    Getting the reverse and normal fault flags from the rake angle
+    Output:
+        f_rv, f_nm: 1.0 if reverse (normal) and 0.0 otherwise
+    """
+    f_rv = float(reverse_range[0] <= rake <= reverse_range[1])
+    f_nm = float(normal_range[0] <= rake <= normal_range[1])
+    # return
+    return f_rv, f_nm
+
+
+def boore_stewart_seyhan_atkinson_2014(periods, rupture, sites):
+    """
+    Computing the ln mean and standard deviations of BSSA14
+    Reference:
+        Boore, Stewart, Seyhan, and Atkinson (2014) NGA-West2 Equations for
+        Predicting PGA, PGV, and 5% Damped PSA for Shallow Crustal Earthquakes
+    Input:
+        periods: periods (0 for PGA and -1 for PGV)
+        rupture: dictionary of 'Magnitude' and 'Rake'
+        sites: dictionary of site arrays 'Rjb', 'Vs30', and 'Z1' (km, NaN if
+               unknown)
+    Output:
+        res: dictionary of 'Mean', 'TotalStdDev', 'InterEvStdDev', and
+             'IntraEvStdDev' (sites x periods)
+    Note:
+        California (global) coefficients; the unspecified fault type is
+        not used.
+    """
+    M = rupture['Magnitude']
+    f_rv, f_nm = get_fault_type(rupture['Rake'])
+    f_ss = 1.0 - f_rv - f_nm
+    rjb = sites['Rjb'][:, np.newaxis]
+    vs30 = sites['Vs30'][:, np.newaxis]
+    z1 = sites['Z1'][:, np.newaxis]
+    T = np.array(periods, dtype = float)
+
+    def ln_rock(c):
+        # Source and path terms
+        dM = M - c['Mh']
+        f_e = c['e1'] * f_ss + c['e2'] * f_nm + c['e3'] * f_rv + \
+            np.where(dM <= 0.0, c['e4'] * dM + c['e5'] * dM ** 2, c['e6'] * dM)
+        R = np.sqrt(rjb ** 2 + c['h'] ** 2)
+        # Mref = 4.5 and Rref = 1 km
+        f_p = (c['c1'] + c['c2'] * (M - 4.5)) * np.log(R) + (c['c3'] + c['Dc3']) * (R - 1.0)
+        return f_e + f_p
+
+    c = get_coefficients('BSSA14', T)
+    c_pga = get_coefficients('BSSA14', [0.0])
+    # Median PGA on the reference rock (Vs30 = 760 m/s)
+    pga_r = np.exp(ln_rock(c_pga))
+    # Site terms
+    # Vref = 760 m/s, f1 = 0, and f3 = 0.1 g
+    f_lin = c['c'] * np.log(np.minimum(vs30, c['Vc']) / 760.0)
+    f2 = c['f4'] * (np.exp(c['f5'] * (np.minimum(vs30, 760.0) - 360.0)) -
+                    np.exp(c['f5'] * (760.0 - 360.0)))
+    f_nl = f2 * np.log((pga_r + 0.1) / 0.1)
+    # Basin term (T >= 0.65 s)
+    mu_z1 = np.exp(-7.15 / 4.0 * np.log((vs30 ** 4 + 570.94 ** 4) /
+                                        (1360.0 ** 4 + 570.94 ** 4))) / 1000.0
+    dz1 = np.where(np.isnan(z1), 0.0, z1 - mu_z1)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        f_dz1 = np.where(dz1 <= c['f7'] / c['f6'], c['f6'] * dz1, c['f7'])
+    f_dz1 = np.where(T >= 0.65, f_dz1, 0.0)
+    mean = ln_rock(c) + f_lin + f_nl + f_dz1
+    # Standard deviations
+    w_M = np.clip(M - 4.5, 0.0, 1.0)
+    tau = c['tau1'] + (c['tau2'] - c['tau1']) * w_M
+    phi = c['phi1'] + (c['phi2'] - c['phi1']) * w_M
+    r1, r2 = c['R1'], c['R2']
+    phi = phi + c['DfR'] * np.clip(np.log(np.maximum(rjb, r1) / r1) / np.log(r2 / r1), 0.0, 1.0)
+    # V1 = 225 m/s and V2 = 300 m/s
+    phi = phi - c['DfV'] * np.clip(np.log(300.0 / np.minimum(vs30, 300.0)) / np.log(300.0 / 225.0), 0.0, 1.0)
+    tau = np.broadcast_to(tau, mean.shape)
+    res = {'Mean': mean,
+           'TotalStdDev': np.sqrt(tau ** 2 + phi ** 2),
+           'InterEvStdDev': np.array(tau),
+           'IntraEvStdDev': phi}
+    # return
+    return res
+
+
+def campbell_bozorgnia_2014(periods, rupture, sites):
+    """
+    Computing the ln mean and standard deviations of CB14
+    Reference:
+        Campbell and Bozorgnia (2014) NGA-West2 Ground Motion Model for the
+        Average Horizontal Components of PGA, PGV, and 5% Damped Linear
+        Acceleration Response Spectra
+    Input:
+        periods: periods (0 for PGA and -1 for PGV)
+        rupture: dictionary of 'Magnitude', 'Rake', 'Dip', 'Ztor', 'Width',
+                 and 'Zhyp' (NaN if unknown)
+        sites: dictionary of site arrays 'Rrup', 'Rjb', 'Rx', 'Vs30', and
+               'Z2p5' (km, NaN if unknown)
+    Output:
+        res: see boore_stewart_seyhan_atkinson_2014
+    Note:
+        California coefficients
+    """
+    M = rupture['Magnitude']
+    dip = rupture['Dip']
+    ztor = rupture['Ztor']
+    width = rupture['Width']
+    f_rv, f_nm = get_fault_type(rupture['Rake'])
+    # Hypocentral depth (the default of CB14 if unknown)
+    zhyp = rupture.get('Zhyp', np.nan)
+    if np.isnan(zhyp):
+        f_dz_M = -4.317 + 0.984 * M if M < 6.75 else 2.325
+        f_dz_dip = 0.0445 * (dip - 40.0) if dip <= 40.0 else 0.0
+        zbot = ztor + width * np.sin(np.radians(dip))
+        if zbot > ztor:
+            zhyp = ztor + np.exp(min(f_dz_M + f_dz_dip, np.log(0.9 * (zbot - ztor))))
+        else:
+            zhyp = ztor
+    rrup = sites['Rrup'][:, np.newaxis]
+    rjb = sites['Rjb'][:, np.newaxis]
+    rx = sites['Rx'][:, np.newaxis]
+    vs30 = sites['Vs30'][:, np.newaxis]
+    # Sediment depth (the default of CB14 if unknown)
+    z2p5 = sites['Z2p5'][:, np.newaxis]
+    z2p5 = np.where(np.isnan(z2p5), np.exp(7.089 - 1.144 * np.log(vs30)), z2p5)
+    T = np.array(periods, dtype = float)
+
+    def ln_median(c, vs30, z2p5, a1100 = None):
+        # Magnitude, distance, and style of faulting
+        f_mag = c['c0'] + c['c1'] * M + c['c2'] * max(M - 4.5, 0.0) + \
+            c['c3'] * max(M - 5.5, 0.0) + c['c4'] * max(M - 6.5, 0.0)
+        f_dis = (c['c5'] + c['c6'] * M) * np.log(np.sqrt(rrup ** 2 + c['c7'] ** 2))
+        f_flt = (c['c8'] * f_rv + c['c9'] * f_nm) * np.clip(M - 4.5, 0.0, 1.0)
+        # Hanging wall
+        r1 = width * np.cos(np.radians(dip))
+        r2 = 62.0 * M - 350.0
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            x1 = rx / r1
+            x2 = (rx - r1) / (r2 - r1)
+            # h4 = 1
+            f_hng_rx = np.where(rx < r1, c['h1'] + c['h2'] * x1 + c['h3'] * x1 ** 2,
+                                np.maximum(1.0 + c['h5'] * x2 + c['h6'] * x2 ** 2, 0.0))
+            f_hng_rrup = np.where(rrup > 0.0, (rrup - rjb) / rrup, 1.0)
+        f_hng_rx = np.where(rx < 0.0, 0.0, f_hng_rx)
+        if M <= 5.5:
+            f_hng_M = 0.0
+        elif M <= 6.5:
+            f_hng_M = (M - 5.5) * (1.0 + c['a2'] * (M - 6.5))
+        else:
+            f_hng_M = 1.0 + c['a2'] * (M - 6.5)
+        f_hng_z = 1.0 - 0.06 * ztor if ztor <= 16.66 else 0.0
+        f_hng_dip = (90.0 - dip) / 45.0
+        f_hng = c['c10'] * f_hng_rx * f_hng_rrup * f_hng_M * f_hng_z * f_hng_dip
+        # Shallow site response (linear for the reference rock)
+        k1, k2, n, cc = c['k1'], c['k2'], 1.18, 1.88
+        if a1100 is None:
+            f_site = (c['c11'] + k2 * n) * np.log(vs30 / k1)
+        else:
+            f_site = np.where(vs30 <= k1,
+                              c['c11'] * np.log(vs30 / k1) + k2 * (
+                                  np.log(a1100 + cc * (vs30 / k1) ** n) - np.log(a1100 + cc)),
+                              (c['c11'] + k2 * n) * np.log(vs30 / k1))
+        # Basin response
+        f_sed = np.where(z2p5 <= 1.0, c['c14'] * (z2p5 - 1.0),
+                         np.where(z2p5 <= 3.0, 0.0,
+                                  c['c16'] * c['k3'] * np.exp(-0.75) * (1.0 - np.exp(-0.25 * (z2p5 - 3.0)))))
+        # Hypocentral depth and dip
+        f_hyp_H = np.clip(zhyp - 7.0, 0.0, 13.0)
+        f_hyp_M = c['c17'] + (c['c18'] - c['c17']) * np.clip(M - 5.5, 0.0, 1.0)
+        f_hyp = f_hyp_H * f_hyp_M
+        f_dip = c['c19'] * dip * np.clip(5.5 - M, 0.0, 1.0)
+        # Anelastic attenuation
+        f_atn = (c['c20'] + c['Dc20']) * np.maximum(rrup - 80.0, 0.0)
+        return f_mag + f_dis + f_flt + f_hng + f_site + f_sed + f_hyp + f_dip + f_atn
+
+    c = get_coefficients('CB14', T)
+    c_pga = get_coefficients('CB14', [0.0])
+    # Median PGA on the reference rock (Vs30 = 1100 m/s)
+    vs_rock = np.full_like(vs30, 1100.0)
+    a1100 = np.exp(ln_median(c_pga, vs_rock, np.exp(7.089 - 1.144 * np.log(vs_rock))))
+    mean = ln_median(c, vs30, z2p5, a1100)
+    # Sa at periods shorter than 0.25 s is not less than PGA
+    ln_pga = ln_median(c_pga, vs30, z2p5, a1100)
+    mean = np.where((T > 0.0) & (T < 0.25), np.maximum(mean, ln_pga), mean)
+    # Standard deviations
+    def sigma_M(c):
+        w_M = np.clip(5.5 - M, 0.0, 1.0)
+        return c['tau2'] + (c['tau1'] - c['tau2']) * w_M, c['phi2'] + (c['phi1'] - c['phi2']) * w_M
+    tau_y, phi_y = sigma_M(c)
+    tau_pga, phi_pga = sigma_M(c_pga)
+    k1, k2, n, cc = c['k1'], c['k2'], 1.18, 1.88
+    alpha = np.where(vs30 < k1, k2 * a1100 * (1.0 / (a1100 + cc * (vs30 / k1) ** n) - 1.0 / (a1100 + cc)), 0.0)
+    rho = c['rholny']
+    phi_yb = np.sqrt(np.maximum(phi_y ** 2 - c['philnAF'] ** 2, 0.0))
+    phi_pgab = np.sqrt(np.maximum(phi_pga ** 2 - c_pga['philnAF'] ** 2, 0.0))
+    tau = np.sqrt(tau_y ** 2 + alpha ** 2 * tau_pga ** 2 + 2.0 * alpha * rho * tau_y * tau_pga)
+    phi = np.sqrt(phi_y ** 2 + alpha ** 2 * phi_pgab ** 2 + 2.0 * alpha * rho * phi_yb * phi_pgab)
+    res = {'Mean': mean,
+           'TotalStdDev': np.sqrt(tau ** 2 + phi ** 2),
+           'InterEvStdDev': tau,
+           'IntraEvStdDev': phi}
+    # return
+    return res
+
+
+def abrahamson_silva_kamai_2014(periods, rupture, sites):
+    """
+    Computing the ln mean and standard deviations of ASK14
+    Reference:
+        Abrahamson, Silva, and Kamai (2014) Summary of the ASK14 Ground Motion
+        Relation for Active Crustal Regions
+    Input:
+        periods: periods (0 for PGA and -1 for PGV)
+        rupture: dictionary of 'Magnitude', 'Rake', 'Dip', 'Ztor', and 'Width'
+        sites: dictionary of site arrays 'Rrup', 'Rjb', 'Rx', 'Ry0' (NaN if
+               unknown), 'Vs30', 'Vs30Measured', and 'Z1' (km, NaN if
+               unknown)
+    Output:
+        res: see boore_stewart_seyhan_atkinson_2014
+    Note:
+        California coefficients of main shocks
+    """
+    M = rupture['Magnitude']
+    dip = rupture['Dip']
+    ztor = rupture['Ztor']
+    width = rupture['Width']
+    f_rv, f_nm = get_fault_type(rupture['Rake'])
+    rrup = sites['Rrup'][:, np.newaxis]
+    rjb = sites['Rjb'][:, np.newaxis]
+    rx = sites['Rx'][:, np.newaxis]
+    ry0 = sites['Ry0'][:, np.newaxis]
+    vs30 = sites['Vs30'][:, np.newaxis]
+    z1 = sites['Z1'][:, np.newaxis]
+    measured = sites['Vs30Measured'][:, np.newaxis]
+    T = np.array(periods, dtype = float)
+    c = get_coefficients('ASK14', T)
+    M1 = c['m1']
+    M2 = 5.0
+    a3, a4, a5, a7 = c['a3'], c['a4'], c['a5'], c['a7']
+    n = 1.5
+    # Magnitude and distance
+    if M > 5.0:
+        c4M = c['c4']
+    elif M > 4.0:
+        c4M = c['c4'] - (c['c4'] - 1.0) * (5.0 - M)
+    else:
+        c4M = np.ones(len(T))
+    R = np.sqrt(rrup ** 2 + c4M ** 2)
+    if M >= M2:
+        f1 = np.where(M > M1, c['a1'] + a5 * (M - M1), c['a1'] + a4 * (M - M1)) + \
+            c['a8'] * (8.5 - M) ** 2 + (c['a2'] + a3 * (M - M1)) * np.log(R)
+    else:
+        f1 = c['a1'] + a4 * (M2 - M1) + c['a8'] * (8.5 - M2) ** 2 + \
+            c['a6'] * (M - M2) + a7 * (M - M2) ** 2 + (c['a2'] + a3 * (M2 - M1)) * np.log(R)
+    f1 = f1 + c['a17'] * rrup
+    # Style of faulting
+    w_M = np.clip(M - 4.0, 0.0, 1.0)
+    f7 = c['a11'] * w_M * f_rv
+    f8 = c['a12'] * w_M * f_nm
+    # Hanging wall
+    r1 = width * np.cos(np.radians(dip))
+    r2 = 3.0 * r1
+    t1 = (90.0 - dip) / 45.0 if dip > 30.0 else 60.0 / 45.0
+    a2hw = 0.2
+    if M >= 6.5:
+        t2 = 1.0 + a2hw * (M - 6.5)
+    elif M > 5.5:
+        t2 = 1.0 + a2hw * (M - 6.5) - (1.0 - a2hw) * (M - 6.5) ** 2
+    else:
+        t2 = 0.0
+    if r1 > 0.0:
+        x1 = rx / r1
+        t3 = np.where(rx < r1, 0.25 + 1.5 * x1 - 0.75 * x1 ** 2,
+                      np.where(rx <= r2, 1.0 - (rx - r1) / (r2 - r1), 0.0))
+    else:
+        t3 = np.zeros_like(rx)
+    t4 = 1.0 - ztor ** 2 / 100.0 if ztor <= 10.0 else 0.0
+    ry1 = rx * np.tan(np.radians(20.0))
+    # (the taper in Rjb if Ry0 is unknown)
+    t5 = np.where(np.isnan(ry0), np.clip(1.0 - rjb / 30.0, 0.0, 1.0),
+                  np.clip(1.0 - (ry0 - ry1) / 5.0, 0.0, 1.0))
+    f4 = np.where(rx >= 0.0, c['a13'] * t1 * t2 * t3 * t4 * t5, 0.0)
+    # Depth to top of rupture
+    f6 = c['a15'] * min(ztor, 20.0) / 20.0
+    # Site response
+    v1 = np.where(T <= 0.5, 1500.0, np.where(T < 3.0, np.exp(-0.35 * np.log(np.maximum(T, 0.5) / 0.5) + np.log(1500.0)), 800.0))
+    vlin = c['vlin']
+    b = c['b']
+    cc = c['c']
+    # Sa on the reference rock (Vs30 = 1180 m/s, linear site response)
+    ln_sa1180 = f1 + f7 + f8 + f4 + f6 + (c['a10'] + b * n) * np.log(np.minimum(1180.0, v1) / vlin)
+    sa1180 = np.exp(ln_sa1180)
+    vs_star = np.minimum(vs30, v1)
+    f5 = np.where(vs30 >= vlin, (c['a10'] + b * n) * np.log(vs_star / vlin),
+                  c['a10'] * np.log(vs_star / vlin) - b * np.log(sa1180 + cc) +
+                  b * np.log(sa1180 + cc * (vs_star / vlin) ** n))
+    # Soil depth
+    z1_ref = np.exp(-7.67 / 4.0 * np.log((vs30 ** 4 + 610.0 ** 4) / (1360.0 ** 4 + 610.0 ** 4))) / 1000.0
+    z1 = np.where(np.isnan(z1), z1_ref, z1)
+    a_z1 = np.zeros(vs30.shape + T.shape)
+    for k in range(len(T)):
+        a_z1[:, k] = np.interp(vs30[:, 0], [150.0, 250.0, 400.0, 700.0],
+                               [c['a43'][k], c['a44'][k], c['a45'][k], c['a46'][k]])
+    f10 = a_z1 * np.log((z1 + 0.01) / (z1_ref + 0.01))
+    mean = f1 + f7 + f8 + f5 + f4 + f6 + f10
+    # Standard deviations
+    s1 = np.where(measured, c['s1m'], c['s1e'])
+    s2 = np.where(measured, c['s2m'], c['s2e'])
+    phi_al = s1 + (s2 - s1) / 2.0 * np.clip(M - 4.0, 0.0, 2.0)
+    tau_al = c['s3'] + (c['s4'] - c['s3']) / 2.0 * np.clip(M - 5.0, 0.0, 2.0)
+    phi_amp = np.minimum(0.4, 0.99 * phi_al)
+    phi_b = np.sqrt(np.maximum(phi_al ** 2 - phi_amp ** 2, 0.0))
+    d_amp = np.where(vs30 >= vlin, 0.0, -b * sa1180 / (sa1180 + cc) +
+                     b * sa1180 / (sa1180 + cc * (vs30 / vlin) ** n))
+    phi = np.sqrt(phi_b ** 2 * (1.0 + d_amp) ** 2 + phi_amp ** 2)
+    tau = tau_al * (1.0 + d_amp)
+    res = {'Mean': mean,
+           'TotalStdDev': np.sqrt(tau ** 2 + phi ** 2),
+           'InterEvStdDev': tau,
+           'IntraEvStdDev': phi}
+    # return
+    return res
+
+
+def chiou_youngs_2014(periods, rupture, sites):
+    """
+    Computing the ln mean and standard deviations of CY14
+    Reference:
+        Chiou and Youngs (2014) Update of the Chiou and Youngs NGA Model for
+        the Average Horizontal Component of Peak Ground Motion and Response
+        Spectra
+    Input:
+        periods: periods (0 for PGA and -1 for PGV)
+        rupture: dictionary of 'Magnitude', 'Rake', 'Dip', and 'Ztor'
+        sites: dictionary of site arrays 'Rrup', 'Rjb', 'Rx', 'Vs30',
+               'Vs30Measured', and 'Z1' (km, NaN if unknown)
+    Output:
+        res: see boore_stewart_seyhan_atkinson_2014
+    Note:
+        California coefficients; the directivity term is not included
+        (i.e., the centered DPP is zero).
+    """
+    M = rupture['Magnitude']
+    dip = np.radians(rupture['Dip'])
+    ztor = rupture['Ztor']
+    f_rv, f_nm = get_fault_type(rupture['Rake'], normal_range = (-120.0, -60.0))
+    rrup = sites['Rrup'][:, np.newaxis]
+    rjb = sites['Rjb'][:, np.newaxis]
+    rx = sites['Rx'][:, np.newaxis]
+    vs30 = sites['Vs30'][:, np.newaxis]
+    z1 = sites['Z1'][:, np.newaxis]
+    measured = sites['Vs30Measured'][:, np.newaxis]
+    T = np.array(periods, dtype = float)
+    c = get_coefficients('CY14', T)
+    c2, c4, c4a, crb, c11 = c['c2'], c['c4'], c['c4a'], c['crb'], c['c11']
+    # Reference rock (Vs30 = 1130 m/s)
+    cosh_M = np.cosh(2.0 * max(M - 4.5, 0.0))
+    if f_rv:
+        ztor_mean = max(2.704 - 1.226 * max(M - 5.849, 0.0), 0.0) ** 2
+    else:
+        ztor_mean = max(2.673 - 1.136 * max(M - 4.970, 0.0), 0.0) ** 2
+    ln_yref = c['c1'] + (c['c1a'] + c['c1c'] / cosh_M) * f_rv + \
+        (c['c1b'] + c['c1d'] / cosh_M) * f_nm + \
+        (c['c7'] + c['c7b'] / cosh_M) * (ztor - ztor_mean) + \
+        (c11 + c['c11b'] / cosh_M) * np.cos(dip) ** 2 + \
+        c2 * (M - 6.0) + (c2 - c['c3']) / c['cn'] * np.log(1.0 + np.exp(c['cn'] * (c['cm'] - M))) + \
+        c4 * np.log(rrup + c['c5'] * np.cosh(c['c6'] * np.maximum(M - c['chm'], 0.0))) + \
+        (c4a - c4) * np.log(np.sqrt(rrup ** 2 + crb ** 2)) + \
+        (c['cg1'] + c['cg2'] / np.cosh(np.maximum(M - c['cg3'], 0.0))) * rrup + \
+        c['c9'] * (rx >= 0.0) * np.cos(dip) * \
+        (c['c9a'] + (1.0 - c['c9a']) * np.tanh(rx / c['c9b'])) * \
+        (1.0 - np.sqrt(rjb ** 2 + ztor ** 2) / (rrup + 1.0))
+    y_ref = np.exp(ln_yref)
+    # Site response
+    vs_1130 = np.minimum(vs30, 1130.0)
+    b_nl = c['phi2'] * (np.exp(c['phi3'] * (vs_1130 - 360.0)) - np.exp(c['phi3'] * (1130.0 - 360.0)))
+    z1_mean = np.exp(-7.15 / 4.0 * np.log((vs30 ** 4 + 571.0 ** 4) / (1360.0 ** 4 + 571.0 ** 4)))
+    dz1 = np.where(np.isnan(z1), 0.0, z1 * 1000.0 - z1_mean)
+    mean = ln_yref + c['phi1'] * np.minimum(np.log(vs30 / 1130.0), 0.0) + \
+        b_nl * np.log((y_ref + c['phi4']) / c['phi4']) + \
+        c['phi5'] * (1.0 - np.exp(-dz1 / c['phi6']))
+    # Standard deviations
+    nl0 = b_nl * y_ref / (y_ref + c['phi4'])
+    w_M = np.clip(M, 5.0, 6.5) - 5.0
+    tau = (c['tau1'] + (c['tau2'] - c['tau1']) / 1.5 * w_M) * (1.0 + nl0)
+    phi = (c['sig1'] + (c['sig2'] - c['sig1']) / 1.5 * w_M) * \
+        np.sqrt(np.where(measured, 0.7, c['sig3']) + (1.0 + nl0) ** 2)
+    res = {'Mean': mean,
+           'TotalStdDev': np.sqrt(tau ** 2 + phi ** 2),
+           'InterEvStdDev': tau,
+           'IntraEvStdDev': phi}
+    # return
+    return res
+
+
+# Native models and the names of the OpenSHA models they replace
+GMPE_MODELS = {
+    'Abrahamson, Silva & Kamai (2014)': abrahamson_silva_kamai_2014,
+    'Boore, Stewart, Seyhan & Atkinson (2014)': boore_stewart_seyhan_atkinson_2014,
+    'Campbell & Bozorgnia (2014)': campbell_bozorgnia_2014,
+    'Chiou & Youngs (2014)': chiou_youngs_2014
+}
+
+
+def compute_gmpe(gmpe_name, im_info, rupture, sites):
+    """
+    Computing the ln mean and standard deviations of the intensity measures
+    at all sites for a rupture (see FetchOpenSHA.IMRSession.compute)
+    Input:
+        gmpe_name: name of the model (see GMPE_MODELS)
+        im_info: intensity measure information ('Type' and 'Periods')
+        rupture: rupture properties
+        sites: site properties and distances
+    Output:
+        res: dictionary of the results (e.g., res['lnSA']['Mean'] is a
+             sites x periods array)
+        cur_T: periods
+    """
+    gmpe = GMPE_MODELS[gmpe_name]
+    cur_T = im_info.get('Periods', None)
+    res = dict()
+    if 'SA' in im_info['Type']:
+        res['lnSA'] = gmpe([float(Tj) for Tj in cur_T], rupture, sites)
+    if 'PGA' in im_info['Type']:
+        # for PGA current T = 0
+        cur_T = [0.00]
+        res['lnPGA'] = gmpe([0.0], rupture, sites)
+    if 'PGV' in im_info['Type']:
+        # for PGV current T = 0 (-1 in the coefficient tables)
+        cur_T = [0.00]
+        res['lnPGV'] = gmpe([-1.0], rupture, sites)
+    # return
+    return res, cur_T
+
+
+def check_against_table(gmpe_name, table):
+    """
+    Checking a native model against a table of reference results
+    Input:
+        gmpe_name: name of the model (see GMPE_MODELS)
+        table: data frame with the columns 'Period' (0 for PGA and -1 for
+               PGV), 'Magnitude', 'Rake', 'Dip', 'Ztor', 'Width', 'Zhyp',
+               'Rrup', 'Rjb', 'Rx', 'Ry0', 'Vs30', 'Vs30Measured', 'Z1',
+               'Z2p5', and the reference results 'Mean', 'TotalStdDev',
+               'InterEvStdDev', 'IntraEvStdDev' (NaN if not available), e.g.,
+               data/<model>_reference.csv
+    Output:
+        err: data frame of the absolute differences for each row
+    """
+    gmpe = GMPE_MODELS[gmpe_name]
+    err = pd.DataFrame(index = table.index, columns = ['Mean', 'TotalStdDev', 'InterEvStdDev', 'IntraEvStdDev'],
+                       dtype = float)
+    for i, row in table.iterrows():
+        rupture = {k: float(row[k]) for k in ['Magnitude', 'Rake', 'Dip', 'Ztor', 'Width', 'Zhyp']}
+        sites = {k: np.array([float(row[k])]) for k in ['Rrup', 'Rjb', 'Rx', 'Ry0', 'Vs30', 'Z1', 'Z2p5']}
+        sites['Vs30Measured'] = np.array([bool(row['Vs30Measured'])])
+        res = gmpe([float(row['Period'])], rupture, sites)
+        for k in err.columns:
+            err.loc[i, k] = abs(res[k][0, 0] - row[k])
+    # return
+    return err
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of the SimCenter Backend Applications
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# this file. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Kuanshi Zhong
+#
+
+import os
+import sys
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from gmpe import NGAWest2
+
+# Reference tables (data/<model>_reference.csv) of the native models
+REFERENCE_TABLES = {
+    'ASK14': 'Abrahamson, Silva & Kamai (2014)',
+    'BSSA14': 'Boore, Stewart, Seyhan & Atkinson (2014)',
+    'CB14': 'Campbell & Bozorgnia (2014)',
+    'CY14': 'Chiou & Youngs (2014)'
+}
+# Tolerance of the ln mean and standard deviations
+LN_TOLERANCE = 0.01
+
+
+@pytest.mark.parametrize('model', sorted(REFERENCE_TABLES.keys()))
+def test_against_reference_table(model):
+    table = pd.read_csv(os.path.join(os.path.dirname(__file__), 'data', '{}_reference.csv'.format(model)),
+                        comment = '#', header = 0)
+    err = NGAWest2.check_against_table(REFERENCE_TABLES[model], table)
+    # NaN: the reference does not list the value
+    assert (err.fillna(0.0).values <= LN_TOLERANCE).all(), err.max()
+
+
+def test_coefficient_names():
+    for model in REFERENCE_TABLES.keys():
+        coeff = NGAWest2.load_coefficients(model)
+        assert set(NGAWest2.COEFF_NAMES[model]).issubset(coeff.columns)
+        assert {0.0, -1.0}.issubset(coeff.index)
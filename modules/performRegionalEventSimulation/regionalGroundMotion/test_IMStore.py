@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of the SimCenter Backend Applications
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# this file. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Kuanshi Zhong
+#
+
+import os
+import sys
+import json
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+from CreateStation import create_stations
+from IMStore import IMWriter, read_im
+
+
+@pytest.mark.parametrize('ids', [['A1', 'B2', 'C3'], [3, 7, 11]])
+def test_site_ids_round_trip(tmp_path, ids):
+    input_file = str(tmp_path / 'stations.csv')
+    with open(input_file, 'w') as f:
+        f.write('ID,Longitude,Latitude,Vs30\n')
+        for i, stn_id in enumerate(ids):
+            f.write('{},{},{},{}\n'.format(stn_id, -122.0 - 0.1 * i, 37.5, 300.0 + 100.0 * i))
+    stations = create_stations(input_file, None, None, None)['Stations']
+    periods = [0.1, 1.0]
+    ln_psa = np.random.default_rng(0).normal(size = (len(ids), len(periods), 4))
+    file_path = str(tmp_path / 'SiteIM.h5')
+    with IMWriter(stations, periods, 1, 4, file_path) as writer:
+        writer.write(ln_psa, [7.0, 0.01])
+    im_data = read_im(file_path)
+    assert list(im_data['SiteID']) == ids
+    assert list(read_im(file_path, site_range = (1, 3))['SiteID']) == ids[1:]
+    np.testing.assert_allclose(im_data['lnSa'][0], ln_psa)
+
+
+def test_small_run_json(tmp_path):
+    stations = [{'ID': i, 'Longitude': -122.0, 'Latitude': 37.5 + 0.1 * i, 'Vs30': 400.0}
+                for i in range(3)]
+    periods = [0.1, 1.0]
+    rng = np.random.default_rng(1)
+    ln_psa = [rng.normal(size = (3, len(periods), 2)) for j in range(2)]
+    json_path = str(tmp_path / 'SiteIM.json')
+    with IMWriter(stations, periods, 2, 2, str(tmp_path / 'SiteIM.h5'),
+                  json_path = json_path) as writer:
+        # scenarios written out of order are saved in order
+        writer.write(ln_psa[1], [6.5, 0.02], scenario_id = 1)
+        writer.write(ln_psa[0], [7.0, 0.01], scenario_id = 0)
+    with open(json_path) as f:
+        res = json.load(f)
+    assert [x['Magnitdue'] for x in res['Earthquake_MAF']] == [7.0, 6.5]
+    assert res['Station_lnSa'][2]['Location']['Latitude'] == pytest.approx(37.7)
+    assert res['Station_lnSa'][2]['Vs30'] == 400
+    assert res['Station_lnSa'][2]['Periods'] == periods
+    np.testing.assert_allclose(res['Station_lnSa'][2]['lnSa'], [x[2] for x in ln_psa])
@@ -45,21 +45,49 @@ import json
 import copy
 import shutil
 import multiprocessing as mp
+from multiprocessing import shared_memory
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 from WindFieldSimulation import *
 
-def run_model(scen, p, t, path_perturb, feat_perturb, res_mp):
+# state of the storm realization workers (see init_storm_worker)
+storm_worker = {}
+
+def create_model(scen, p, t, terrain = None):
 
     model = LinearAnalyticalModel_SnaikiWu_2017(cyclone_param = p, storm_track = t)
-    if scen['Terrain']:
+    if terrain is not None:
+        # compiled terrain shared by all realizations
+        model.add_reference_terrain(terrain)
+    elif scen['Terrain']:
         model.add_reference_terrain(scen['Terrain'])
     model.set_cyclone_mesh(scen['StormMesh'])
     model.set_measure_height(scen['MeasureHeight'])
     model.define_track(scen['TrackSimu'])
-    model.add_stations(scen['StationList'])
-    delta_path = (np.random.rand(3) - 0.5) * path_perturb
-    delta_feat = np.array(p[3:6]) + (np.random.rand(3) - 0.5) * feat_perturb
+    model.add_stations(copy.deepcopy(scen['StationList']))
+    # return
+    return model
+
+def init_storm_worker(scen, p, t, path_perturb, feat_perturb, terrain, shm_name, shape):
+
+    # every worker sets up its model once and reuses it for all of its realizations
+    shm = shared_memory.SharedMemory(name = shm_name)
+    storm_worker.update({
+        'model': create_model(scen, p, t, terrain),
+        'param': p,
+        'path_perturb': path_perturb,
+        'feat_perturb': feat_perturb,
+        'shm': shm,
+        'pws': np.ndarray(shape, dtype = float, buffer = shm.buf)
+    })
+
+def run_model(k, seed, num_track_workers = 1):
+
+    model = storm_worker['model']
+    rng = np.random.default_rng(seed)
+    delta_path = (rng.random(3) - 0.5) * storm_worker['path_perturb']
+    delta_feat = np.array(storm_worker['param'][3:6]) + (rng.random(3) - 0.5) * storm_worker['feat_perturb']
     # this just an engineering judgement that the pressure difference, moving speed, and max-wind-speed radius
     # should not be less than 0.0 in the value.
     delta_feat[delta_feat < 0.0] = 0.0
@@ -67,25 +95,60 @@ def run_model(scen, p, t, path_perturb, feat_perturb, res_mp):
     print('dP, v, Rmax = ', delta_feat)
     model.set_delta_path(delta_path)
     model.set_delta_feat(delta_feat)
-    model.compute_wind_field()
-    res_mp.append(model.get_station_data())
+    model.compute_wind_field(num_workers = num_track_workers)
+    # stations x heights slice of the shared results
+    storm_worker['pws'][:, :, k] = model.station['PWS']['windspeed']
+
+def get_perturbation(event_info):
+
+    num_per_site = event_info['NumberPerSite']
+    if (num_per_site == 1):
+        path_perturb = np.zeros(3)
+        feat_perturb = np.zeros(3)
+    else:
+        if (len(event_info.get('Perturbation', [])) != 6): 
+            print('ComputeIntensityMeasure: Perturbation should have a size of 6.')
+            path_perturb = np.array([0.5, 0.5, 90.0])
+            feat_perturb = np.array([10.0, 10.0, 10.0])
+            print('ComputeIntensityMeasure: [1.0, 1.0, 90.0, 10.0, 10.0, 10.0] is used for perturbations.')
+        else:
+            path_perturb = np.array(event_info['Perturbation'][0:3])
+            feat_perturb = np.array(event_info['Perturbation'][3:6])
+    # return
+    return path_perturb, feat_perturb
+
+def get_realization_setup(event_info):
+
+    num_per_site = event_info['NumberPerSite']
+    # bounded number of workers (default: number of cpus)
+    num_workers = event_info.get('NumberOfWorkers', None)
+    if not num_workers:
+        num_workers = os.cpu_count() or 1
+    # a single realization shares its storm track steps among the workers
+    num_track_workers = max(1, int(num_workers)) if (num_per_site == 1) else 1
+    num_workers = max(1, min(int(num_workers), num_per_site))
+    # independent and reproducible random streams for the realizations
+    seeds = np.random.SeedSequence(event_info.get('Seed', 100)).spawn(num_per_site)
+    # return
+    return num_workers, num_track_workers, seeds
+
+def get_station_results(station, pws):
+
+    # one station dictionary per realization (stations x heights)
+    res = []
+    for k in range(pws.shape[2]):
+        station_res = copy.deepcopy(station)
+        station_res['PWS']['windspeed'] = pws[:, :, k]
+        res.append(station_res)
+    # return
+    return res
 
 def simulate_storm(scenarios, event_info, model_type):
 
     if (model_type == 'LinearAnalytical'):
         num_per_site = event_info['NumberPerSite']
-        if (num_per_site == 1):
-            path_perturb = np.zeros(3)
-            feat_perturb = np.zeros(3)
-        else:
-            if (len(event_info.get('Perturbation', [])) != 6): 
-                print('ComputeIntensityMeasure: Perturbation should have a size of 6.')
-                path_perturb = np.array([0.5, 0.5, 90.0])
-                feat_perturb = np.array([10.0, 10.0, 10.0])
-                print('ComputeIntensityMeasure: [1.0, 1.0, 90.0, 10.0, 10.0, 10.0] is used for perturbations.')
-            else:
-                path_perturb = np.array(event_info['Perturbation'][0:3])
-                feat_perturb = np.array(event_info['Perturbation'][3:6])
+        path_perturb, feat_perturb = get_perturbation(event_info)
+        num_workers, num_track_workers, seeds = get_realization_setup(event_info)
         for i in range(len(scenarios)):
             if (i == 1):
                 print('ComputeIntensityMeasure: currently supporting single scenario simulation only.')
@@ -93,23 +156,44 @@ def simulate_storm(scenarios, event_info, model_type):
             cur_scen = scenarios[i]
             param = cur_scen['CycloneParam']
             track = cur_scen['StormTrack']
-            np.random.seed(100)
-            # parallel
-            with mp.Manager() as manager:
-                res_mp = manager.list([])
-                proc_list = []
-                for k in range(num_per_site):
-                    proc = mp.Process(target = run_model,
-                        args = (cur_scen, param, track, path_perturb, feat_perturb, res_mp))
-                    proc_list.append(proc)
-                for k in range(num_per_site):
-                    proc = proc_list[k]
-                    proc.start()
-                for k in range(num_per_site):
-                    proc = proc_list[k]
-                    proc.join()
-                # extract data
-                res = [x for x in res_mp]
+            # compiling the terrain z0 lookup once for all realizations
+            terrain = TerrainRoughness(cur_scen['Terrain'], 
+                lookup = event_info.get('TerrainLookup', 'Index'), 
+                resolution = event_info.get('TerrainResolution', 0.01))
+            # station data shared by all realizations
+            model = create_model(cur_scen, param, track, terrain)
+            station = model.get_station_data()
+            station['PWS']['height'] = model.zp
+            shape = (len(station['Latitude']), len(model.zp), num_per_site)
+            if (num_track_workers > 1):
+                # single realization: parallel over the track steps of the model
+                print('ComputeIntensityMeasure: simulating 1 realization with {} workers.'.format(num_track_workers))
+                storm_worker.update({
+                    'model': model,
+                    'param': param,
+                    'path_perturb': path_perturb,
+                    'feat_perturb': feat_perturb,
+                    'pws': np.zeros(shape)
+                })
+                try:
+                    run_model(0, seeds[0], num_track_workers)
+                    res = get_station_results(station, storm_worker['pws'])
+                finally:
+                    storm_worker.clear()
+                continue
+            # parallel (stations x heights x realizations results in shared memory)
+            shm = shared_memory.SharedMemory(create = True, size = max(int(np.prod(shape)) * 8, 1))
+            try:
+                print('ComputeIntensityMeasure: simulating {} realizations with {} workers.'.format(num_per_site, num_workers))
+                with mp.Pool(processes = num_workers, initializer = init_storm_worker, 
+                    initargs = (cur_scen, param, track, path_perturb, feat_perturb, terrain, shm.name, shape)) as pool:
+                    pool.starmap(run_model, zip(range(num_per_site), seeds), chunksize = 1)
+                pws = np.ndarray(shape, dtype = float, buffer = shm.buf).copy()
+            finally:
+                shm.close()
+                shm.unlink()
+            # extract data
+            res = get_station_results(station, pws)
                 
     else:
         print('ComputeIntensityMeasure: currently only supporting LinearAnalytical model')
@@ -118,6 +202,15 @@ def simulate_storm(scenarios, event_info, model_type):
     return res
 
 
+def run_model_cpp(cmd, output_subdir):
+
+    subprocess.run(cmd, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    # stations x heights results of the realization
+    df = pd.read_csv(os.path.join(output_subdir, 'MaxWindSpeed.csv'), header = None, index_col = None)
+    # return
+    return df.values.astype(float)
+
+
 def simulate_storm_cpp(site_info, scenario_info, event_info, model_type, dir_info):
 
     if (model_type == 'LinearAnalytical'):
@@ -166,24 +259,12 @@ def simulate_storm_cpp(site_info, scenario_info, event_info, model_type, dir_inf
                 
         # configuring perturbation
         num_per_site = event_info['NumberPerSite']
-        if (num_per_site == 1):
-            path_perturb = np.zeros(3)
-            feat_perturb = np.zeros(3)
-        else:
-            if (len(event_info.get('Perturbation', [])) != 6): 
-                print('ComputeIntensityMeasure: Perturbation should have a size of 6.')
-                path_perturb = np.array([0.5, 0.5, 90.0])
-                feat_perturb = np.array([10.0, 10.0, 10.0])
-                print('ComputeIntensityMeasure: [1.0, 1.0, 90.0, 10.0, 10.0, 10.0] is used for perturbations.')
-            else:
-                path_perturb = np.array(event_info['Perturbation'][0:3])
-                feat_perturb = np.array(event_info['Perturbation'][3:6])
+        path_perturb, feat_perturb = get_perturbation(event_info)
+        num_workers, _, seeds = get_realization_setup(event_info)
         for i in range(int(scenario_info['Number'])):
             if (i == 1):
                 print('ComputeIntensityMeasure: currently supporting single scenario simulation only.')
                 return -1
-            np.random.seed(100)
-            res = []
             # parallel
             pert_list = []
             args_list = []
@@ -194,8 +275,9 @@ def simulate_storm_cpp(site_info, scenario_info, event_info, model_type, dir_inf
                 windsimu_bin = os.path.dirname(__file__) + '/WindFieldSimulation'
             ## preparing files
             for j in range(num_per_site):
-                delta_path = (np.random.rand(3) - 0.5) * path_perturb
-                delta_feat = (np.random.rand(3) - 0.5) * feat_perturb
+                rng = np.random.default_rng(seeds[j])
+                delta_path = (rng.random(3) - 0.5) * path_perturb
+                delta_feat = (rng.random(3) - 0.5) * feat_perturb
                 pert_dict = {
                     "dLatitude": delta_path[0],
                     "dLongitude": delta_path[1],
@@ -221,30 +303,30 @@ def simulate_storm_cpp(site_info, scenario_info, event_info, model_type, dir_inf
                 pert_list.append(abs_path_pert)
                 args_list.append(args)
                 odir_list.append(output_subdir)
-            ## running
-            procs_list = [subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) for cmd in args_list]
-            for proc in procs_list:
-                proc.wait()
+            ## running (at most num_workers binaries at a time)
+            print('ComputeIntensityMeasure: simulating {} realizations with {} workers.'.format(num_per_site, num_workers))
+            with ThreadPoolExecutor(max_workers = num_workers) as executor:
+                pws_list = list(executor.map(run_model_cpp, args_list, odir_list))
             ## loading output
+            station_res = {
+                'Latitude': [],
+                'Longitude': [],
+                'z0': [],
+                'PWS': {
+                    'height': [],
+                    'duration': 600.0,
+                    'windspeed': []
+                }
+            }
+            # station z0 and heights are identical in all realizations
+            df = pd.read_csv(os.path.join(odir_list[0], 'StationZ0.csv'), header = None, index_col = None)
+            station_res['z0'] = list(np.concatenate(df.values.tolist()).flat)
+            df = pd.read_csv(os.path.join(odir_list[0], 'MeasureHeight.csv'), header = None, index_col = None)
+            station_res['PWS']['height'] = df.values.tolist()[0]
+            # stations x heights x realizations
+            res = get_station_results(station_res, np.stack(pws_list, axis = 2))
             for j in range(num_per_site):
                 os.remove(pert_list[j])
-                station_res = {
-                    'Latitude': [],
-                    'Longitude': [],
-                    'z0': [],
-                    'PWS': {
-                        'height': [],
-                        'duration': 600.0,
-                        'windspeed': []
-                    }
-                }
-                df = pd.read_csv(os.path.join(os.path.abspath(odir_list[j]), 'StationZ0.csv'), header = None, index_col = None)
-                station_res['z0'] = list(np.concatenate(df.values.tolist()).flat)
-                df = pd.read_csv(os.path.join(os.path.abspath(odir_list[j]), 'MeasureHeight.csv'), header = None, index_col = None)
-                station_res['PWS']['height'] = df.values.tolist()[0]
-                df = pd.read_csv(os.path.join(os.path.abspath(odir_list[j]), 'MaxWindSpeed.csv'), header = None, index_col = None)
-                station_res['PWS']['windspeed'] = df.values.tolist()
-                res.append(station_res)
                 shutil.rmtree(odir_list[j])
         # house-keeping
         os.remove(abs_path_config)
@@ -38,68 +38,57 @@
 # Kuanshi Zhong
 #
 
+import os
+import sys
 import json
 import numpy as np
 import pandas as pd
+from pathlib import Path
 
+# import the shared station table (modules/common)
+this_dir = Path(os.path.dirname(os.path.abspath(__file__))).resolve()
+main_dir = this_dir.parents[1]
 
-def get_label(options, labels, label_name):
+sys.path.insert(0, str(main_dir / 'common'))
 
-	for option in options:
-		if option in labels:
-			labels = labels[labels != option]
-			return option, labels
+from StationTable import StationTable
 
-	print(f'WARNING: Could not identify the label for the {label_name}')
 
-
-def create_stations(input_file, output_file, min_id, max_id):
+def create_stations(input_file, output_file, min_id, max_id, vs30_default = None,
+                    derive_depths = False):
 	"""
     Reading input csv file for stations and saving data to output json file
     Input:
         input_file: the filename of the station csv file
-        output_file: the filename of the output json file
+        output_file: the filename of the output json file (or npz file for
+                     the binary station table)
         min_id: the min ID to start
         max_id: the max ID to end
+        vs30_default: Vs30 of the stations without Vs30 (optional)
+        derive_depths: estimating the missing z1.0 and z2.5 from Vs30
     Output:
-        run_tag: 0 - success, 1 - input failure, 2 - outupt failure
+        stn_file: {'Stations': StationTable} (0 if the input cannot be read)
     """
-	# Reading csv data
-	run_tag = 1
+	# Reading csv data (stations with min_id <= ID <= max_id)
 	try:
-		stn_df = pd.read_csv(input_file, header=0, index_col=0)
-	except:
+		stations = StationTable.from_csv(input_file, min_id, max_id)
+	except (OSError, ValueError) as e:
+		# missing or unreadable file, missing columns, or invalid ID range
+		print('CreateStation: cannot read the stations from {}: {}'.format(input_file, e))
 		run_tag = 0
 		return run_tag
-	# Max and Min IDs
-	stn_ids_min = np.min(stn_df.index.values)
-	stn_ids_max = np.max(stn_df.index.values)
-	if min_id is None:
-		min_id = stn_ids_min
-	if max_id is None:
-		max_id = stn_ids_max
-	min_id = np.max([stn_ids_min, min_id])
-	max_id = np.min([stn_ids_max, max_id])
-	selected_stn = stn_df.loc[min_id:max_id, :]
-	# Extracting data
-	labels = selected_stn.columns.values
-	lon_label, labels = get_label(['Longitude', 'longitude', 'lon', 'Lon'], labels, 'longitude')
-	lat_label, labels = get_label(['Latitude', 'latitude', 'lat', 'Lat'], labels, 'latitude')
+	# Site data
+	if (vs30_default is not None) or derive_depths:
+		stations.derive_site_params(vs30_default, derive_depths)
 	stn_file = {
-	    'Stations': []
+	    'Stations': stations
 	}
-	for stn_id, stn in selected_stn.iterrows():
-		# Collecting station data
-		tmp = {
-		    'ID': stn_id,
-			'Longitude': stn[lon_label],
-			'Latitude': stn[lat_label]
-		}
-		stn_file['Stations'].append(tmp)
 	# Saving data to the output file
 	if output_file:
-		with open(output_file, 'w') as f:
-			json.dump(stn_file, f, indent=2)
+		if output_file.endswith('.npz'):
+			stations.save(output_file)
+		else:
+			stations.to_json(output_file)
 	# Returning the final run state
 	return stn_file
 
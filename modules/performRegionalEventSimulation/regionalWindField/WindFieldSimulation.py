@@ -1,5 +1,102 @@
+import multiprocessing as mp
 import numpy as np
-from shapely.geometry import Point, Polygon
+from shapely import STRtree, points, total_bounds
+from shapely.geometry import Polygon
+
+class TerrainRoughness:
+
+    def __init__(self, terrain_info = [], lookup = 'Index', resolution = 0.01):
+        """
+        __init__: compiling the reference terrain polygons for z0 lookups
+        terrain_info: geojson formatted polygon and z0 data
+        lookup: 'Index' (exact point-in-polygon tests with an STRtree) or 
+        'Raster' (bilinear interpolation of a pre-rasterized z0 grid)
+        resolution: grid spacing of the raster (degree)
+        """
+        # default z0 values without reference terrain and outside the polygons
+        self.Z0_DEFAULT = 0.03
+        self.Z0_OUTSIDE = 0.01
+        # parsing polygons
+        self.poly = []
+        self.z0 = []
+        if terrain_info:
+            for p in terrain_info['features']:
+                if (p['geometry']['type'] == 'Polygon'):
+                    self.poly.append(Polygon(p['geometry']['coordinates']))
+                    self.z0.append(p['properties']['z0'])
+        self.num = len(self.poly)
+        self.lookup = lookup
+        self.resolution = resolution
+        self.tree = None
+        self.grid = None
+        if (self.num == 0):
+            return
+        # polygons are matched with (lat, lon) points, the last match prevails
+        self.tree = STRtree(self.poly)
+        self.poly_z0 = np.array(self.z0, dtype = float)
+        self.poly_z0[self.poly_z0 == 0] = self.Z0_OUTSIDE
+        if (lookup == 'Raster'):
+            self.__rasterize()
+        elif (lookup != 'Index'):
+            print('WindFieldSimulation: terrain lookup {} not supported, Index used.'.format(lookup))
+            self.lookup = 'Index'
+
+
+    def __query_index(self, lat, lon):
+        """
+        __query_index: finding the z0 values at (lat, lon) points with the STRtree
+        """
+        z0 = np.full(lat.shape, self.Z0_OUTSIDE)
+        pt_ids, poly_ids = self.tree.query(points(lat.ravel(), lon.ravel()), predicate = 'within')
+        # last matching polygon for every point
+        poly_last = np.full(lat.size, -1)
+        np.maximum.at(poly_last, pt_ids, poly_ids)
+        matched = poly_last >= 0
+        z0.ravel()[matched] = self.poly_z0[poly_last[matched]]
+        return z0
+
+
+    def __rasterize(self):
+        """
+        __rasterize: sampling the z0 values of the polygons on a regular grid
+        """
+        lat0, lon0, lat1, lon1 = total_bounds(self.poly)
+        self.grid_lat = np.arange(lat0 - self.resolution, lat1 + 2.0 * self.resolution, self.resolution)
+        self.grid_lon = np.arange(lon0 - self.resolution, lon1 + 2.0 * self.resolution, self.resolution)
+        LAT, LON = np.meshgrid(self.grid_lat, self.grid_lon, indexing = 'ij')
+        self.grid = self.__query_index(LAT, LON)
+        print('WindFieldSimulation: terrain rasterized ({} x {} grid).'.format(*self.grid.shape))
+
+
+    def __interp_grid(self, lat, lon):
+        """
+        __interp_grid: bilinear interpolation of the z0 grid at (lat, lon) points
+        """
+        x = (lat - self.grid_lat[0]) / self.resolution
+        y = (lon - self.grid_lon[0]) / self.resolution
+        inside = (x >= 0) & (x <= len(self.grid_lat) - 1) & (y >= 0) & (y <= len(self.grid_lon) - 1)
+        i = np.clip(np.floor(x).astype(int), 0, len(self.grid_lat) - 2)
+        j = np.clip(np.floor(y).astype(int), 0, len(self.grid_lon) - 2)
+        dx = np.clip(x - i, 0.0, 1.0)
+        dy = np.clip(y - j, 0.0, 1.0)
+        z0 = (self.grid[i, j] * (1.0 - dx) * (1.0 - dy) + self.grid[i + 1, j] * dx * (1.0 - dy) \
+            + self.grid[i, j + 1] * (1.0 - dx) * dy + self.grid[i + 1, j + 1] * dx * dy)
+        return np.where(inside, z0, self.Z0_OUTSIDE)
+
+
+    def get_z0(self, lat, lon):
+        """
+        get_z0: finding the z0 values at (lat, lon) points (arrays of any shape)
+        """
+        lat = np.asarray(lat, dtype = float)
+        lon = np.asarray(lon, dtype = float)
+        if (self.num == 0):
+            # no reference terrain provided, using default reference z0 = 0.03
+            return np.full(lat.shape, self.Z0_DEFAULT)
+        if (self.lookup == 'Raster'):
+            return self.__interp_grid(lat, lon)
+        return self.__query_index(lat, lon)
+
 
 class LinearAnalyticalModel_SnaikiWu_2017:
 
@@ -63,6 +160,7 @@ class LinearAnalyticalModel_SnaikiWu_2017:
         self.terrain_num = 0
         self.terrain_poly = []
         self.terrain_z0 = []
+        self.terrain = TerrainRoughness()
         self.delta_path = np.zeros(3)
         self.r = []
         self.theta = []
@@ -94,37 +192,20 @@ class LinearAnalyticalModel_SnaikiWu_2017:
             print('WindFieldSimulation: the delta_feat should have a size of 3, default delta_feat used.')
 
     
-    def __interp_z0(self, lat, lon):
+    def add_reference_terrain(self, terrain_info, lookup = 'Index', resolution = 0.01):
         """
-        __interp_z0: finding the z0 at (lat, lon) by interpolating reference terrain polygons
+        add_reference_terrain: specifying reference z0 values for a set of polygons
+        terrain_info: geojson formatted polygon and z0 data, or a compiled TerrainRoughness 
+        (which can be shared by multiple models)
+        lookup, resolution: see TerrainRoughness
         """
-        z0 = []
-        if (not self.terrain_z0):
-            # no reference terrain provided, using default reference z0 = 0.03
-            z0 = 0.03
+        if isinstance(terrain_info, TerrainRoughness):
+            self.terrain = terrain_info
         else:
-            pt = Point(lat, lon)
-            for p, z in zip(self.terrain_poly, self.terrain_z0):
-                if pt.within(p):
-                    z0 = z
-            if (not z0):
-                z0 = 0.01
-        # return
-        return z0
-
-
-    def add_reference_terrain(self, terrain_info):
-        """
-        add_reference_terrainL specifying reference z0 values for a set of polygons
-        terrain_info: geojson formatted polygon and z0 data
-        """
-        for p in terrain_info['features']:
-            if (p['geometry']['type'] == 'Polygon'):
-                # creating a new polygon
-                new_poly = Polygon(p['geometry']['coordinates'])
-                self.terrain_poly.append(new_poly)
-                self.terrain_z0.append(p['properties']['z0'])
-                self.terrain_num += 1
+            self.terrain = TerrainRoughness(terrain_info, lookup = lookup, resolution = resolution)
+        self.terrain_poly = self.terrain.poly
+        self.terrain_z0 = self.terrain.z0
+        self.terrain_num = self.terrain.num
 
     
     def set_cyclone_mesh(self, mesh_info):
@@ -218,7 +299,7 @@ class LinearAnalyticalModel_SnaikiWu_2017:
             self.station['Longitude'].append(lon)
             if (z0 == 0):
                 # interpolating z0 from terrain feature
-                self.station['z0'].append(self.__interp_z0(lat, lon))
+                self.station['z0'].append(float(self.terrain.get_z0(lat, lon)))
             else:
                 self.station['z0'].append(z0)
             # updating station number
@@ -242,9 +323,12 @@ class LinearAnalyticalModel_SnaikiWu_2017:
         self.beta_c[-1] = self.beta_c[-2]
 
     
-    def compute_wind_field(self):
+    def compute_wind_field(self, num_workers = 1):
         """
         compute_wind_field: computing the peak wind speed (10-min gust duraiton)
+        num_workers: number of processes sharing the track steps (default 1: serial),
+        every worker returns the station maxima of its chunk of steps which are then
+        reduced by an elementwise maximum (identical to the serial results)
         """
         print('WindFieldSimulation: running linear analytical model.')
         # checking if all parameters are defined
@@ -252,125 +336,133 @@ class LinearAnalyticalModel_SnaikiWu_2017:
         # calculating heading
         self.__calculate_heading()
 
+        num_steps = len(self.track_lat_m)
+        num_workers = max(1, min(int(num_workers), num_steps))
+        if (num_workers == 1):
+            station_umax = self.compute_track_steps(0, num_steps)
+        else:
+            # contiguous chunks of track steps (a few per worker for load balancing)
+            bounds = np.linspace(0, num_steps, min(4 * num_workers, num_steps) + 1).astype(int)
+            print('WindFieldSimulation: computing {} track steps with {} workers.'.format(num_steps, num_workers))
+            # every worker receives a copy of the model (with the same terrain index and mesh)
+            with mp.Pool(processes = num_workers, initializer = init_track_worker, initargs = (self,)) as pool:
+                station_umax = np.zeros((self.station_num, len(self.zp)))
+                for chunk_umax in pool.imap_unordered(run_track_steps, zip(bounds[:-1], bounds[1:])):
+                    station_umax = np.maximum(chunk_umax, station_umax)
+
+        # copying results
+        self.station['PWS']['height'] = self.zp
+        self.station['PWS']['windspeed'] = station_umax.tolist()
+        print('WindFieldSimulation: linear analytical simulation completed.')
+
+
+    def compute_track_steps(self, i0, i1):
+        """
+        compute_track_steps: computing the peak wind speed at the stations for the track steps i0 to i1 - 1
+        (the heading should have been calculated)
+        """
         # initializing matrices
-        station_lat = self.station['Latitude']
-        station_lon = self.station['Longitude']
+        station_lat = np.array(self.station['Latitude'])
+        station_lon = np.array(self.station['Longitude'])
         station_umax = np.zeros((len(station_lat), len(self.zp)))
-        u = np.zeros((len(self.theta), len(self.r), len(self.zp)))
-        v = np.zeros((len(self.theta), len(self.r), len(self.zp)))
-        vg1 = np.zeros((len(self.theta), len(self.r)))
-        z0 = np.zeros(len(self.r))
+        # polar mesh: theta x r (x zp)
+        theta = np.array(self.theta, dtype = float)[:, np.newaxis]
+        r = np.array(self.r, dtype = float)[np.newaxis, :]
+        zp = np.array(self.zp, dtype = float)[np.newaxis, np.newaxis, :]
+        THETA = np.where((theta >= 0) & (theta <= 90), 90.0 - theta, 450 - theta)
+        # configuring coefficients
+        z10 = 10.0
+        A = 11.4
+        kappa = 0.40
+        omega = 0.7292 * 1e-4
+        # pressure derivatives (independent of the storm location)
+        der_p = self.Holland_B * self.cyclone_radm ** self.Holland_B * self.cyclone_pres * (r ** (-self.Holland_B - 1)) \
+            * np.exp(-(self.cyclone_radm * r ** (-1.0)) ** self.Holland_B)
+        der_p_2 = (-(self.Holland_B + 1) * (r ** (-1.0)) + self.Holland_B * self.cyclone_radm ** self.Holland_B \
+            * (r ** (-self.Holland_B - 1))) * der_p
         # looping over different storm cyclone locations
-        for i in range(len(self.track_lat_m)):
+        for i in range(i0, i1):
             # location and heading
             lat = self.track_lat_m[i] + self.delta_path[0]
             lon = self.track_lon_m[i] -0.3 * self.delta_path[1]
             beta = self.beta_c[i]
             # coriolis
-            omega = 0.7292 * 1e-4
             f = 2.0 * omega * np.sin(lat * np.pi / 180.0)
-            # looping over different polar coordinates theta
-            for j in range(len(self.theta)):
-                Ctheta = -self.cyclone_sped * np.sin((self.theta[j] - beta) / self.RA)
-                if (self.theta[j] >= 0) and (self.theta[j] <= 90):
-                    THETA = 90.0 - self.theta[j]
-                else:
-                    THETA = 450 - self.theta[j]
-                
-                lat_t = self.RA * np.arcsin(np.sin(lat / self.RA) * np.cos(self.r / self.R) \
-                    + np.cos(lat / self.RA) * np.sin(self.r / self.R) * np.cos(THETA / self.RA))
-                lon_t = lon + self.RA * np.arctan2(np.sin(THETA / self.RA) * np.sin(self.r / self.R) \
-                    * np.cos(lat / self.RA), np.cos(self.r / self.R) - np.sin(lat / self.RA) * np.sin(lat_t))
-                # looping over different polar coordinates r
-                for k in range(len(self.r)):
-                    z0[k] = self.__interp_z0(lat_t[k], lon_t[k])
-                # configuring coefficients
-                z10 = 10.0
-                A = 11.4
-                h = A * z0 ** 0.86
-                d = 0.75 * h
-                kappa = 0.40
-                Cd = kappa ** 2 / (np.log((z10 + h - d) / z0)) ** 2
-                # 
-                der_p = self.Holland_B * self.cyclone_radm ** self.Holland_B * self.cyclone_pres * (self.r ** (-self.Holland_B - 1)) \
-                    * np.exp(-(self.cyclone_radm * self.r ** (-1.0)) ** self.Holland_B)
-                der_p_2 = (-(self.Holland_B + 1) * (self.r ** (-1.0)) + self.Holland_B * self.cyclone_radm ** self.Holland_B \
-                    * (self.r ** (-self.Holland_B - 1))) * der_p
-                # 
-                vg1[j, :] = 0.5 * (Ctheta - f * self.r) + ((0.5 * (Ctheta - f * self.r)) ** 2.0 + (self.r / self.AIR_DENSITY) * der_p) ** 0.5
-                der_vg1_r = -0.5 * f + 0.5 * ((((Ctheta - f * self.r) / 2.0) ** 2.0 + self.r / self.AIR_DENSITY * der_p) ** (-0.5)) \
-                    * (-(Ctheta - f * self.r) * f / 2.0 + 1.0 / self.AIR_DENSITY * der_p + 1.0 / self.AIR_DENSITY * self.r * der_p_2)
-                der_vg1_theta = -self.cyclone_sped * np.cos((self.theta[j] - beta) / self.RA) / 2.0 \
-                    + 0.25 * self.cyclone_sped * np.cos((self.theta[j] - beta) / self.RA) * (-Ctheta + f * self.r) \
-                    * ((0.5 * (Ctheta - f * self.r)) ** 2.0 + (self.r / self.AIR_DENSITY) * der_p) ** (-0.5)
-                BB = 1.0 / (2.0 * self.EDDY_VISCOCITY * self.r) * der_vg1_theta
-                Eta = ((0.5 * (Ctheta - f * self.r)) ** 2.0 + (self.r / self.AIR_DENSITY) * der_p) ** 0.5
-                ALPHA = 1.0 / (2.0 * self.EDDY_VISCOCITY) * (f + 2.0 * vg1[j, :] / self.r)
-                BETA = 1.0 / (2.0 * self.EDDY_VISCOCITY) * (f + vg1[j, :] / self.r + der_vg1_r)
-                GAMMA = 1.0 / (2.0 * self.EDDY_VISCOCITY) * vg1[j, :] / self.r
-                ALPHA = np.array([complex(x, y) for x, y in zip(np.real(ALPHA), np.imag(ALPHA))])
-                BETA = np.array([complex(x, y) for x, y in zip(np.real(BETA), np.imag(BETA))])
-                # 
-                XXX = -(ALPHA * BETA) ** 0.25
-                YYY = -(ALPHA * BETA) ** 0.25
-                PP_zero = np.array([complex(x, y) for x, y in zip(XXX, YYY)])
-                PP_one = -complex(1, 1) * ((GAMMA + np.sqrt(ALPHA * BETA) - BB) ** 0.5)
-                PP_minus_one = -complex(1, 1) * ((-GAMMA + np.sqrt(ALPHA * BETA) - BB) ** 0.5)
-                #
-                X1 = PP_zero + f * self.r * Cd / self.EDDY_VISCOCITY - 2.0 * Eta * Cd / self.EDDY_VISCOCITY \
-                    - self.cyclone_sped ** 2.0 * Cd ** 2.0 / (4.0 * self.EDDY_VISCOCITY ** 2.0 * (PP_one - np.conj(PP_minus_one))) \
-                    + self.cyclone_sped ** 2.0 * Cd ** 2.0 / (4.0 * self.EDDY_VISCOCITY ** 2.0 * (np.conj(PP_one) - PP_minus_one))
-
-                X2 = -np.conj(PP_zero) - f * self.r * Cd / self.EDDY_VISCOCITY + 2.0 * Eta * Cd / self.EDDY_VISCOCITY \
-                    - self.cyclone_sped ** 2.0 * Cd ** 2.0 / (4.0 * self.EDDY_VISCOCITY ** 2.0 * (PP_one - np.conj(PP_minus_one))) \
-                    + self.cyclone_sped ** 2.0 * Cd ** 2.0 / (4.0 * self.EDDY_VISCOCITY ** 2.0 * (np.conj(PP_one) - PP_minus_one))
-                
-                X3 = complex(0, -2) * Cd / self.EDDY_VISCOCITY * (Eta - f * self.r / 2.0) ** 2.0
-
-                X4 = -(-PP_zero - f * self.r * Cd / (2.0 * self.EDDY_VISCOCITY) + Eta * Cd / self.EDDY_VISCOCITY) \
-                    / (-np.conj(PP_zero) - f * self.r * Cd / (2.0 *self.EDDY_VISCOCITY) + Eta * Cd / self.EDDY_VISCOCITY)
-
-                A_zero = -X3 / (X1 + X2 * X4)
-                A_one = complex(0, 1) * self.cyclone_sped * Cd * np.exp(complex(0, -1) * beta) \
-                    / (4.0 * self.EDDY_VISCOCITY * (PP_one - np.conj(PP_minus_one))) * (A_zero + np.conj(A_zero))
-                A_minus_one = -np.conj(A_one)
-                # looping over different heights zp
-                for ii in range(len(self.zp)):
-                    u_zero = np.sqrt(ALPHA / BETA) * np.real(A_zero * np.exp(PP_zero * self.zp[ii]))
-                    v_zero = np.imag(A_zero * np.exp(PP_zero * self.zp[ii]))
-                    u_one = np.sqrt(ALPHA / BETA) * np.real(A_one * np.exp(PP_one * self.zp[ii] + complex(0, 1) * self.theta[j] / self.RA))
-                    u_minus_one = np.sqrt(ALPHA / BETA) * np.real(A_minus_one * np.exp(PP_minus_one * self.zp[ii] - complex(0, 1) * self.theta[j] / self.RA))
-                    v_one = np.imag(A_one * np.exp(PP_one * self.zp[ii] + complex(0, 1) * self.theta[j] / self.RA))
-                    v_minus_one = np.imag(A_minus_one * np.exp(PP_minus_one * self.zp[ii] - complex(0, 1) * self.theta[j] / self.RA))
-                    #
-                    for tmptag in range(u.shape[1]):
-                        u[j, tmptag, ii] = np.real(u_zero)[tmptag] + np.real(u_one)[tmptag] + np.real(u_minus_one)[tmptag]
-                        v[j, tmptag, ii] = v_zero[tmptag] + v_one[tmptag] + v_minus_one[tmptag]
+            # evaluating the whole polar mesh at once
+            Ctheta = -self.cyclone_sped * np.sin((theta - beta) / self.RA)
+            lat_t = self.RA * np.arcsin(np.sin(lat / self.RA) * np.cos(r / self.R) \
+                + np.cos(lat / self.RA) * np.sin(r / self.R) * np.cos(THETA / self.RA))
+            lon_t = lon + self.RA * np.arctan2(np.sin(THETA / self.RA) * np.sin(r / self.R) \
+                * np.cos(lat / self.RA), np.cos(r / self.R) - np.sin(lat / self.RA) * np.sin(lat_t))
+            z0 = self.terrain.get_z0(lat_t, lon_t)
+            h = A * z0 ** 0.86
+            d = 0.75 * h
+            Cd = kappa ** 2 / (np.log((z10 + h - d) / z0)) ** 2
+            # 
+            vg1 = 0.5 * (Ctheta - f * r) + ((0.5 * (Ctheta - f * r)) ** 2.0 + (r / self.AIR_DENSITY) * der_p) ** 0.5
+            der_vg1_r = -0.5 * f + 0.5 * ((((Ctheta - f * r) / 2.0) ** 2.0 + r / self.AIR_DENSITY * der_p) ** (-0.5)) \
+                * (-(Ctheta - f * r) * f / 2.0 + 1.0 / self.AIR_DENSITY * der_p + 1.0 / self.AIR_DENSITY * r * der_p_2)
+            der_vg1_theta = -self.cyclone_sped * np.cos((theta - beta) / self.RA) / 2.0 \
+                + 0.25 * self.cyclone_sped * np.cos((theta - beta) / self.RA) * (-Ctheta + f * r) \
+                * ((0.5 * (Ctheta - f * r)) ** 2.0 + (r / self.AIR_DENSITY) * der_p) ** (-0.5)
+            BB = 1.0 / (2.0 * self.EDDY_VISCOCITY * r) * der_vg1_theta
+            Eta = ((0.5 * (Ctheta - f * r)) ** 2.0 + (r / self.AIR_DENSITY) * der_p) ** 0.5
+            ALPHA = (1.0 / (2.0 * self.EDDY_VISCOCITY) * (f + 2.0 * vg1 / r)).astype(complex)
+            BETA = (1.0 / (2.0 * self.EDDY_VISCOCITY) * (f + vg1 / r + der_vg1_r)).astype(complex)
+            GAMMA = 1.0 / (2.0 * self.EDDY_VISCOCITY) * vg1 / r
+            # 
+            XXX = -(ALPHA * BETA) ** 0.25
+            PP_zero = np.empty(XXX.shape, dtype = complex)
+            PP_zero.real = XXX.real - XXX.imag
+            PP_zero.imag = XXX.imag + XXX.real
+            PP_one = -complex(1, 1) * ((GAMMA + np.sqrt(ALPHA * BETA) - BB) ** 0.5)
+            PP_minus_one = -complex(1, 1) * ((-GAMMA + np.sqrt(ALPHA * BETA) - BB) ** 0.5)
+            #
+            X1 = PP_zero + f * r * Cd / self.EDDY_VISCOCITY - 2.0 * Eta * Cd / self.EDDY_VISCOCITY \
+                - self.cyclone_sped ** 2.0 * Cd ** 2.0 / (4.0 * self.EDDY_VISCOCITY ** 2.0 * (PP_one - np.conj(PP_minus_one))) \
+                + self.cyclone_sped ** 2.0 * Cd ** 2.0 / (4.0 * self.EDDY_VISCOCITY ** 2.0 * (np.conj(PP_one) - PP_minus_one))
+
+            X2 = -np.conj(PP_zero) - f * r * Cd / self.EDDY_VISCOCITY + 2.0 * Eta * Cd / self.EDDY_VISCOCITY \
+                - self.cyclone_sped ** 2.0 * Cd ** 2.0 / (4.0 * self.EDDY_VISCOCITY ** 2.0 * (PP_one - np.conj(PP_minus_one))) \
+                + self.cyclone_sped ** 2.0 * Cd ** 2.0 / (4.0 * self.EDDY_VISCOCITY ** 2.0 * (np.conj(PP_one) - PP_minus_one))
+            
+            X3 = complex(0, -2) * Cd / self.EDDY_VISCOCITY * (Eta - f * r / 2.0) ** 2.0
+
+            X4 = -(-PP_zero - f * r * Cd / (2.0 * self.EDDY_VISCOCITY) + Eta * Cd / self.EDDY_VISCOCITY) \
+                / (-np.conj(PP_zero) - f * r * Cd / (2.0 *self.EDDY_VISCOCITY) + Eta * Cd / self.EDDY_VISCOCITY)
+
+            A_zero = -X3 / (X1 + X2 * X4)
+            A_one = complex(0, 1) * self.cyclone_sped * Cd * np.exp(complex(0, -1) * beta) \
+                / (4.0 * self.EDDY_VISCOCITY * (PP_one - np.conj(PP_minus_one))) * (A_zero + np.conj(A_zero))
+            A_minus_one = -np.conj(A_one)
+            # evaluating all heights zp at once (theta x r x zp)
+            sqrt_AB = np.sqrt(ALPHA / BETA)[:, :, np.newaxis]
+            theta_i = complex(0, 1) * theta[:, :, np.newaxis] / self.RA
+            u_zero = sqrt_AB * np.real(A_zero[:, :, np.newaxis] * np.exp(PP_zero[:, :, np.newaxis] * zp))
+            v_zero = np.imag(A_zero[:, :, np.newaxis] * np.exp(PP_zero[:, :, np.newaxis] * zp))
+            u_one = sqrt_AB * np.real(A_one[:, :, np.newaxis] * np.exp(PP_one[:, :, np.newaxis] * zp + theta_i))
+            u_minus_one = sqrt_AB * np.real(A_minus_one[:, :, np.newaxis] * np.exp(PP_minus_one[:, :, np.newaxis] * zp - theta_i))
+            v_one = np.imag(A_one[:, :, np.newaxis] * np.exp(PP_one[:, :, np.newaxis] * zp + theta_i))
+            v_minus_one = np.imag(A_minus_one[:, :, np.newaxis] * np.exp(PP_minus_one[:, :, np.newaxis] * zp - theta_i))
+            u = np.real(u_zero) + np.real(u_one) + np.real(u_minus_one)
+            v = v_zero + v_one + v_minus_one
 
             # wind speed components
-            v1 = v
-            for m in range(v.shape[2]):
-                v1[:, :, m] = v1[:, :, m] + vg1
-            U = (v1 ** 2.0 + u ** 2.0) ** 0.5
+            U = ((v + vg1[:, :, np.newaxis]) ** 2.0 + u ** 2.0) ** 0.5
 
             # mapping to staitons
-            dd = np.arccos(np.cos(np.array(station_lat) / self.RA) * np.cos(lat / self.RA) * np.cos((np.abs(np.array(station_lon)) - lon) / self.RA) \
-                + np.sin(np.array(station_lat) / self.RA) * np.sin(lat / self.RA)) * 6371.0 * 180.0 / np.pi / self.RA * 1000.0
-            Delta = np.abs(np.array(station_lon)) - lon + self.EPS ** 2.0
-            bearing = 90.0 + self.RA * np.arctan2(np.sin(Delta / self.RA) * np.cos(np.array(station_lat) / self.RA), \
-                np.cos(lat / self.RA) * np.sin(np.array(station_lat) /self.RA) - np.sin(lat / self.RA) * np.cos(np.array(station_lat) / self.RA) * np.cos(Delta / self.RA))
-            bearing = [x if x >= 0 else x + 360.0 for x in bearing]
-            jj = [int(x / self.mesh_info[4]) for x in bearing]
-            kk = [min(int(x / self.mesh_info[1]), len(self.r) - 1) for x in dd]
-            for ii in range(len(self.zp)):
-                tmp = U[:, :, ii].tolist()
-                wind_speed = [tmp[jtag][ktag] for jtag, ktag in zip(jj, kk)]
-                station_umax[:, ii] = [max(x, y) for x, y in zip(wind_speed, station_umax[:, ii])]
+            dd = np.arccos(np.cos(station_lat / self.RA) * np.cos(lat / self.RA) * np.cos((np.abs(station_lon) - lon) / self.RA) \
+                + np.sin(station_lat / self.RA) * np.sin(lat / self.RA)) * 6371.0 * 180.0 / np.pi / self.RA * 1000.0
+            Delta = np.abs(station_lon) - lon + self.EPS ** 2.0
+            bearing = 90.0 + self.RA * np.arctan2(np.sin(Delta / self.RA) * np.cos(station_lat / self.RA), \
+                np.cos(lat / self.RA) * np.sin(station_lat /self.RA) - np.sin(lat / self.RA) * np.cos(station_lat / self.RA) * np.cos(Delta / self.RA))
+            bearing = np.where(bearing >= 0, bearing, bearing + 360.0)
+            jj = (bearing / self.mesh_info[4]).astype(int)
+            kk = np.minimum((dd / self.mesh_info[1]).astype(int), len(self.r) - 1)
+            station_umax = np.maximum(U[jj, kk, :], station_umax)
 
-        # copying results
-        self.station['PWS']['height'] = self.zp
-        self.station['PWS']['windspeed'] = station_umax.tolist()
-        print('WindFieldSimulation: linear analytical simulation completed.')
+        # return
+        return station_umax
 
     
     def get_station_data(self):
@@ -378,4 +470,17 @@ class LinearAnalyticalModel_SnaikiWu_2017:
         get_station_data: returning station data
         """
         # return station dictionary
-        return self.station
\ No newline at end of file
+        return self.station
+
+
+track_worker = {}
+
+def init_track_worker(model):
+
+    # every worker keeps its copy of the model for all of its chunks
+    track_worker['model'] = model
+
+def run_track_steps(steps):
+
+    # station maxima (stations x heights) of a chunk of track steps
+    return track_worker['model'].compute_track_steps(int(steps[0]), int(steps[1]))
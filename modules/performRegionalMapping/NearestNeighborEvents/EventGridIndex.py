@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018 Leland Stanford Junior University
+# Copyright (c) 2018 The Regents of the University of California
+#
+# This file is part of the SimCenter Backend Applications
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice,
+# this list of conditions and the following disclaimer.
+#
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+# this list of conditions and the following disclaimer in the documentation
+# and/or other materials provided with the distribution.
+#
+# 3. Neither the name of the copyright holder nor the names of its contributors
+# may be used to endorse or promote products derived from this software without
+# specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# You should have received a copy of the BSD 3-Clause License along with
+# this file. If not, see <http://www.opensource.org/licenses/>.
+#
+# Contributors:
+# Adam Zsarnóczay
+#
+
+import os, pickle
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from sklearn.neighbors import BallTree
+
+# mean radius of the Earth in km
+EARTH_RADIUS = 6371.0
+
+class EventGridIndex(object):
+    """
+    Spatial index for the nearest neighbor search on an event grid.
+
+    Distances are great-circle distances evaluated with the haversine metric
+    on coordinates in radians. If labels are provided for the grid points
+    (e.g., soil classes), a separate tree is built for every label, so that
+    filtered queries only consider the grid points with matching labels.
+
+    Parameters
+    ----------
+    latitude: array of float
+        Latitude of the grid points in degrees.
+    longitude: array of float
+        Longitude of the grid points in degrees.
+    labels: array, optional
+        Label of each grid point.
+    """
+
+    def __init__(self, latitude, longitude, labels=None):
+
+        coords = np.radians(np.column_stack([latitude, longitude]))
+
+        self.size = len(coords)
+        self.tree = BallTree(coords, metric='haversine')
+
+        # trees of the grid point subsets with identical labels and the
+        # indices of those grid points in the full grid
+        self.label_trees = {}
+        if labels is not None:
+            labels = np.asarray(labels)
+            for label in np.unique(labels):
+                grid_ids = np.where(labels == label)[0]
+                self.label_trees.update({label: (
+                    BallTree(coords[grid_ids], metric='haversine'),
+                    grid_ids)})
+
+    def query(self, latitude, longitude, k, labels=None):
+        """
+        Find the k nearest grid points for every location.
+
+        Parameters
+        ----------
+        latitude: array of float
+            Latitude of the locations in degrees.
+        longitude: array of float
+            Longitude of the locations in degrees.
+        k: int
+            Number of neighbors.
+        labels: array, optional
+            Label of each location. If provided, only the grid points with the
+            same label are considered.
+
+        Returns
+        -------
+        distances: ndarray
+            Distances of the neighbors in km (locations x k), sorted in
+            ascending order.
+        indices: ndarray
+            Indices of the neighbors in the event grid (locations x k).
+        valid: ndarray of bool
+            False for positions with no neighbor; this happens when fewer than
+            k grid points have the label of the location.
+        """
+
+        coords = np.radians(np.column_stack([latitude, longitude]))
+        loc_count = len(coords)
+
+        distances = np.full((loc_count, k), np.inf)
+        indices = np.zeros((loc_count, k), dtype=int)
+        valid = np.full((loc_count, k), False)
+
+        if labels is None:
+            groups = [(np.arange(loc_count), self.tree, np.arange(self.size)), ]
+        else:
+            labels = np.asarray(labels)
+            groups = []
+            for label in np.unique(labels):
+                if label in self.label_trees.keys():
+                    tree, grid_ids = self.label_trees[label]
+                    groups.append((np.where(labels == label)[0], tree, grid_ids))
+
+        for loc_ids, tree, grid_ids in groups:
+            k_i = min(k, len(grid_ids))
+            dist_i, ind_i = tree.query(coords[loc_ids], k=k_i)
+
+            distances[loc_ids, :k_i] = dist_i * EARTH_RADIUS
+            indices[loc_ids, :k_i] = grid_ids[ind_i]
+            valid[loc_ids, :k_i] = True
+
+        return distances, indices, valid
+
+def get_event_grid_index(event_grid_file, filter_label=""):
+    """
+    Load the spatial index of an event grid or create it if needed.
+
+    The index is saved next to the event grid file (e.g., EventGrid_index.pkl
+    or EventGrid_index_<filter_label>.pkl) and reused by later runs as long
+    as the grid file is unchanged. If the directory is not writeable, the
+    index is only kept in memory.
+
+    Parameters
+    ----------
+    event_grid_file: string
+        Path to the event grid csv file.
+    filter_label: string, optional
+        Name of the grid column used to filter the neighbors.
+
+    Returns
+    -------
+    grid_index: EventGridIndex
+    """
+
+    event_grid_path = Path(event_grid_file).resolve()
+
+    if filter_label != "":
+        index_path = event_grid_path.with_name(
+            f'{event_grid_path.stem}_index_{filter_label}.pkl')
+    else:
+        index_path = event_grid_path.with_name(
+            f'{event_grid_path.stem}_index.pkl')
+
+    # the index is only valid for the grid file it was created from
+    grid_stat = os.stat(event_grid_path)
+    source_id = (grid_stat.st_size, grid_stat.st_mtime)
+
+    if index_path.exists():
+        try:
+            with open(index_path, 'rb') as f:
+                index_data = pickle.load(f)
+
+            if index_data['source'] == source_id:
+                return index_data['index']
+
+        except Exception:
+            pass
+
+    grid_df = pd.read_csv(event_grid_path, header=0)
+
+    if filter_label != "":
+        labels = grid_df[filter_label].values
+    else:
+        labels = None
+
+    grid_index = EventGridIndex(grid_df['Latitude'].values,
+                                grid_df['Longitude'].values, labels)
+
+    # the index is written to a temporary file and moved in place, hence an
+    # interrupted or concurrent run never leaves a truncated index behind
+    tmp_path = index_path.with_name(f'{index_path.name}.{os.getpid()}.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'source': source_id, 'index': grid_index}, f)
+        os.replace(tmp_path, index_path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+    return grid_index
@@ -42,12 +42,90 @@
 import argparse, json
 import numpy as np
 import pandas as pd
-from numpy.random import multinomial
 from pathlib import Path
 
-from sklearn.neighbors import NearestNeighbors
+from EventGridIndex import get_event_grid_index
+
+def load_grid_point_events(GP_cache, event_dir, GP_file):
+    """
+    Return the event names and scale factors stored in a grid point file.
+
+    Every grid point file is parsed only once; the results are kept in
+    GP_cache and reused for every building and sample that refers to the
+    same grid point.
+
+    Parameters
+    ----------
+    GP_cache: dict
+        Maps the grid point file names to their (events, factors) arrays.
+    event_dir: Path
+        Directory of the event grid.
+    GP_file: string
+        Name of the grid point file.
+
+    Returns
+    -------
+    events: ndarray
+        Names of the events (e.g., ground motion records) at the grid point.
+    factors: ndarray
+        Scale factors of the events. The factors are 1.0 if the file does
+        not provide them.
+    """
+
+    if GP_file not in GP_cache.keys():
+
+        event_df = pd.read_csv(event_dir / GP_file, header=0)
+
+        events = event_df.iloc[:, 0].values
+        if len(event_df.columns) > 1:
+            factors = event_df.iloc[:, 1].values
+        else:
+            factors = np.ones(len(events))
+
+        GP_cache.update({GP_file: (events, factors)})
+
+    return GP_cache[GP_file]
+
+def sample_neighbors(distances, valid, samples):
+    """
+    Sample neighbors for a set of buildings in one vectorized step.
+
+    Neighbors are sampled with replacement, with probabilities that are
+    inversely proportional to the squared distances from the building.
+
+    Parameters
+    ----------
+    distances: ndarray
+        Distances of the neighbors from the buildings (buildings x neighbors).
+    valid: ndarray of bool
+        Identifies the neighbors that can be sampled for each building.
+    samples: int
+        Number of samples per building.
+
+    Returns
+    -------
+    nbr_samples: ndarray
+        Positions of the sampled neighbors (buildings x samples).
+    """
+
+    # calculate the weights for each neighbor based on their distance
+    weights = np.where(valid, 1./(distances**2.0), 0.)
+    weights = weights / np.sum(weights, axis=1)[:, np.newaxis]
 
-def find_neighbors(building_file, event_grid_file, samples, neighbors, filter_label):
+    # inverse transform sampling from the categorical distributions
+    weights_cum = np.cumsum(weights, axis=1)
+    U = np.random.random_sample((len(weights), samples))
+    nbr_samples = np.sum(
+        weights_cum[:, np.newaxis, :] <= U[:, :, np.newaxis], axis=2)
+
+    # protect against round-off in the cumulative weights
+    nbr_samples = np.minimum(nbr_samples,
+                             np.sum(valid, axis=1)[:, np.newaxis] - 1)
+
+    return nbr_samples
+
+def find_neighbors(building_file, event_grid_file, samples, neighbors,
+                   filter_label, chunk_size=1000):
 
     # read the event grid data file
     event_grid_path = Path(event_grid_file).resolve()
@@ -56,164 +134,148 @@ def find_neighbors(building_file, event_grid_file, samples, neighbors, filter_la
 
     grid_df = pd.read_csv(event_dir / event_grid_file, header=0)
 
-    # store the locations of the grid points in X
-    lat_E = grid_df['Latitude']
-    lon_E = grid_df['Longitude']
-    X = np.array([[lo, la] for lo, la in zip(lon_E, lat_E)])
+    # load the spatial index for the nearest neighbor search; the index is
+    # created at the first run and stored next to the event grid file
+    grid_index = get_event_grid_index(event_grid_path, filter_label)
+
+    GP_files = grid_df['GP_file'].values
+
+    # this is the preferred behavior, the else caluse is left for legacy inputs
+    legacy_grid = GP_files[0][-3:] != 'csv'
+
+    if not legacy_grid:
+
+        # We assume that every grid point has the same type and number of
+        # event data. That is, you cannot mix ground motion records and
+        # intensity measures and you cannot assign 10 records to one point
+        # and 15 records to another.
+
+        # Load the first file and identify if this is a grid of IM or GM
+        # information. GM grids have GM record filenames defined in the
+        # grid point files.
+        first_file = pd.read_csv(event_dir / GP_files[0], header=0)
+        if first_file.columns[0]=='TH_file':
+            event_type = 'timeHistory'
+        else:
+            event_type = 'intensityMeasure'
+        event_count = first_file.shape[0]
+
+        # make sure we resample events if samples > event_count
+        event_j = np.arange(samples) % event_count
 
-    # prepare the tree for the nearest neighbor search
-    if filter_label != "":
-        neighbors_to_get = min(neighbors*10, len(lon_E))
     else:
-        neighbors_to_get = neighbors
-    nbrs = NearestNeighbors(n_neighbors = neighbors_to_get, algorithm='ball_tree').fit(X)
+        # legacy grids are collections of ground motion records
+        event_type = 'timeHistory'
+
+    # grid point files are loaded only once - see load_grid_point_events
+    GP_cache = {}
 
     # load the building data file
     with open(building_file, 'r') as f:
         bldg_dict = json.load(f)
 
-    # prepare a dataframe that holds building filenames and locations
-    bim_df = pd.DataFrame(columns=['Latitude', 'Longitude', 'file'],
-                          index=np.arange(len(bldg_dict)))
-    for i, bldg in enumerate(bldg_dict):
-        with open(bldg['file'], 'r') as f:
-            bldg_data = json.load(f)
-
-        bldg_loc = bldg_data['GeneralInformation']['location']
-        bim_df.iloc[i]['Longitude'] = bldg_loc['longitude']
-        bim_df.iloc[i]['Latitude'] = bldg_loc['latitude']
-        bim_df.iloc[i]['file'] = bldg['file']
+    # the buildings are processed in chunks to limit the memory footprint;
+    # every BIM file is read and written only once
+    for chunk_start in range(0, len(bldg_dict), chunk_size):
 
-    # store building locations in Y
-    Y = np.array([[lo, la] for lo, la in zip(bim_df['Longitude'], bim_df['Latitude'])])
+        bldg_chunk = bldg_dict[chunk_start: chunk_start + chunk_size]
 
-    # collect the neighbor indices and distances for every building
-    distances, indices = nbrs.kneighbors(Y)
-    distances = distances + 1e-20
+        bldg_data_list = []
+        for bldg in bldg_chunk:
+            with open(bldg['file'], 'r') as f:
+                bldg_data_list.append(json.load(f))
 
-    # iterate through the buildings and store the selected events in the BIM
-    for bldg_i, (bim_id, dist_list, ind_list) in enumerate(zip(bim_df.index,
-                                                          distances,
-                                                          indices)):
-
-        # open the BIM file
-        bldg_file = bim_df.iloc[bim_id]['file']
-        with open(bldg_file, 'r') as f:
-            bldg_data = json.load(f)
+        # store building locations in Y
+        Y = np.array([[bldg_data['GeneralInformation']['location']['longitude'],
+                       bldg_data['GeneralInformation']['location']['latitude']]
+                      for bldg_data in bldg_data_list])
 
         if filter_label != '':
-            # soil type of building
-            bldg_label = bldg_data['GeneralInformation'][filter_label]
-            # soil types of all initial neighbors
-            grid_label = grid_df[filter_label][ind_list]
-
-            # only keep the distances and indices corresponding to neighbors
-            # with the same soil type
-            dist_list  = dist_list[(grid_label==bldg_label).values]
-            ind_list   = ind_list[(grid_label==bldg_label).values]
-
-            # return dist_list & ind_list with a length equals neighbors
-            # assuming that at least neighbors grid points exist with
-            # the same filter_label as the building
-
-            # because dist_list, ind_list sorted initially in order of increasing
-            # distance, just take the first neighbors grid points of each
-            dist_list = dist_list[:neighbors]
-            ind_list = ind_list[:neighbors]
-
-        # calculate the weights for each neighbor based on their distance
-        dist_list = 1./(dist_list**2.0)
-        weights = np.array(dist_list)/np.sum(dist_list)
-
-        # get the pre-defined number of samples for each neighbor
-        nbr_samples = np.where(multinomial(1, weights, samples) == 1)[1]
-
-        # this is the preferred behavior, the else caluse is left for legacy inputs
-        if grid_df.iloc[0]['GP_file'][-3:] == 'csv':
-
-            # We assume that every grid point has the same type and number of
-            # event data. That is, you cannot mix ground motion records and
-            # intensity measures and you cannot assign 10 records to one point
-            # and 15 records to another.
-
-            # Load the first file and identify if this is a grid of IM or GM
-            # information. GM grids have GM record filenames defined in the
-            # grid point files.
-            first_file = pd.read_csv(event_dir / grid_df.iloc[0]['GP_file'],
-                                     header=0)
-            if first_file.columns[0]=='TH_file':
-                event_type = 'timeHistory'
-            else:
-                event_type = 'intensityMeasure'
-            event_count = first_file.shape[0]
+            # soil type of buildings
+            bldg_labels = np.array([
+                bldg_data['GeneralInformation'][filter_label]
+                for bldg_data in bldg_data_list])
+        else:
+            bldg_labels = None
+
+        # collect the neighbor indices and distances for every building; if
+        # a filter label is used, only grid points with the same label are
+        # considered
+        distances, indices, valid = grid_index.query(
+            Y[:, 1], Y[:, 0], neighbors, labels=bldg_labels)
+        distances = distances + 1e-20
 
-            # collect the list of events and scale factors
-            event_list = []
-            scale_list = []
+        no_match = ~np.any(valid, axis=1)
+        if np.any(no_match):
+            raise ValueError(
+                f"No grid point found with {filter_label} = "
+                f"{bldg_labels[no_match][0]} in the event grid.")
 
-            # for each neighbor
-            for sample_j, nbr in enumerate(nbr_samples):
+        # get the pre-defined number of samples for each building
+        nbr_samples = sample_neighbors(distances, valid, samples)
+        nbr_indices = np.take_along_axis(indices, nbr_samples, axis=1)
 
-                # make sure we resample events if samples > event_count
-                event_j = sample_j % event_count
+        # iterate through the buildings and store the selected events in the BIM
+        for bldg, bldg_data, nbr_index_list in zip(bldg_chunk, bldg_data_list,
+                                                   nbr_indices):
 
-                # get the index of the nth neighbor
-                nbr_index = ind_list[nbr]
+            if not legacy_grid:
 
                 # if the grid has ground motion records...
                 if event_type == 'timeHistory':
 
-                    # load the file for the selected grid point
-                    event_collection_file = grid_df.iloc[nbr_index]['GP_file']
-                    event_df = pd.read_csv(event_dir / event_collection_file,
-                                           header=0)
+                    event_list = []
+                    scale_list = []
 
-                    # append the GM record name to the event list
-                    event_list.append(event_df.iloc[event_j,0])
+                    for nbr_index, event_i in zip(nbr_index_list, event_j):
 
-                    # append the scale factor (or 1.0) to the scale list
-                    if len(event_df.columns) > 1:
-                        scale_list.append(event_df.iloc[event_j,1])
-                    else:
-                        scale_list.append(1.0)
+                        events, factors = load_grid_point_events(
+                            GP_cache, event_dir, GP_files[nbr_index])
+
+                        # append the GM record name to the event list
+                        event_list.append(events[event_i])
+
+                        # append the scale factor (or 1.0) to the scale list
+                        scale_list.append(factors[event_i])
 
                 # if the grid has intensity measures
                 elif event_type == 'intensityMeasure':
 
                     # save the collection file name and the IM row id
-                    event_list.append(grid_df.iloc[nbr_index]['GP_file']+f'x{event_j}')
+                    event_list = [f'{GP_files[nbr_index]}x{event_i}'
+                                  for nbr_index, event_i
+                                  in zip(nbr_index_list, event_j)]
 
                     # IM collections are not scaled
-                    scale_list.append(1.0)
-
-        # TODO: update the LLNL input data and remove this clause
-        else:
-            event_list = []
-            for e, i in zip(nbr_samples, ind_list):
-                event_list += [grid_df.iloc[i]['GP_file'],]*e
+                    scale_list = [1.0, ] * len(event_list)
 
-            scale_list = np.ones(len(event_list))
-
-        # prepare a dictionary of events
-        event_list_json = []
-        for e_i, event in enumerate(event_list):
-            event_list_json.append({
+            # TODO: update the LLNL input data and remove this clause
+            else:
+                event_list = [GP_files[nbr_index]
+                              for nbr_index in nbr_index_list]
+
+                scale_list = np.ones(len(event_list))
+
+            # prepare a dictionary of events
+            event_list_json = []
+            for e_i, event in enumerate(event_list):
+                event_list_json.append({
+                    "EventClassification": "Earthquake",
+                    "fileName": f'{event}x{e_i:05d}',
+                    "factor": float(scale_list[e_i]),
+                    "type": event_type
+                    })
+
+            # save the event dictionary to the BIM
+            bldg_data['Events'] = {
                 "EventClassification": "Earthquake",
-                "fileName": f'{event}x{e_i:05d}',
-                "factor": scale_list[e_i],
-                "type": event_type
-                })
-
-        # save the event dictionary to the BIM
-        bldg_data['Events'] = {
-            "EventClassification": "Earthquake",
-            "EventFolderPath": str(event_dir),
-            "Events": event_list_json,
-            "type": "SimCenterEvents"
-        }
-
-        with open(bldg_file, 'w') as f:
-            json.dump(bldg_data, f, indent=2)
+                "EventFolderPath": str(event_dir),
+                "Events": event_list_json,
+                "type": "SimCenterEvents"
+            }
+
+            with open(bldg['file'], 'w') as f:
+                json.dump(bldg_data, f, indent=2)
 
 if __name__ == '__main__':
 
@@ -226,4 +288,4 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     find_neighbors(args.buildingFile, args.filenameEVENTgrid,
-                   args.samples,args.neighbors, args.filter_label)
\ No newline at end of file
+                   args.samples,args.neighbors, args.filter_label)